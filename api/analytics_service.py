@@ -0,0 +1,344 @@
+from firebase_service import firebase_service
+from cache_service import catalog_cache
+from config import settings
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import fcntl
+import os
+import tempfile
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+ORDERS_FILE = "orders.parquet"
+ITEMS_FILE = "order_items.parquet"
+# Held while the snapshot files are written. Every worker refreshes its own
+# copy, so when one is already saving the others skip their save.
+LOCK_FILE = ".snapshot.lock"
+ORDER_SCHEMA = pa.schema([
+    ("orderId", pa.string()),
+    ("userId", pa.string()),
+    ("createdAt", pa.timestamp("ms")),
+    ("updatedAt", pa.timestamp("ms")),
+    ("paymentStatus", pa.string()),
+    ("total", pa.float64()),
+    ("region", pa.string()),
+])
+ITEM_SCHEMA = pa.schema([
+    ("orderId", pa.string()),
+    ("productId", pa.string()),
+    ("artistId", pa.string()),
+    ("category", pa.string()),
+    ("quantity", pa.int32()),
+    ("amount", pa.float64()),
+])
+GROUPS = ("day", "category", "artist", "region", "product")
+# Changed orders are looked up from slightly before the last refresh so
+# writes that committed while it ran aren't missed
+REFRESH_OVERLAP = timedelta(seconds=60)
+
+
+def _naive(value: Optional[datetime]) -> Optional[datetime]:
+    """Firestore hands back the naive datetimes we store as aware UTC ones;
+    strip that back off so the arrays compare with datetime.now()"""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _encode(column: pa.ChunkedArray) -> Tuple[np.ndarray, np.ndarray]:
+    """Dictionary-encode a string column into integer codes and their labels"""
+    encoded = pc.fill_null(column, "").combine_chunks().dictionary_encode()
+    return (
+        encoded.indices.to_numpy(zero_copy_only=False).astype(np.int64),
+        np.asarray(encoded.dictionary.to_pylist(), dtype=object),
+    )
+
+
+class OrderColumns:
+    """Immutable NumPy view of the order and item tables, shaped for
+    vectorized filtering and group-by"""
+
+    def __init__(self, orders: pa.Table, items: pa.Table):
+        self.order_count = orders.num_rows
+        self.item_count = items.num_rows
+        created = orders.column("createdAt").to_numpy().astype("datetime64[ms]")
+        statuses, self.status_labels = _encode(orders.column("paymentStatus"))
+        self.order_total = orders.column("total").to_numpy()
+        self.order_created = created
+        self.order_status = statuses
+
+        # Items point at their order's row so order fields broadcast to items
+        self.item_order = pc.index_in(
+            items.column("orderId"), value_set=orders.column("orderId")
+        ).to_numpy(zero_copy_only=False).astype(np.int64)
+        self.item_created = created[self.item_order]
+        self.item_status = statuses[self.item_order]
+        self.item_amount = items.column("amount").to_numpy()
+        self.item_quantity = items.column("quantity").to_numpy()
+        region_codes, region_labels = _encode(orders.column("region"))
+        self.dimensions = {
+            "category": _encode(items.column("category")),
+            "artist": _encode(items.column("artistId")),
+            "product": _encode(items.column("productId")),
+            "region": (region_codes[self.item_order], region_labels),
+        }
+
+    def _code(self, labels: np.ndarray, value: str) -> int:
+        matches = np.flatnonzero(labels == value)
+        return int(matches[0]) if len(matches) else -1
+
+    def item_mask(
+        self,
+        payment_status: Optional[str] = "completed",
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        artist_id: Optional[str] = None,
+    ) -> np.ndarray:
+        mask = np.ones(self.item_count, dtype=bool)
+        if payment_status:
+            mask &= self.item_status == self._code(self.status_labels, payment_status)
+        if start:
+            mask &= self.item_created >= np.datetime64(_naive(start), "ms")
+        if end:
+            mask &= self.item_created < np.datetime64(_naive(end), "ms")
+        if artist_id:
+            codes, labels = self.dimensions["artist"]
+            mask &= codes == self._code(labels, artist_id)
+        return mask
+
+    def group(self, by: str, mask: np.ndarray) -> List[dict]:
+        """Revenue, units and distinct orders per group over the masked items"""
+        if by == "day":
+            days = self.item_created[mask].astype("datetime64[D]")
+            labels, codes = np.unique(days, return_inverse=True)
+            labels = labels.astype(str)
+        else:
+            codes, labels = self.dimensions[by]
+            codes = codes[mask]
+        size = len(labels)
+        revenue = np.bincount(codes, weights=self.item_amount[mask], minlength=size)
+        units = np.bincount(codes, weights=self.item_quantity[mask], minlength=size)
+        # An order with several items in one group counts once
+        pairs = np.unique(codes * max(self.order_count, 1) + self.item_order[mask])
+        orders = np.bincount(pairs // max(self.order_count, 1), minlength=size)
+
+        present = np.flatnonzero(units)
+        if by != "day":
+            present = present[np.argsort(-revenue[present], kind="stable")]
+        return [
+            {
+                "key": labels[i],
+                "revenue": round(float(revenue[i]), 2),
+                "itemsSold": int(units[i]),
+                "orders": int(orders[i]),
+            }
+            for i in present
+        ]
+
+    def order_summary(self, mask: np.ndarray) -> Dict[str, float]:
+        """Distinct orders and their statuses among the masked items"""
+        rows = np.unique(self.item_order[mask])
+        statuses = np.bincount(self.order_status[rows], minlength=len(self.status_labels))
+        return {label: int(count) for label, count in zip(self.status_labels, statuses)}
+
+
+class AnalyticsService:
+    """Columnar snapshot of orders and order items for dashboard queries.
+
+    The snapshot is persisted as Parquet so a restart loads it straight
+    back, and is refreshed in the background by pulling only the orders
+    updated since the last refresh. Queries are NumPy group-bys over the
+    in-memory columns, so they cost milliseconds however many orders there
+    are, at the price of lagging writes by up to one refresh interval.
+    """
+
+    def __init__(self, service, catalog, directory: str, refresh_interval: float):
+        self.service = service
+        self.catalog = catalog
+        self.directory = directory
+        self.refresh_interval = refresh_interval
+        self.orders = ORDER_SCHEMA.empty_table()
+        self.items = ITEM_SCHEMA.empty_table()
+        self.columns: Optional[OrderColumns] = None
+        self.refreshed_at: Optional[datetime] = None
+
+    def load(self) -> bool:
+        """Load the last persisted snapshot, if there is one"""
+        orders_path = os.path.join(self.directory, ORDERS_FILE)
+        items_path = os.path.join(self.directory, ITEMS_FILE)
+        if not (os.path.exists(orders_path) and os.path.exists(items_path)):
+            return False
+        metadata = pq.read_schema(orders_path).metadata or {}
+        self.orders = pq.read_table(orders_path).cast(ORDER_SCHEMA)
+        self.items = pq.read_table(items_path).cast(ITEM_SCHEMA)
+        self.columns = OrderColumns(self.orders, self.items)
+        refreshed_at = metadata.get(b"refreshedAt")
+        self.refreshed_at = datetime.fromisoformat(refreshed_at.decode()) if refreshed_at else None
+        return True
+
+    def _save(self) -> bool:
+        """Persist the snapshot unless another worker is saving one right
+        now. Returns whether this call wrote it."""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, LOCK_FILE), "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            metadata = {b"refreshedAt": self.refreshed_at.isoformat().encode()}
+            for table, name in ((self.orders.replace_schema_metadata(metadata), ORDERS_FILE), (self.items, ITEMS_FILE)):
+                path = os.path.join(self.directory, name)
+                # Unique per save, so no two processes share a temp file
+                with tempfile.NamedTemporaryFile(dir=self.directory, prefix=name, suffix=".tmp", delete=False) as tmp:
+                    try:
+                        pq.write_table(table, tmp)
+                    except BaseException:
+                        os.unlink(tmp.name)
+                        raise
+                os.replace(tmp.name, path)
+        return True
+
+    def _merge(self, orders: List[dict], items: List[dict], refreshed_at: datetime) -> None:
+        """Swap changed orders' rows into the tables and rebuild the columns"""
+        changed = pa.array([order["orderId"] for order in orders], pa.string())
+        keep_orders = pc.invert(pc.is_in(self.orders.column("orderId"), value_set=changed))
+        keep_items = pc.invert(pc.is_in(self.items.column("orderId"), value_set=changed))
+        self.orders = pa.concat_tables([
+            self.orders.filter(keep_orders), pa.Table.from_pylist(orders, schema=ORDER_SCHEMA)
+        ]).combine_chunks()
+        self.items = pa.concat_tables([
+            self.items.filter(keep_items), pa.Table.from_pylist(items, schema=ITEM_SCHEMA)
+        ]).combine_chunks()
+        self.refreshed_at = refreshed_at
+        self.columns = OrderColumns(self.orders, self.items)
+        self._save()
+
+    async def refresh(self) -> int:
+        """Pull orders changed since the last refresh into the snapshot.
+
+        The first refresh with no persisted snapshot reads every order.
+        Returns the number of orders pulled.
+        """
+        started = datetime.now()
+        filters = []
+        if self.refreshed_at is not None:
+            filters.append(("updatedAt", ">=", self.refreshed_at - REFRESH_OVERLAP))
+
+        orders, items, legacy = [], [], []
+        async for order in self.service.stream_query("orders", filters=filters):
+            orders.append({
+                "orderId": order["id"],
+                "userId": order.get("userId"),
+                "createdAt": _naive(order.get("createdAt")),
+                "updatedAt": _naive(order.get("updatedAt")),
+                "paymentStatus": order.get("paymentStatus"),
+                "total": float(order.get("total") or 0),
+                "region": (order.get("shippingAddress") or {}).get("state"),
+            })
+            for item in order.get("items", []):
+                items.append({
+                    "orderId": order["id"],
+                    "productId": item.get("productId"),
+                    "artistId": item.get("artistId"),
+                    "category": item.get("category"),
+                    "quantity": int(item.get("quantity") or 0),
+                    "amount": float(item.get("price") or 0) * int(item.get("quantity") or 0),
+                })
+                if "artistId" not in item:
+                    legacy.append(items[-1])
+        if not orders and self.columns is not None:
+            self.refreshed_at = started
+            return 0
+
+        # Items carry their seller and category from the time of sale. Orders
+        # from before that fall back to the product as it is now.
+        if legacy:
+            products, _ = await self.catalog.get_products([item["productId"] for item in legacy if item["productId"]])
+            products = {product["id"]: product for product in products}
+            for item in legacy:
+                product = products.get(item["productId"], {})
+                item["artistId"] = product.get("artistId")
+                item["category"] = product.get("category")
+
+        await asyncio.to_thread(self._merge, orders, items, started)
+        return len(orders)
+
+    async def run_refresh_loop(self) -> None:
+        """Keep the snapshot current until cancelled"""
+        while True:
+            try:
+                pulled = await self.refresh()
+                if pulled:
+                    print(f"Analytics snapshot refreshed with {pulled} orders")
+            except Exception as e:
+                print(f"Error refreshing analytics snapshot: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def _columns(self) -> OrderColumns:
+        if self.columns is None:
+            raise RuntimeError("Analytics snapshot is still loading")
+        return self.columns
+
+    def revenue(
+        self,
+        by: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        artist_id: Optional[str] = None,
+        payment_status: str = "completed",
+    ) -> List[dict]:
+        """Revenue of orders with the given payment status, grouped by day,
+        category, artist, region or product"""
+        if by not in GROUPS:
+            raise ValueError(f"by must be one of: {', '.join(GROUPS)}")
+        columns = self._columns()
+        return columns.group(by, columns.item_mask(payment_status, start, end, artist_id))
+
+    async def _order_index_summary(self, artist_id: str) -> dict:
+        """The artist summary counted in Firestore from the artist's order
+        index, for while the snapshot loads. Units only include orders that
+        record them per artist."""
+        orders = [("artistIds", "array_contains", artist_id)]
+        total, completed, pending = await asyncio.gather(
+            self.service.count("orders", orders),
+            self.service.aggregate(
+                "orders", orders + [("paymentStatus", "==", "completed")],
+                sum_fields=[f"artistTotals.{artist_id}", f"artistUnits.{artist_id}"]
+            ),
+            self.service.count("orders", orders + [("paymentStatus", "==", "pending")]),
+        )
+        total_sales = round(float(completed["sum"][f"artistTotals.{artist_id}"]), 2)
+        return {
+            "totalOrders": total,
+            "completedOrders": completed["count"],
+            "pendingOrders": pending,
+            "totalSales": total_sales,
+            "totalItemsSold": int(completed["sum"][f"artistUnits.{artist_id}"]),
+            "averageOrderValue": total_sales / completed["count"] if completed["count"] else 0,
+        }
+
+    async def artist_summary(self, artist_id: str) -> dict:
+        """Orders, units and revenue from one artist's items"""
+        if self.columns is None:
+            return await self._order_index_summary(artist_id)
+        columns = self.columns
+        orders = columns.order_summary(columns.item_mask(None, artist_id=artist_id))
+        sold = columns.item_mask("completed", artist_id=artist_id)
+        total_sales = round(float(columns.item_amount[sold].sum()), 2)
+        completed = orders.get("completed", 0)
+        return {
+            "totalOrders": sum(orders.values()),
+            "completedOrders": completed,
+            "pendingOrders": orders.get("pending", 0),
+            "totalSales": total_sales,
+            "totalItemsSold": int(columns.item_quantity[sold].sum()),
+            "averageOrderValue": total_sales / completed if completed else 0,
+        }
+
+
+analytics_service = AnalyticsService(
+    firebase_service, catalog_cache, settings.analytics_dir, settings.analytics_refresh_interval
+)
@@ -1,23 +1,174 @@
-import firebase_admin
 from firebase_admin import auth
 from fastapi import HTTPException, status
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
+from collections import OrderedDict
+from cryptography import x509
+import asyncio
+import hashlib
+import httpx
 import jwt
+import os
+import re
+import threading
+import time
 from config import settings
 
 
-class AuthService:
+# Roles carried in the "role" custom claim of a user's ID token
+ROLES = ("user", "artist", "admin", "super")
+
+# Public X.509 certificates Google signs Firebase ID tokens with
+GOOGLE_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+
+
+class SigningCertCache:
+    """Locally cached Google signing keys for Firebase ID tokens.
+
+    Certificates are fetched once, parsed into public keys and kept until the
+    max-age Google sends with them, so verification never waits on the network
+    except when the keys rotate. Unknown key IDs trigger at most one refetch
+    per ``min_refresh_interval`` seconds and are rejected in between, so forged
+    tokens can't keep the API busy fetching.
+    """
+
+    def __init__(self, url: str = GOOGLE_CERTS_URL, min_refresh_interval: float = 60):
+        self.url = url
+        self.min_refresh_interval = min_refresh_interval
+        self._keys: Dict[str, Any] = {}
+        self._expires_at = 0.0
+        self._last_fetch: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    async def refresh(self) -> None:
+        """Fetch and parse the current signing certificates"""
+        self._last_fetch = time.monotonic()
+        async with httpx.AsyncClient(timeout=10) as client:
+            response = await client.get(self.url)
+        response.raise_for_status()
+        keys = {
+            kid: x509.load_pem_x509_certificate(pem.encode()).public_key()
+            for kid, pem in response.json().items()
+        }
+        match = re.search(r"max-age=(\d+)", response.headers.get("cache-control", ""))
+        max_age = int(match.group(1)) if match else 3600
+        self._keys = keys
+        self._expires_at = time.time() + max_age
+
+    async def _refresh_if_due(self) -> None:
+        async with self._lock:
+            # Whoever held the lock may just have fetched
+            if self._last_fetch is not None and time.monotonic() - self._last_fetch < self.min_refresh_interval:
+                return
+            try:
+                await self.refresh()
+            except Exception as e:
+                # Keep verifying against the keys we have until the next try
+                print(f"⚠ Could not refresh token signing certificates: {e}")
+
+    async def get_key(self, kid: str):
+        """Get the public key for a key ID, refetching if stale or unknown"""
+        if time.time() >= self._expires_at or kid not in self._keys:
+            await self._refresh_if_due()
+        key = self._keys.get(kid)
+        if key is None:
+            raise ValueError("Unknown signing key")
+        return key
+
+
+class TokenCache:
+    """Bounded LRU of verified token claims keyed by token hash.
+
+    Entries expire at the earlier of the token's own ``exp`` and ``max_ttl``
+    seconds after they were cached.
+    """
+
+    def __init__(self, max_size: int, max_ttl: int):
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
     @staticmethod
-    def verify_token(token: str) -> Dict[str, Any]:
-        """Verify Firebase JWT token"""
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, claims = entry
+            if time.time() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return claims
+
+    def put(self, token: str, claims: Dict[str, Any]) -> None:
+        expires_at = min(float(claims.get("exp", 0)), time.time() + self.max_ttl)
+        if expires_at <= time.time():
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (expires_at, claims)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+class AuthService:
+    def __init__(self):
+        self.certs = SigningCertCache(min_refresh_interval=settings.signing_cert_min_refresh)
+        self.token_cache = TokenCache(settings.token_cache_size, settings.token_cache_ttl)
+
+    async def warm_certificates(self) -> None:
+        """Fetch signing certificates ahead of the first authenticated request"""
         try:
-            decoded = auth.verify_id_token(token)
-            return decoded
+            await self.certs.refresh()
         except Exception as e:
+            print(f"⚠ Could not pre-fetch token signing certificates: {e}")
+
+    async def _decode_token(self, token: str) -> Dict[str, Any]:
+        """Verify a Firebase ID token's signature and claims"""
+        if os.environ.get("FIREBASE_AUTH_EMULATOR_HOST"):
+            # Emulator tokens are unsigned; let the Admin SDK handle them
+            return await asyncio.to_thread(auth.verify_id_token, token)
+
+        header = jwt.get_unverified_header(token)
+        if header.get("alg") != "RS256" or not header.get("kid"):
+            raise ValueError("Unexpected token header")
+
+        project_id = settings.firebase_project_id
+        # Signature checks are CPU work, so they run off the event loop
+        decoded = await asyncio.to_thread(
+            jwt.decode,
+            token,
+            key=await self.certs.get_key(header["kid"]),
+            algorithms=["RS256"],
+            audience=project_id,
+            issuer=f"https://securetoken.google.com/{project_id}",
+            options={"require": ["exp", "iat", "sub"]},
+        )
+        if not decoded["sub"] or len(decoded["sub"]) > 128:
+            raise ValueError("Invalid token subject")
+        decoded["uid"] = decoded["sub"]
+        return decoded
+
+    async def verify_token(self, token: str) -> Dict[str, Any]:
+        """Verify Firebase JWT token"""
+        cached = self.token_cache.get(token)
+        if cached is not None:
+            return cached
+        try:
+            decoded = await self._decode_token(token)
+        except Exception:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid token"
             )
+        self.token_cache.put(token, decoded)
+        return decoded
 
     @staticmethod
     def create_user(email: str, password: str, display_name: str = "") -> Dict[str, str]:
@@ -81,5 +232,14 @@ class AuthService:
                 detail=str(e)
             )
 
+    def set_role(self, uid: str, role: str) -> bool:
+        """Set the role custom claim; it reaches the user on their next token refresh"""
+        if role not in ROLES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid role: {role}"
+            )
+        return self.set_custom_claims(uid, {"role": role})
+
 
 auth_service = AuthService()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Backfill artist fields onto orders created before they were denormalized.
+
+Artist dashboards find orders with an array_contains query on artistIds and
+sum each artist's revenue and units from artistTotals and artistUnits, and
+the analytics snapshot takes each item's seller and category from the item
+itself. Older orders lack some of these until this has run once:
+
+    python backfill_order_artists.py
+
+Items get their product's current artist and category, the best record left
+of who sold them.
+"""
+
+import asyncio
+
+from firebase_service import firebase_service
+
+# Firestore caps a batch at 500 writes
+BATCH_LIMIT = 500
+
+
+def _complete(order: dict) -> bool:
+    return (
+        "artistIds" in order and "artistTotals" in order and "artistUnits" in order
+        and all("artistId" in item for item in order.get("items", []))
+    )
+
+
+async def backfill() -> int:
+    """Add the missing artist fields to every order and return how many were updated"""
+    db = firebase_service.db
+    product_fields = {}
+    updates = []
+
+    async for doc in db.collection("orders").stream():
+        order = doc.to_dict()
+        if _complete(order):
+            continue
+
+        product_ids = {item.get("productId") for item in order.get("items", []) if item.get("productId")}
+        missing = [pid for pid in product_ids if pid not in product_fields]
+        if missing:
+            refs = [db.collection("products").document(pid) for pid in missing]
+            async for product in db.get_all(refs):
+                data = (product.to_dict() or {}) if product.exists else {}
+                product_fields[product.id] = {"artistId": data.get("artistId"), "category": data.get("category")}
+
+        items = [
+            item if "artistId" in item else {**item, **product_fields.get(item.get("productId"), {
+                "artistId": None, "category": None
+            })}
+            for item in order.get("items", [])
+        ]
+        artist_totals = {}
+        artist_units = {}
+        for item in items:
+            artist_id = item["artistId"]
+            if artist_id:
+                quantity = int(item.get("quantity") or 0)
+                artist_totals[artist_id] = round(
+                    artist_totals.get(artist_id, 0) + float(item.get("price") or 0) * quantity, 2
+                )
+                artist_units[artist_id] = artist_units.get(artist_id, 0) + quantity
+        changes = {"items": items, "artistTotals": artist_totals, "artistUnits": artist_units}
+        if "artistIds" not in order:
+            changes["artistIds"] = sorted(artist_units)
+        updates.append(("update", "orders", doc.id, changes))
+
+    for start in range(0, len(updates), BATCH_LIMIT):
+        await firebase_service.batch_write(updates[start:start + BATCH_LIMIT])
+        print(f"[BACKFILL] Updated {min(start + BATCH_LIMIT, len(updates))}/{len(updates)} orders")
+
+    return len(updates)
+
+
+if __name__ == "__main__":
+    count = asyncio.run(backfill())
+    print(f"[BACKFILL] Done, {count} orders updated")
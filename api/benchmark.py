@@ -0,0 +1,770 @@
+#!/usr/bin/env python3
+"""Benchmark every API route against seeded data at several scales.
+
+Runs against the Firestore and Auth emulators, never a live project: the
+seed step wipes the emulator first. Requests go through the ASGI app in
+process, so the numbers cover routing, auth, Firestore round trips and
+serialization, without any network hop to the API itself.
+
+    firebase emulators:start --only firestore,auth
+    python razorpay_stub.py &
+    export FIRESTORE_EMULATOR_HOST=localhost:8080 FIREBASE_AUTH_EMULATOR_HOST=localhost:9099
+    python benchmark.py run --scales 1k,10k -o before.json
+    python benchmark.py run --scales 1k,10k -o after.json
+    python benchmark.py compare before.json after.json
+
+With ``--backend memory`` the data lives in the in-memory Firestore client
+instead, so runs need no emulator and are deterministic; ``--latency``
+adds a simulated delay to every Firestore call.
+
+Each route reports throughput, p50/p95/p99 latency and the Firestore
+document reads it makes per request. Both ``run`` and ``compare`` exit
+non-zero when a route answered with anything but 2xx, and ``compare`` also
+does when a route got slower or read more than the threshold allows.
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000}
+# main.py grants the super user routes to this address
+SUPER_USER_EMAIL = "cnssreedhar2001@gmail.com"
+CATEGORIES = ["painting", "sculpture", "textile", "pottery", "jewellery", "woodwork", "prints", "metalwork"]
+STATES = ["Kerala", "Tamil Nadu", "Karnataka", "Maharashtra", "Gujarat", "Rajasthan", "West Bengal", "Odisha"]
+PAYMENT_STATUSES = ["completed"] * 7 + ["pending"] * 2 + ["failed"]
+# Products seeded with effectively unlimited stock for the order routes
+ORDERABLE_PRODUCTS = 20
+# Firestore caps a batch at 500 writes
+BATCH_LIMIT = 500
+SEED_CONCURRENCY = 8
+# Metrics compared between runs, and whether a higher value is worse
+METRICS = [("p50_ms", True), ("p99_ms", True), ("throughput", False), ("reads_per_request", True)]
+# Routes that only work with the Auth emulator running, which the memory
+# backend doesn't need otherwise
+AUTH_EMULATOR_ROUTES = {"POST /auth/signup"}
+# Routes left out because each request would destroy or promote the
+# fixtures the other routes read
+EXCLUDED = {
+    "POST /admin/users/{user_id}/grant-admin": "changes the fixture users' roles",
+    "POST /admin/users/{user_id}/revoke-admin": "changes the fixture users' roles",
+    "POST /admin/applications/{app_id}/approve": "consumes one application per request",
+    "DELETE /admin/applications/{app_id}": "consumes one application per request",
+    "DELETE /admin/onboarding/{worklist_id}": "consumes one worklist item per request",
+}
+
+
+# ==================== READ COUNTING ====================
+class ReadCounter:
+    """Counts the document reads Firestore bills for, by wrapping the async
+    client's read calls.
+
+    A document get or a document returned by a query is one read, and a
+    query or batch get that returns nothing still costs one. Aggregations
+    are counted as one read, the least they cost. Snapshot listeners use
+    the sync client and aren't counted.
+    """
+
+    def __init__(self):
+        self.reads = 0
+
+    def install(self, backend: str) -> None:
+        if backend == "memory":
+            from memory_firestore import (
+                MemoryAggregationQuery as AsyncAggregationQuery,
+                MemoryClient as AsyncClient,
+                MemoryDocumentReference as AsyncDocumentReference,
+                MemoryQuery as AsyncQuery,
+            )
+        else:
+            from google.cloud.firestore_v1.async_aggregation import AsyncAggregationQuery
+            from google.cloud.firestore_v1.async_client import AsyncClient
+            from google.cloud.firestore_v1.async_document import AsyncDocumentReference
+            from google.cloud.firestore_v1.async_query import AsyncQuery
+
+        counter = self
+
+        def counting_stream(original):
+            async def stream(self, *args, **kwargs):
+                returned = 0
+                async for doc in original(self, *args, **kwargs):
+                    returned += 1
+                    counter.reads += 1
+                    yield doc
+                if not returned:
+                    counter.reads += 1
+            return stream
+
+        def counting_get(original, reads: int = 1):
+            async def get(self, *args, **kwargs):
+                counter.reads += reads
+                return await original(self, *args, **kwargs)
+            return get
+
+        AsyncQuery.stream = counting_stream(AsyncQuery.stream)
+        AsyncClient.get_all = counting_stream(AsyncClient.get_all)
+        AsyncDocumentReference.get = counting_get(AsyncDocumentReference.get)
+        AsyncAggregationQuery.get = counting_get(AsyncAggregationQuery.get)
+
+
+read_counter = ReadCounter()
+
+
+# ==================== SEEDING ====================
+def _emulator_url(variable: str) -> str:
+    host = os.environ[variable]
+    return host if host.startswith("http") else f"http://{host}"
+
+
+async def clear_emulators(project_id: str) -> None:
+    """Wipe the emulators' Firestore documents and Auth accounts"""
+    import httpx
+
+    async with httpx.AsyncClient(timeout=60) as client:
+        response = await client.delete(
+            f"{_emulator_url('FIRESTORE_EMULATOR_HOST')}/emulator/v1/projects/{project_id}"
+            "/databases/(default)/documents"
+        )
+        response.raise_for_status()
+        response = await client.delete(
+            f"{_emulator_url('FIREBASE_AUTH_EMULATOR_HOST')}/emulator/v1/projects/{project_id}/accounts"
+        )
+        response.raise_for_status()
+
+
+def dataset(size: int, pending_orders: int, seed: int = 42) -> Dict[str, Dict[str, dict]]:
+    """Build a deterministic dataset of ``size`` products and orders"""
+    rng = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+    year = timedelta(days=365)
+    artists = [f"bench-artist-{i}" for i in range(max(size // 100, 1))]
+    buyers = [f"bench-user-{i}" for i in range(max(size // 10, 1))]
+
+    users = {
+        uid: {"email": f"{uid}@example.com", "name": f"Buyer {i}", "role": "user", "createdAt": now - year}
+        for i, uid in enumerate(buyers)
+    }
+    users.update({
+        uid: {"email": f"{uid}@example.com", "name": f"Artist {i}", "role": "artist", "createdAt": now - year}
+        for i, uid in enumerate(artists)
+    })
+    users["bench-admin"] = {"email": SUPER_USER_EMAIL, "name": "Admin", "role": "admin", "createdAt": now - year}
+
+    products = {}
+    for i in range(size):
+        created = now - year * rng.random()
+        artist = rng.choice(artists)
+        products[f"bench-product-{i:06d}"] = {
+            "title": f"Handmade piece {i}",
+            "description": f"A handmade {rng.choice(CATEGORIES)} made to order. " * 4,
+            "price": float(rng.randrange(200, 20000)),
+            "image": f"https://example.com/images/{i}.jpg",
+            "images": [],
+            "category": rng.choice(CATEGORIES),
+            "artStory": "Made by hand in the artist's workshop.",
+            "careInstructions": "Keep dry.",
+            "culturalContext": "A traditional craft.",
+            "artistId": artist,
+            "artistName": users[artist]["name"],
+            "stock": rng.randrange(0, 50),
+            "featured": rng.random() < 0.1,
+            "createdAt": created,
+            "updatedAt": created,
+        }
+    product_ids = list(products)
+
+    orders = {}
+    for i in range(size + pending_orders):
+        pending = i >= size
+        created = now - timedelta(minutes=5) if pending else now - year * rng.random()
+        items = []
+        for product_id in rng.sample(product_ids, min(rng.randint(1, 3), len(product_ids))):
+            product = products[product_id]
+            items.append({
+                "productId": product_id,
+                "title": product["title"],
+                "quantity": rng.randint(1, 2),
+                "price": product["price"],
+                "artistId": product["artistId"],
+                "category": product["category"],
+            })
+        artist_totals: Dict[str, float] = {}
+        artist_units: Dict[str, int] = {}
+        for item in items:
+            artist = item["artistId"]
+            artist_totals[artist] = round(artist_totals.get(artist, 0) + item["price"] * item["quantity"], 2)
+            artist_units[artist] = artist_units.get(artist, 0) + item["quantity"]
+        payment_status = "pending" if pending else rng.choice(PAYMENT_STATUSES)
+        order_id = f"bench-pending-{i - size:06d}" if pending else f"bench-order-{i:06d}"
+        orders[order_id] = {
+            "userId": "bench-user-0" if pending else rng.choice(buyers),
+            "artistIds": sorted(artist_totals),
+            "artistTotals": artist_totals,
+            "artistUnits": artist_units,
+            "items": items,
+            "total": round(sum(artist_totals.values()), 2),
+            "status": "confirmed" if payment_status == "completed" else "pending",
+            "paymentStatus": payment_status,
+            "paymentId": f"order_bench{i:07d}",
+            "shippingAddress": {
+                "fullName": "Bench Buyer", "phone": "9999999999", "email": "buyer@example.com",
+                "addressLine1": "1 Test Street", "city": "Kochi", "state": rng.choice(STATES),
+                "postalCode": "682001", "country": "India",
+            },
+            "createdAt": created,
+            "updatedAt": created + timedelta(minutes=rng.randint(0, 60)) if not pending else created,
+        }
+
+    blog_posts = {
+        f"bench-post-{i:04d}": {
+            "title": f"Studio notes {i}",
+            "content": "Notes from the workshop. " * 40,
+            "category": rng.choice(CATEGORIES),
+            "featuredImage": f"https://example.com/blog/{i}.jpg",
+            "images": [],
+            "published": rng.random() < 0.9,
+            "author": "Artist 0",
+            "authorId": artists[0],
+            "createdAt": now - year * rng.random(),
+            "updatedAt": now,
+        }
+        for i in range(200)
+    }
+    magazines = {
+        f"bench-issue-{i:03d}": {
+            "issue": i + 1,
+            "title": f"Issue {i + 1}",
+            "description": "This month's makers.",
+            "coverImage": f"https://example.com/magazine/{i}.jpg",
+            "content": "Feature story. " * 200,
+            "articles": [f"Article {j}" for j in range(8)],
+            "releaseDate": now - timedelta(days=30 * i),
+            "createdAt": now - timedelta(days=30 * i),
+        }
+        for i in range(50)
+    }
+    applications = {
+        f"bench-application-{i:04d}": {
+            "userId": rng.choice(buyers),
+            "artistName": f"Applicant {i}",
+            "email": f"applicant{i}@example.com",
+            "artForm": rng.choice(CATEGORIES),
+            "region": rng.choice(STATES),
+            "yearsOfPractice": rng.randint(1, 30),
+            "bio": "I have been practising my craft for years.",
+            "portfolio": [],
+            "mobileNumber": "9999999999",
+            "status": "pending",
+            "createdAt": now - year * rng.random(),
+            "updatedAt": now,
+        }
+        for i in range(100)
+    }
+    onboarding = {
+        f"bench-onboarding-{i:04d}": {
+            "applicationId": f"bench-application-{i:04d}",
+            "artistName": f"Applicant {i}",
+            "email": f"applicant{i}@example.com",
+            "status": "pending",
+            "createdAt": now - year * rng.random(),
+            "updatedAt": now,
+        }
+        for i in range(100)
+    }
+    return {
+        "users": users,
+        "products": products,
+        "orders": orders,
+        "blog_posts": blog_posts,
+        "magazines": magazines,
+        "work_with_us_applications": applications,
+        "onboarding_worklist": onboarding,
+    }
+
+
+async def write_dataset(db, data: Dict[str, Dict[str, dict]]) -> None:
+    """Write every document in batches, a few batches at a time"""
+    writes = [
+        (db.collection(collection).document(doc_id), doc)
+        for collection, docs in data.items()
+        for doc_id, doc in docs.items()
+    ]
+    semaphore = asyncio.Semaphore(SEED_CONCURRENCY)
+
+    async def commit(chunk):
+        async with semaphore:
+            batch = db.batch()
+            for ref, doc in chunk:
+                batch.set(ref, doc)
+            await batch.commit()
+
+    await asyncio.gather(*(
+        commit(writes[start:start + BATCH_LIMIT]) for start in range(0, len(writes), BATCH_LIMIT)
+    ))
+
+
+async def seed(size: int, pending_orders: int, backend: str) -> Dict[str, Dict[str, dict]]:
+    """Reset the emulators and load a dataset of the given size, with the
+    counters, rollups and stock the routes expect"""
+    from firebase_service import firebase_service
+    from inventory_service import inventory_service
+    from rollup_service import rollup_service
+    from stats_service import stats_service
+
+    # The memory backend starts out empty in every process
+    if backend == "emulator":
+        await clear_emulators(firebase_service.db.project)
+    data = dataset(size, pending_orders)
+    await write_dataset(firebase_service.db, data)
+    for product_id in list(data["products"])[:ORDERABLE_PRODUCTS]:
+        await inventory_service.set_stock(product_id, 10 ** 9)
+    await stats_service.rebuild()
+    await rollup_service.rebuild()
+    return data
+
+
+# ==================== ROUTES ====================
+def id_token(project_id: str, uid: str, email: str, role: str) -> str:
+    """An unsigned ID token, which the Auth emulator accepts"""
+    def encode(part: dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(part).encode()).decode().rstrip("=")
+
+    now = int(time.time())
+    claims = {
+        "iss": f"https://securetoken.google.com/{project_id}",
+        "aud": project_id,
+        "sub": uid,
+        "user_id": uid,
+        "email": email,
+        "role": role,
+        "iat": now,
+        "auth_time": now,
+        "exp": now + 3600,
+        "firebase": {"sign_in_provider": "password", "identities": {}},
+    }
+    return f"{encode({'alg': 'none', 'typ': 'JWT'})}.{encode(claims)}."
+
+
+# A benchmark case: name, HTTP method, the user it runs as (or None), and a
+# function from the request number to (path, JSON body, extra headers)
+Case = Tuple[str, str, Optional[str], Callable[[int], Tuple[str, Any, Dict[str, str]]]]
+
+
+def cases(data: Dict[str, Dict[str, dict]], webhook_secret: str, key_secret: str) -> List[Case]:
+    product_ids = list(data["products"])
+    post_ids = [doc_id for doc_id, post in data["blog_posts"].items() if post["published"]]
+    orderable = product_ids[:ORDERABLE_PRODUCTS]
+    pending = list(data["orders"])[len(product_ids):]
+    address = {
+        "fullName": "Bench Buyer", "phone": "9999999999", "email": "buyer@example.com",
+        "addressLine1": "1 Test Street", "city": "Kochi", "state": "Kerala",
+        "postalCode": "682001", "country": "India",
+    }
+    product_body = {
+        "title": "Benchmark piece", "description": "Made for the benchmark.", "price": 1500.0,
+        "image": "https://example.com/bench.jpg", "category": CATEGORIES[0], "artStory": "A story.",
+        "careInstructions": "Keep dry.", "culturalContext": "A tradition.", "stock": 5,
+    }
+    year_ago = (datetime.now() - timedelta(days=365)).date().isoformat()
+    today = datetime.now().date().isoformat()
+
+    def get(path: str):
+        return lambda i: (path, None, {})
+
+    def payment(i: int):
+        order = data["orders"][pending[i % len(pending)]]
+        payment_id = f"pay_bench{i:07d}"
+        signature = hmac.new(
+            key_secret.encode(), f"{order['paymentId']}|{payment_id}".encode(), hashlib.sha256
+        ).hexdigest()
+        return (
+            f"/orders/{pending[i % len(pending)]}/payment?razorpay_order_id={order['paymentId']}"
+            f"&razorpay_payment_id={payment_id}&razorpay_signature={signature}",
+            None, {}
+        )
+
+    def webhook(i: int):
+        body = json.dumps({
+            "event": "payment.captured",
+            "payload": {"payment": {"entity": {"id": f"pay_hook{i:07d}", "order_id": f"order_unknown{i:07d}"}}},
+        }).encode()
+        signature = hmac.new(webhook_secret.encode(), body, hashlib.sha256).hexdigest()
+        return "/webhooks/razorpay", body, {
+            "X-Razorpay-Signature": signature, "X-Razorpay-Event-Id": f"evt_bench{i:07d}_{time.time_ns()}"
+        }
+
+    return [
+        ("GET /health", "GET", None, get("/health")),
+        ("POST /auth/signup", "POST", None, lambda i: (
+            "/auth/signup", {"email": f"signup{i}-{time.time_ns()}@example.com", "name": "New", "password": "benchmark1"}, {}
+        )),
+        ("GET /auth/user", "GET", "buyer", get("/auth/user")),
+        ("GET /products", "GET", None, get("/products?limit=20")),
+        ("GET /products?category&sort=price_asc", "GET", None, get(f"/products?category={CATEGORIES[0]}&sort=price_asc")),
+        ("GET /products?featured&sort=newest", "GET", None, get("/products?featured=true&sort=newest")),
+        ("GET /products/search", "GET", None, get("/products/search?q=handmade+piece+42")),
+        ("POST /products/batch", "POST", None, lambda i: ("/products/batch", {"ids": product_ids[i % 50:i % 50 + 20]}, {})),
+        ("GET /products/{product_id}", "GET", None, lambda i: (f"/products/{product_ids[i % len(product_ids)]}", None, {})),
+        ("POST /products", "POST", "artist", lambda i: ("/products", product_body, {})),
+        ("PUT /products/{product_id}", "PUT", "artist", lambda i: (
+            f"/products/{product_ids[0]}", {**product_body, "title": f"Updated {i}"}, {}
+        )),
+        ("POST /orders", "POST", "buyer", lambda i: ("/orders", {
+            "items": [{"productId": orderable[i % len(orderable)], "title": "", "quantity": 1, "price": 0}],
+            "total": 0, "shippingAddress": address,
+        }, {})),
+        ("GET /orders", "GET", "buyer", get("/orders")),
+        ("POST /orders/{order_id}/payment", "POST", "buyer", payment),
+        ("POST /webhooks/razorpay", "POST", None, webhook),
+        ("GET /blog", "GET", None, get("/blog")),
+        ("GET /blog/{post_id}", "GET", None, lambda i: (f"/blog/{post_ids[i % len(post_ids)]}", None, {})),
+        ("POST /blog", "POST", "artist", lambda i: ("/blog", {
+            "title": "Benchmark post", "content": "Body. " * 50, "category": CATEGORIES[0],
+            "featuredImage": "https://example.com/b.jpg", "published": False,
+        }, {})),
+        ("GET /magazine", "GET", None, get("/magazine")),
+        ("POST /magazine", "POST", "admin", lambda i: ("/magazine", {
+            "id": f"bench-magazine-{i}", "createdAt": datetime.now().isoformat(),
+            "issue": 1000 + i, "title": "Benchmark issue", "description": "Bench.", "coverImage": "https://example.com/m.jpg",
+            "content": "Feature. " * 50, "articles": [], "releaseDate": datetime.now().isoformat(),
+        }, {})),
+        ("POST /work-with-us", "POST", "buyer", lambda i: ("/work-with-us", {
+            "artistName": "Bench Applicant", "email": "applicant@example.com", "artForm": CATEGORIES[0],
+            "region": STATES[0], "yearsOfPractice": 3, "bio": "Bio.", "portfolio": [], "mobileNumber": "9999999999",
+        }, {})),
+        ("GET /work-with-us", "GET", "admin", get("/work-with-us")),
+        ("GET /artist/products", "GET", "artist", get("/artist/products")),
+        ("GET /artist/orders", "GET", "artist", get("/artist/orders")),
+        ("GET /artist/analytics", "GET", "artist", get("/artist/analytics")),
+        ("GET /artist/analytics/revenue", "GET", "artist", get("/artist/analytics/revenue?by=product")),
+        ("GET /artist/analytics/timeseries", "GET", "artist", get(f"/artist/analytics/timeseries?start={year_ago}&end={today}")),
+        ("GET /admin/analytics/overview", "GET", "admin", get("/admin/analytics/overview")),
+        ("GET /admin/analytics/revenue", "GET", "admin", get("/admin/analytics/revenue?by=category")),
+        ("GET /admin/analytics/timeseries", "GET", "admin", get(f"/admin/analytics/timeseries?start={year_ago}&end={today}")),
+        ("GET /admin/analytics/payments", "GET", "admin", get("/admin/analytics/payments")),
+        ("GET /admin/analytics/users", "GET", "admin", get("/admin/analytics/users")),
+        ("GET /admin/users/search", "GET", "admin", get("/admin/users/search?query=artist")),
+        ("GET /admin/orders/all", "GET", "admin", get("/admin/orders/all")),
+        ("GET /admin/orders/export", "GET", "admin", get(f"/admin/orders/export?format=ndjson&start={today}")),
+        ("GET /admin/users/export", "GET", "admin", get("/admin/users/export?format=csv")),
+        ("GET /admin/applications", "GET", "admin", get("/admin/applications")),
+        ("GET /admin/onboarding", "GET", "admin", get("/admin/onboarding")),
+        ("POST /admin/onboarding/{worklist_id}/status", "POST", "admin", lambda i: (
+            f"/admin/onboarding/bench-onboarding-{i % 100:04d}/status", {"status": "pending"}, {}
+        )),
+    ]
+
+
+def uncovered_routes(app, benchmarked: List[Case]) -> List[str]:
+    """Routes in the app that are neither benchmarked nor deliberately excluded"""
+    covered = {name.split("?")[0] for name, *_ in benchmarked} | set(EXCLUDED)
+    missing = []
+    for route in app.routes:
+        for method in sorted(getattr(route, "methods", None) or ()):
+            name = f"{method} {route.path}"
+            if method not in ("HEAD", "OPTIONS") and route.path not in ("/docs", "/redoc", "/openapi.json") \
+                    and not route.path.startswith("/docs/") and name not in covered:
+                missing.append(name)
+    return missing
+
+
+# ==================== MEASUREMENT ====================
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+async def measure(client, case: Case, tokens: Dict[str, str], requests: int, warmup: int, concurrency: int) -> dict:
+    """Send a case's requests from ``concurrency`` workers and summarize them"""
+    name, method, user, build = case
+    latencies: List[float] = []
+    errors: Dict[int, int] = {}
+
+    async def send(i: int, record: bool) -> None:
+        path, body, headers = build(i)
+        if user:
+            headers = {**headers, "Authorization": f"Bearer {tokens[user]}"}
+        kwargs = {"content": body} if isinstance(body, bytes) else {"json": body}
+        started = time.perf_counter()
+        response = await client.request(method, path, headers=headers, **kwargs)
+        elapsed = time.perf_counter() - started
+        if record:
+            latencies.append(elapsed)
+            if not 200 <= response.status_code < 300:
+                errors[response.status_code] = errors.get(response.status_code, 0) + 1
+
+    # Workers share one iterator, so each request number is sent once
+    numbers = iter(range(warmup, warmup + requests))
+
+    async def worker() -> None:
+        for i in numbers:
+            await send(i, True)
+
+    for i in range(warmup):
+        await send(i, False)
+    reads_before = read_counter.reads
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    reads = read_counter.reads - reads_before
+
+    latencies.sort()
+    return {
+        "route": name,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": round(len(latencies) / wall, 1) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "reads_per_request": round(reads / len(latencies), 1) if latencies else 0.0,
+    }
+
+
+async def run_scale(
+    scale: str, requests: int, warmup: int, concurrency: int, only: Optional[str], auth_emulator: bool = True
+) -> dict:
+    """Seed one scale, start the app and measure every route"""
+    import httpx
+    from analytics_service import analytics_service
+    from config import settings
+    from main import app
+
+    backend = "memory" if settings.firestore_backend == "memory" else "emulator"
+    read_counter.install(backend)
+    started = time.perf_counter()
+    data = await seed(SCALES[scale], warmup + requests, backend)
+    seed_seconds = time.perf_counter() - started
+
+    project_id = app_project_id()
+    tokens = {
+        "buyer": id_token(project_id, "bench-user-0", "bench-user-0@example.com", "user"),
+        "artist": id_token(project_id, "bench-artist-0", "bench-artist-0@example.com", "artist"),
+        "admin": id_token(project_id, "bench-admin", SUPER_USER_EMAIL, "admin"),
+    }
+    benchmarked = cases(data, settings.razorpay_webhook_secret, settings.razorpay_key_secret)
+    for route in uncovered_routes(app, benchmarked):
+        print(f"[BENCH] ⚠ {route} has no benchmark case")
+    if only:
+        benchmarked = [case for case in benchmarked if only in case[0]]
+    if not auth_emulator:
+        for route in sorted(AUTH_EMULATOR_ROUTES):
+            print(f"[BENCH] Skipping {route}: it needs the Auth emulator")
+        benchmarked = [case for case in benchmarked if case[0] not in AUTH_EMULATOR_ROUTES]
+
+    await app.router.startup()
+    try:
+        await analytics_service.refresh()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=120) as client:
+            results = []
+            for case in benchmarked:
+                result = await measure(client, case, tokens, requests, warmup, concurrency)
+                print(
+                    f"[BENCH] {scale:>4} {result['route']:<48} {result['throughput']:>8} req/s"
+                    f"  p50 {result['p50_ms']:>8} ms  p99 {result['p99_ms']:>8} ms"
+                    f"  {result['reads_per_request']:>8} reads"
+                    + (f"  errors {result['errors']}" if result["errors"] else "")
+                )
+                results.append(result)
+    finally:
+        await app.router.shutdown()
+    return {"size": SCALES[scale], "seed_seconds": round(seed_seconds, 1), "routes": results}
+
+
+def app_project_id() -> str:
+    from firebase_service import firebase_service
+    return firebase_service.db.project
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+# ==================== COMMANDS ====================
+def require_emulators() -> None:
+    missing = [v for v in ("FIRESTORE_EMULATOR_HOST", "FIREBASE_AUTH_EMULATOR_HOST") if not os.environ.get(v)]
+    if missing:
+        sys.exit(f"[BENCH] Set {' and '.join(missing)}; the benchmark wipes the database it runs against")
+
+
+def command_run(args) -> None:
+    if args.backend == "emulator":
+        require_emulators()
+    scales = args.scales.split(",")
+    unknown = [scale for scale in scales if scale not in SCALES]
+    if unknown:
+        sys.exit(f"[BENCH] Unknown scales: {', '.join(unknown)}. Use {', '.join(SCALES)}")
+
+    results = {
+        "commit": git_commit(),
+        "createdAt": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "requests": args.requests,
+        "warmup": args.warmup,
+        "concurrency": args.concurrency,
+        "replica": args.replica,
+        "backend": args.backend,
+        "latency": args.latency,
+        "scales": {},
+    }
+    # Each scale runs in a fresh process so caches, indexes and snapshots
+    # loaded for one dataset don't carry over to the next
+    for scale in scales:
+        with tempfile.TemporaryDirectory() as workdir:
+            output = os.path.join(workdir, "scale.json")
+            command = [
+                sys.executable, os.path.abspath(__file__), "scale", scale, output,
+                "--requests", str(args.requests), "--warmup", str(args.warmup),
+                "--concurrency", str(args.concurrency),
+            ] + (["--only", args.only] if args.only else [])
+            env = {
+                **os.environ,
+                "ANALYTICS_DIR": os.path.join(workdir, "analytics"),
+                "CATALOG_REPLICA": "true" if args.replica else "false",
+                "CATALOG_REPLICA_PATH": os.path.join(workdir, "replica", "catalog.db"),
+            }
+            if args.backend == "memory":
+                env["FIRESTORE_BACKEND"] = "memory"
+                env["FIRESTORE_LATENCY"] = str(args.latency)
+                # Emulator mode accepts the benchmark's unsigned tokens
+                # without contacting anything; only signup needs it running
+                if not os.environ.get("FIREBASE_AUTH_EMULATOR_HOST"):
+                    env["FIREBASE_AUTH_EMULATOR_HOST"] = "localhost:9099"
+                    command.append("--without-auth-emulator")
+            env.setdefault("RAZORPAY_BASE_URL", "http://localhost:9000/v1")
+            env.setdefault("RAZORPAY_WEBHOOK_SECRET", "benchmark-webhook-secret")
+            subprocess.run(command, env=env, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+            with open(output) as f:
+                results["scales"][scale] = json.load(f)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"[BENCH] Results written to {args.output}")
+
+    # A route that answered with errors was timing its error path
+    failed = [
+        f"{scale} {route['route']} {route['errors']}"
+        for scale, result in results["scales"].items() for route in result["routes"] if route["errors"]
+    ]
+    if failed:
+        print(f"[BENCH] {len(failed)} routes returned non-2xx responses:")
+        for line in failed:
+            print(f"[BENCH]   {line}")
+        sys.exit(1)
+
+
+def command_scale(args) -> None:
+    result = asyncio.run(run_scale(
+        args.scale, args.requests, args.warmup, args.concurrency, args.only,
+        auth_emulator=not args.without_auth_emulator
+    ))
+    with open(args.output, "w") as f:
+        json.dump(result, f)
+
+
+def compare(base: dict, head: dict, threshold: float) -> Tuple[List[str], List[str]]:
+    """Lines describing each route's change between two runs, and the
+    failures and regressions among them"""
+    lines, regressions = [], []
+    for scale, head_scale in head["scales"].items():
+        base_routes = {r["route"]: r for r in base["scales"].get(scale, {}).get("routes", [])}
+        for route in head_scale["routes"]:
+            before = base_routes.get(route["route"])
+            if route["errors"]:
+                line = f"{scale:>4} {route['route']:<48} failed with {route['errors']}"
+                lines.append(line)
+                regressions.append(line)
+                continue
+            if before is None:
+                lines.append(f"{scale:>4} {route['route']:<48} new")
+                continue
+            if before["errors"]:
+                lines.append(f"{scale:>4} {route['route']:<48} not compared, base run had errors")
+                continue
+            changes = []
+            regressed = False
+            for metric, worse_when_higher in METRICS:
+                old, new = before[metric], route[metric]
+                delta = (new - old) / old * 100 if old else (0.0 if new == old else 100.0)
+                changes.append(f"{metric} {old}→{new} ({delta:+.0f}%)")
+                if delta > threshold if worse_when_higher else delta < -threshold:
+                    regressed = True
+            line = f"{scale:>4} {route['route']:<48} " + "  ".join(changes)
+            lines.append(line)
+            if regressed:
+                regressions.append(line)
+    return lines, regressions
+
+
+def command_compare(args) -> None:
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+    lines, regressions = compare(base, head, args.threshold)
+    print(f"[BENCH] {base.get('commit')} → {head.get('commit')}")
+    for line in lines:
+        print(line)
+    if regressions:
+        print(f"[BENCH] {len(regressions)} routes failed or regressed by more than {args.threshold}%:")
+        for line in regressions:
+            print(line)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Seed each scale and benchmark every route")
+    run.add_argument("--scales", default="1k,10k", help=f"Comma-separated scales from {', '.join(SCALES)}")
+    run.add_argument("--requests", type=int, default=200, help="Measured requests per route")
+    run.add_argument("--warmup", type=int, default=20, help="Unmeasured requests per route first")
+    run.add_argument("--concurrency", type=int, default=10, help="Requests in flight at once")
+    run.add_argument("--replica", action="store_true", help="Serve catalog reads from the SQLite replica")
+    run.add_argument("--backend", choices=["emulator", "memory"], default="emulator", help="Where the data lives")
+    run.add_argument("--latency", type=float, default=0.0, help="Simulated seconds per call with --backend memory")
+    run.add_argument("--only", help="Only benchmark routes whose name contains this")
+    run.add_argument("-o", "--output", default="benchmark.json", help="Where to write the results")
+    run.set_defaults(handler=command_run)
+
+    scale = commands.add_parser("scale", help=argparse.SUPPRESS)
+    scale.add_argument("scale", choices=list(SCALES))
+    scale.add_argument("output")
+    scale.add_argument("--requests", type=int, default=200)
+    scale.add_argument("--warmup", type=int, default=20)
+    scale.add_argument("--concurrency", type=int, default=10)
+    scale.add_argument("--only")
+    scale.add_argument("--without-auth-emulator", action="store_true")
+    scale.set_defaults(handler=command_scale)
+
+    diff = commands.add_parser("compare", help="Compare two result files")
+    diff.add_argument("base")
+    diff.add_argument("head")
+    diff.add_argument("--threshold", type=float, default=10.0, help="Allowed slowdown in percent")
+    diff.set_defaults(handler=command_compare)
+
+    parsed = parser.parse_args()
+    parsed.handler(parsed)
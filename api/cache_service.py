@@ -0,0 +1,202 @@
+from firebase_service import firebase_service
+from config import settings
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+import hashlib
+import json
+import threading
+import time
+
+# Product fields that change with every sale. Listing pages may show them up
+# to the TTL out of date rather than being dropped on each checkout; single
+# products are always updated.
+VOLATILE_FIELDS = {"stock"}
+
+
+def _listing_digest(data: dict) -> str:
+    """Fingerprint of everything a listing page can show or filter on"""
+    listed = {field: value for field, value in data.items() if field not in VOLATILE_FIELDS}
+    return hashlib.sha1(json.dumps(listed, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe LRU map whose entries also expire after ``ttl`` seconds"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class CatalogCache:
+    """Read-through cache for the products collection.
+
+    Single products, listing pages and listing counts are served from memory. A Firestore
+    snapshot listener loads the catalog into the cache, pushes product changes
+    into it and drops listing pages when a change could alter them; the TTL is
+    only a safety net for when the listener is down and for VOLATILE_FIELDS.
+    Cached documents are shared between requests and must not be mutated.
+    """
+
+    collection = "products"
+
+    def __init__(self, service, max_size: int, ttl: float):
+        self.service = service
+        self.products = LRUCache(max_size, ttl)
+        self.pages = LRUCache(max_size, ttl)
+        self._watch = None
+        # Listing digest of every product, filled by the listener's initial
+        # snapshot; None until then
+        self._listings: Optional[Dict[str, str]] = None
+        # Bumped on every invalidation so a read that raced with a change
+        # doesn't put the old data back into the cache
+        self._generation = 0
+
+    async def get_product(self, product_id: str) -> Optional[dict]:
+        """Get a product, from memory when possible"""
+        product = self.products.get(product_id)
+        if product is None:
+            generation = self._generation
+            product = await self.service.get_document(self.collection, product_id)
+            if product is not None and generation == self._generation:
+                self.products.put(product_id, product)
+        return product
+
+    async def get_products(self, product_ids: List[str]) -> Tuple[List[dict], List[str]]:
+        """Get many products, fetching only the uncached ones in a single batch read.
+
+        Returns the products found in request order and the IDs that don't exist.
+        """
+        unique_ids = list(dict.fromkeys(product_ids))
+        found = {}
+        for product_id in unique_ids:
+            product = self.products.get(product_id)
+            if product is not None:
+                found[product_id] = product
+        uncached = [product_id for product_id in unique_ids if product_id not in found]
+        if uncached:
+            generation = self._generation
+            fetched, _ = await self.service.get_documents(self.collection, uncached)
+            for product in fetched:
+                found[product["id"]] = product
+                if generation == self._generation:
+                    self.products.put(product["id"], product)
+        products = [found[product_id] for product_id in unique_ids if product_id in found]
+        missing = [product_id for product_id in unique_ids if product_id not in found]
+        return products, missing
+
+    async def query_page(
+        self,
+        filters: Optional[List[Tuple[str, str, Any]]] = None,
+        order_by: Optional[List[Tuple[str, str]]] = None,
+        limit: int = 20,
+        page_token: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+        offset: int = 0,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """Get a page of products, from memory when the same page was recently served"""
+        key = (tuple(filters or ()), tuple(order_by or ()), limit, page_token, tuple(fields or ()), offset)
+        page = self.pages.get(key)
+        if page is None:
+            generation = self._generation
+            page = await self.service.query_page(
+                self.collection, filters=filters, order_by=order_by, limit=limit,
+                page_token=page_token, fields=fields, offset=offset
+            )
+            if generation == self._generation:
+                self.pages.put(key, page)
+        return page
+
+    async def count(self, filters: Optional[List[Tuple[str, str, Any]]] = None) -> int:
+        """Count the products matching a listing's filters with one aggregation read"""
+        key = ("count", tuple(filters or ()))
+        total = self.pages.get(key)
+        if total is None:
+            generation = self._generation
+            total = await self.service.count(self.collection, filters)
+            if generation == self._generation:
+                self.pages.put(key, total)
+        return total
+
+    def invalidate(self, product_id: Optional[str] = None) -> None:
+        """Drop a product (or every product) and all cached listing pages"""
+        self._generation += 1
+        if product_id is None:
+            self.products.clear()
+        else:
+            self.products.pop(product_id)
+        self.pages.clear()
+
+    def _on_snapshot(self, docs, changes, read_time) -> None:
+        if self._listings is None:
+            # Initial snapshot: the whole collection, loaded into the cache
+            self._generation += 1
+            self._listings = {}
+            for doc in docs:
+                data = doc.to_dict()
+                self._listings[doc.id] = _listing_digest(data)
+                self.products.put(doc.id, {**data, "id": doc.id})
+            self.pages.clear()
+            return
+        if not changes:
+            return
+        self._generation += 1
+        listings_changed = False
+        for change in changes:
+            doc = change.document
+            if change.type.name == "REMOVED":
+                self.products.pop(doc.id)
+                self._listings.pop(doc.id, None)
+                listings_changed = True
+                continue
+            data = doc.to_dict()
+            self.products.put(doc.id, {**data, "id": doc.id})
+            digest = _listing_digest(data)
+            if self._listings.get(doc.id) != digest:
+                self._listings[doc.id] = digest
+                listings_changed = True
+        if listings_changed:
+            self.pages.clear()
+
+    def start(self) -> None:
+        """Start listening for product changes"""
+        if self._watch is None:
+            self._watch = self.service.watch_collection(self.collection, self._on_snapshot)
+
+    def stop(self) -> None:
+        """Stop the product listener"""
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+            self._listings = None
+
+
+catalog_cache = CatalogCache(firebase_service, settings.catalog_cache_size, settings.catalog_cache_ttl)
@@ -7,9 +7,34 @@ class Settings(BaseSettings):
     firebase_project_id: str = "fir-gia-95889"
     firebase_private_key: str = ""
     firebase_client_email: str = ""
+    firestore_backend: str = "firestore"
+    firestore_latency: float = 0.0
     razorpay_key_id: str = "your_razorpay_key"
     razorpay_key_secret: str = "your_razorpay_secret"
+    razorpay_base_url: str = "https://api.razorpay.com/v1"
+    razorpay_timeout: float = 10.0
+    razorpay_max_retries: int = 2
+    razorpay_max_connections: int = 20
+    razorpay_webhook_secret: str = ""
+    webhook_sweep_interval: int = 60
+    analytics_dir: str = "analytics_data"
+    analytics_refresh_interval: int = 300
     api_port: int = 8000
+    compression_minimum_size: int = 1000
+    brotli_quality: int = 4
+    token_cache_size: int = 10000
+    token_cache_ttl: int = 600
+    signing_cert_min_refresh: int = 60
+    stats_shards: int = 10
+    rollup_shards: int = 1
+    catalog_cache_size: int = 5000
+    catalog_cache_ttl: int = 300
+    catalog_cache_listen: bool = True
+    catalog_replica: bool = False
+    catalog_replica_path: str = "replica_data/catalog.db"
+    stock_shards: int = 5
+    stock_reservation_ttl: int = 900
+    stock_release_interval: int = 60
     environment: str = "development"
     cors_origins: List[str] = [
         "http://localhost:3000",
@@ -0,0 +1,87 @@
+from firebase_service import firebase_service
+from datetime import datetime
+from typing import Any, AsyncIterator, List, Optional
+import csv
+import io
+import json
+
+ORDER_COLUMNS = [
+    "id", "createdAt", "userId", "artistIds", "status", "paymentStatus", "total",
+    "refundedAmount", "paymentId", "razorpayPaymentId", "items", "shippingAddress", "updatedAt",
+]
+USER_COLUMNS = ["id", "createdAt", "email", "name", "phone", "role", "updatedAt"]
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+# Rows encoded per chunk handed to the response
+CHUNK_ROWS = 500
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _cell(value: Any) -> Any:
+    """Flatten a Firestore value into a CSV cell"""
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=_json_default, separators=(",", ":"))
+    return value
+
+
+class ExportService:
+    """Stream collections out as NDJSON or CSV.
+
+    Documents are encoded as Firestore streams them and handed on in small
+    chunks, so an export of any size runs in constant memory and the first
+    bytes go out before the query finishes.
+    """
+
+    def __init__(self, service):
+        self.service = service
+
+    async def export(
+        self,
+        collection: str,
+        columns: List[str],
+        fmt: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> AsyncIterator[bytes]:
+        """Yield a collection's documents created in [start, end), oldest first"""
+        filters = []
+        if start:
+            filters.append(("createdAt", ">=", start))
+        if end:
+            filters.append(("createdAt", "<", end))
+        docs = self.service.stream_query(collection, filters=filters, order_by=[("createdAt", "asc")])
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if fmt == "csv" else None
+        if writer:
+            writer.writerow(columns)
+        rows = 0
+        try:
+            async for doc in docs:
+                if writer:
+                    writer.writerow([_cell(doc.get(column)) for column in columns])
+                else:
+                    buffer.write(json.dumps(doc, default=_json_default, separators=(",", ":")))
+                    buffer.write("\n")
+                rows += 1
+                if rows % CHUNK_ROWS == 0:
+                    yield buffer.getvalue().encode()
+                    buffer.seek(0)
+                    buffer.truncate()
+        except Exception as e:
+            # Headers are already sent, so all we can do is cut the export short
+            print(f"Error exporting {collection} after {rows} rows: {e}")
+            raise
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+
+
+export_service = ExportService(firebase_service)
@@ -1,121 +1,378 @@
 import firebase_admin
-from firebase_admin import credentials, db, firestore
+from firebase_admin import credentials, firestore, firestore_async
 from config import settings
+import base64
 import json
-from typing import Any, Optional, List
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, Optional, List, Sequence, Tuple
 import os
 
 # Initialize Firebase
 firestore_client = None
+# Client snapshot listeners attach to; None means Firestore's sync client
+listener_client = None
 
-try:
-    # Check if serviceAccount.json exists in the api directory
-    service_account_path = os.path.join(os.path.dirname(__file__), 'serviceAccount.json')
+if settings.firestore_backend == "memory":
+    # Offline backend for tests and load tests: no credentials or network
+    from memory_firestore import MemoryClient
+
+    firestore_client = listener_client = MemoryClient(
+        latency=settings.firestore_latency, project=settings.firebase_project_id
+    )
+    try:
+        # Token verification still needs an app, e.g. against the Auth emulator
+        firebase_admin.initialize_app(options={"projectId": settings.firebase_project_id})
+    except ValueError:
+        pass
+    print("✓ Using the in-memory Firestore backend")
+else:
+    try:
+        # Check if serviceAccount.json exists in the api directory
+        service_account_path = os.path.join(os.path.dirname(__file__), 'serviceAccount.json')
     
-    if os.path.exists(service_account_path):
-        # Use serviceAccount.json if it exists
-        cred = credentials.Certificate(service_account_path)
-    elif settings.firebase_private_key and settings.firebase_client_email and settings.firebase_project_id:
-        # Use environment variables if available
-        cred = credentials.Certificate({
-            "type": "service_account",
-            "project_id": settings.firebase_project_id,
-            "private_key": settings.firebase_private_key.replace('\\n', '\n'),
-            "client_email": settings.firebase_client_email,
-            "client_id": "0",
-            "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-            "token_uri": "https://oauth2.googleapis.com/token",
-            "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
-            "client_x509_cert_url": "https://www.googleapis.com/robot/v1/metadata/x509/firebase-adminsdk-fbsvc%40fir-gia-95889.iam.gserviceaccount.com"
-        })
-    else:
-        raise ValueError("No Firebase credentials found")
+        if os.path.exists(service_account_path):
+            # Use serviceAccount.json if it exists
+            cred = credentials.Certificate(service_account_path)
+        elif settings.firebase_private_key and settings.firebase_client_email and settings.firebase_project_id:
+            # Use environment variables if available
+            cred = credentials.Certificate({
+                "type": "service_account",
+                "project_id": settings.firebase_project_id,
+                "private_key": settings.firebase_private_key.replace('\\n', '\n'),
+                "client_email": settings.firebase_client_email,
+                "client_id": "0",
+                "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+                "token_uri": "https://oauth2.googleapis.com/token",
+                "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
+                "client_x509_cert_url": "https://www.googleapis.com/robot/v1/metadata/x509/firebase-adminsdk-fbsvc%40fir-gia-95889.iam.gserviceaccount.com"
+            })
+        else:
+            raise ValueError("No Firebase credentials found")
     
-    firebase_admin.initialize_app(cred)
-    firestore_client = firestore.client()
-    print("✓ Firebase initialized successfully")
-except ValueError as e:
-    # Already initialized or missing credentials
-    if "already exists" in str(e):
-        try:
-            firestore_client = firestore.client()
-            print("✓ Firebase already initialized")
-        except Exception as e2:
-            print(f"⚠ Firebase initialization error: {e2}")
-    else:
-        print(f"⚠ Firebase credentials not available: {e}")
-        print("  Set FIREBASE_PRIVATE_KEY and FIREBASE_CLIENT_EMAIL in .env file")
-except Exception as e:
-    print(f"✗ Firebase initialization failed: {e}")
-    print(f"  Make sure serviceAccount.json exists or .env has Firebase credentials")
+        firebase_admin.initialize_app(cred)
+        firestore_client = firestore_async.client()
+        print("✓ Firebase initialized successfully")
+    except ValueError as e:
+        # Already initialized or missing credentials
+        if "already exists" in str(e):
+            try:
+                firestore_client = firestore_async.client()
+                print("✓ Firebase already initialized")
+            except Exception as e2:
+                print(f"⚠ Firebase initialization error: {e2}")
+        else:
+            print(f"⚠ Firebase credentials not available: {e}")
+            print("  Set FIREBASE_PRIVATE_KEY and FIREBASE_CLIENT_EMAIL in .env file")
+    except Exception as e:
+        print(f"✗ Firebase initialization failed: {e}")
+        print(f"  Make sure serviceAccount.json exists or .env has Firebase credentials")
+
+
+_DIRECTIONS = {"asc": "ASCENDING", "desc": "DESCENDING"}
+_OPERATORS = {
+    "==", "!=", "<", "<=", ">", ">=",
+    "in", "not-in", "array_contains", "array_contains_any",
+}
+
+
+def _encode_page_token(values: List[Any]) -> str:
+    """Encode the cursor values of the last document on a page into an opaque token"""
+    encoded = [
+        {"$dt": value.isoformat()} if isinstance(value, datetime) else value
+        for value in values
+    ]
+    payload = json.dumps(encoded, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def _decode_page_token(token: str) -> List[Any]:
+    """Decode a page token back into Firestore cursor values"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or not values:
+            raise ValueError
+    except ValueError:
+        raise ValueError("Invalid page token")
+    return [
+        datetime.fromisoformat(value["$dt"]) if isinstance(value, dict) and "$dt" in value else value
+        for value in values
+    ]
 
 
 class FirebaseService:
-    def __init__(self):
-        if firestore_client is None:
+    """Firestore data layer built on the async client.
+
+    Every method is a coroutine so route handlers can await Firestore round
+    trips without blocking the event loop. The backend is any object with the
+    async client's API: Firestore itself, or the in-memory client from
+    memory_firestore when FIRESTORE_BACKEND=memory.
+    """
+
+    def __init__(self, db=None, listener_db=None):
+        db = db if db is not None else firestore_client
+        if db is None:
             raise RuntimeError("Firebase not initialized. Check serviceAccount.json or .env file.")
-        self.db = firestore_client
+        self.db = db
+        self.listener_db = listener_db if listener_db is not None else (
+            listener_client if db is firestore_client else db
+        )
 
-    def add_document(self, collection: str, data: dict) -> str:
+    async def add_document(self, collection: str, data: dict) -> str:
         """Add a new document and return its ID"""
         doc_ref = self.db.collection(collection).document()
-        doc_ref.set(data)
+        await doc_ref.set(data)
         return doc_ref.id
 
-    def get_document(self, collection: str, doc_id: str) -> Optional[dict]:
+    async def set_document(self, collection: str, doc_id: str, data: dict) -> str:
+        """Create or overwrite a document with a specific ID"""
+        await self.db.collection(collection).document(doc_id).set(data)
+        return doc_id
+
+    async def get_document(self, collection: str, doc_id: str) -> Optional[dict]:
         """Get a single document by ID"""
-        doc = self.db.collection(collection).document(doc_id).get()
+        doc = await self.db.collection(collection).document(doc_id).get()
         if doc.exists:
             return {**doc.to_dict(), "id": doc.id}
         return None
 
-    def update_document(self, collection: str, doc_id: str, data: dict) -> bool:
+    async def get_documents(self, collection: str, doc_ids: List[str]) -> Tuple[List[dict], List[str]]:
+        """Get many documents by ID in one round trip.
+
+        Duplicate IDs are fetched once. Returns the documents that exist, in
+        the order their IDs were first given, and the IDs that don't.
+        """
+        unique_ids = list(dict.fromkeys(doc_ids))
+        if not unique_ids:
+            return [], []
+        refs = [self.db.collection(collection).document(doc_id) for doc_id in unique_ids]
+        found = {}
+        async for doc in self.db.get_all(refs):
+            if doc.exists:
+                found[doc.id] = {**doc.to_dict(), "id": doc.id}
+        documents = [found[doc_id] for doc_id in unique_ids if doc_id in found]
+        missing = [doc_id for doc_id in unique_ids if doc_id not in found]
+        return documents, missing
+
+    async def update_document(self, collection: str, doc_id: str, data: dict) -> bool:
         """Update a document"""
-        self.db.collection(collection).document(doc_id).update(data)
+        await self.db.collection(collection).document(doc_id).update(data)
         return True
 
-    def delete_document(self, collection: str, doc_id: str) -> bool:
+    async def delete_document(self, collection: str, doc_id: str) -> bool:
         """Delete a document"""
-        self.db.collection(collection).document(doc_id).delete()
+        await self.db.collection(collection).document(doc_id).delete()
         return True
 
-    def get_collection(self, collection: str, limit: int = 100, offset: int = 0) -> List[dict]:
+    async def get_collection(
+        self, collection: str, limit: int = 100, fields: Optional[List[str]] = None
+    ) -> List[dict]:
         """Get all documents from a collection"""
+        items, _ = await self.get_collection_page(collection, limit=limit, fields=fields)
+        return items
+
+    async def get_collection_page(
+        self,
+        collection: str,
+        limit: int = 20,
+        page_token: Optional[str] = None,
+        order_by: Optional[List[Tuple[str, str]]] = None,
+        fields: Optional[List[str]] = None,
+        offset: int = 0,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """Get one page of a collection and the token for the next page"""
         try:
-            query = self.db.collection(collection)
-            if offset > 0:
-                # Firestore doesn't support offset natively, so we fetch extra and slice
-                docs = query.limit(limit + offset).stream()
-                docs_list = [{**doc.to_dict(), "id": doc.id} for doc in docs]
-                return docs_list[offset:offset + limit]
-            else:
-                docs = query.limit(limit).stream()
-                return [{**doc.to_dict(), "id": doc.id} for doc in docs]
+            return await self.query_page(
+                collection, order_by=order_by, limit=limit, page_token=page_token, fields=fields,
+                offset=offset
+            )
+        except ValueError:
+            raise
         except Exception as e:
             print(f"Error fetching collection {collection}: {e}")
-            return []
+            return [], None
+
+    def _filter_query(self, collection: str, filters: Optional[List[Tuple[str, str, Any]]] = None):
+        query = self.db.collection(collection)
+        for field, operator, value in filters or []:
+            if operator not in _OPERATORS:
+                raise ValueError(f"Unsupported operator: {operator}")
+            query = query.where(field, operator, value)
+        return query
+
+    def _build_query(
+        self,
+        collection: str,
+        filters: Optional[List[Tuple[str, str, Any]]] = None,
+        order_by: Optional[List[Tuple[str, str]]] = None,
+        fields: Optional[List[str]] = None,
+    ):
+        """Build a Firestore query from (field, operator, value) filters and
+        (field, "asc"|"desc") orderings.
+
+        The document ID is always appended as the final ordering so results
+        are stable and can be resumed from a cursor. With ``fields``, Firestore
+        returns only those fields (plus the ordered ones, which page tokens
+        need). Returns the query and the list of explicitly ordered fields.
+        """
+        query = self._filter_query(collection, filters)
+        order_fields = []
+        direction = "asc"
+        for field, direction in order_by or []:
+            query = query.order_by(field, direction=_DIRECTIONS[direction])
+            order_fields.append(field)
+        query = query.order_by("__name__", direction=_DIRECTIONS[direction])
+        if fields:
+            query = query.select(list(dict.fromkeys([*fields, *order_fields])))
+        return query, order_fields
+
+    async def query_page(
+        self,
+        collection: str,
+        filters: Optional[List[Tuple[str, str, Any]]] = None,
+        order_by: Optional[List[Tuple[str, str]]] = None,
+        limit: int = 20,
+        page_token: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+        offset: int = 0,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """Run a filtered, ordered query and return one page plus the next page token.
 
-    def query_collection(
-        self, collection: str, field: str, operator: str, value: Any, limit: int = 100
+        Pages are walked with Firestore cursors (order_by + start_after), so
+        each page costs exactly ``limit`` reads however deep it is. ``offset``
+        is only for clients still paging with ?skip=; Firestore bills every
+        skipped document. Filters on several fields, or an equality filter
+        combined with an ordering, need a composite index (see
+        firestore.indexes.json).
+        """
+        query, order_fields = self._build_query(collection, filters, order_by, fields)
+        if offset:
+            query = query.offset(offset)
+
+        if page_token:
+            values = _decode_page_token(page_token)
+            if len(values) != len(order_fields) + 1:
+                raise ValueError("Invalid page token")
+            query = query.start_after(dict(zip(order_fields + ["__name__"], values)))
+
+        items = []
+        last_doc = None
+        async for doc in query.limit(limit).stream():
+            items.append({**doc.to_dict(), "id": doc.id})
+            last_doc = doc
+
+        next_page_token = None
+        if last_doc is not None and len(items) == limit:
+            next_page_token = _encode_page_token(
+                [last_doc.get(field) for field in order_fields] + [last_doc.id]
+            )
+        return items, next_page_token
+
+    async def query_all(
+        self,
+        collection: str,
+        filters: Optional[List[Tuple[str, str, Any]]] = None,
+        fields: Optional[List[str]] = None,
+    ) -> List[dict]:
+        """Get every document matching the filters, with no page limit"""
+        query, _ = self._build_query(collection, filters, fields=fields)
+        return [{**doc.to_dict(), "id": doc.id} async for doc in query.stream()]
+
+    async def stream_query(
+        self,
+        collection: str,
+        filters: Optional[List[Tuple[str, str, Any]]] = None,
+        order_by: Optional[List[Tuple[str, str]]] = None,
+    ) -> AsyncIterator[dict]:
+        """Yield matching documents one at a time as Firestore streams them,
+        without holding the result set in memory"""
+        query, _ = self._build_query(collection, filters, order_by)
+        async for doc in query.stream():
+            yield {**doc.to_dict(), "id": doc.id}
+
+    async def aggregate(
+        self,
+        collection: str,
+        filters: Optional[List[Tuple[str, str, Any]]] = None,
+        count: bool = True,
+        sum_fields: Sequence[str] = (),
+        avg_fields: Sequence[str] = (),
+    ) -> Dict[str, Any]:
+        """Count, sum and average matching documents on the server in one request.
+
+        Firestore bills one read per 1,000 index entries scanned, however
+        many documents match, and nothing is downloaded. Returns
+        ``{"count": n, "sum": {field: total}, "avg": {field: mean}}``; the
+        average of no documents is None.
+        """
+        query = self._filter_query(collection, filters)
+        aggregations = [("count", None)] if count else []
+        aggregations += [("sum", field) for field in sum_fields]
+        aggregations += [("avg", field) for field in avg_fields]
+        if not aggregations:
+            raise ValueError("Nothing to aggregate")
+
+        aggregation_query = query
+        for i, (kind, field) in enumerate(aggregations):
+            add = getattr(aggregation_query, kind)
+            aggregation_query = add(alias=f"a{i}") if kind == "count" else add(field, alias=f"a{i}")
+
+        values = {}
+        for results in await aggregation_query.get():
+            for result in results:
+                values[result.alias] = result.value
+
+        totals: Dict[str, Any] = {"sum": {}, "avg": {}}
+        for i, (kind, field) in enumerate(aggregations):
+            value = values.get(f"a{i}")
+            if kind == "count":
+                totals["count"] = value or 0
+            else:
+                totals[kind][field] = value if value is not None or kind == "avg" else 0
+        return totals
+
+    async def count(self, collection: str, filters: Optional[List[Tuple[str, str, Any]]] = None) -> int:
+        """Count matching documents without fetching them"""
+        return (await self.aggregate(collection, filters))["count"]
+
+    async def sum(
+        self, collection: str, field: str, filters: Optional[List[Tuple[str, str, Any]]] = None
+    ) -> float:
+        """Sum a numeric field over matching documents without fetching them"""
+        return (await self.aggregate(collection, filters, count=False, sum_fields=[field]))["sum"][field]
+
+    async def avg(
+        self, collection: str, field: str, filters: Optional[List[Tuple[str, str, Any]]] = None
+    ) -> Optional[float]:
+        """Average a numeric field over matching documents, None if none match"""
+        return (await self.aggregate(collection, filters, count=False, avg_fields=[field]))["avg"][field]
+
+    async def query_collection(
+        self,
+        collection: str,
+        field: str,
+        operator: str,
+        value: Any,
+        limit: int = 100,
+        fields: Optional[List[str]] = None,
     ) -> List[dict]:
         """Query collection with a condition"""
-        query = self.db.collection(collection)
-        
-        if operator == "==":
-            query = query.where(field, "==", value)
-        elif operator == "<":
-            query = query.where(field, "<", value)
-        elif operator == ">":
-            query = query.where(field, ">", value)
-        elif operator == "<=":
-            query = query.where(field, "<=", value)
-        elif operator == ">=":
-            query = query.where(field, ">=", value)
-        
-        docs = query.limit(limit).stream()
-        return [{**doc.to_dict(), "id": doc.id} for doc in docs]
+        items, _ = await self.query_page(
+            collection, filters=[(field, operator, value)], limit=limit, fields=fields
+        )
+        return items
+
+    def watch_collection(self, collection: str, callback: Callable):
+        """Attach a realtime snapshot listener to a collection.
+
+        Firestore's listeners only exist on the synchronous client, so the
+        callback runs on the listener's background thread. Call
+        ``unsubscribe()`` on the returned watch to stop it.
+        """
+        client = self.listener_db if self.listener_db is not None else firestore.client()
+        return client.collection(collection).on_snapshot(callback)
 
-    def batch_write(self, operations: List[tuple]) -> bool:
+    async def batch_write(self, operations: List[tuple]) -> bool:
         """Execute batch write operations"""
         batch = self.db.batch()
         
@@ -127,7 +384,7 @@ class FirebaseService:
             elif operation[0] == "delete":
                 batch.delete(self.db.collection(operation[1]).document(operation[2]))
         
-        batch.commit()
+        await batch.commit()
         return True
 
 
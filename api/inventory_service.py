@@ -0,0 +1,268 @@
+from google.cloud import firestore
+from fastapi import HTTPException, status
+from firebase_service import firebase_service
+from stats_service import stats_service
+from config import settings
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import random
+
+# Live stock is split across products/{productId}/stock_shards/{0..n-1}, each
+# holding part of the available units. Checkout draws from a random shard
+# first, so concurrent buyers of one product mostly lock different documents.
+# Shard 0 always exists once a product's stock has been sharded.
+# The product's own ``stock`` field counts the units on hand: those for sale
+# in its shards plus those held for unpaid orders. It only goes down when a
+# held order is paid.
+STOCK_SHARDS_COLLECTION = "stock_shards"
+# One reservation per order, keyed by order ID, recording which shards it
+# drew from so the units can be returned if payment never arrives
+RESERVATIONS_COLLECTION = "stock_reservations"
+# Transactions on hot products may need several attempts
+TRANSACTION_ATTEMPTS = 10
+
+
+def reserved_units(reservation: dict) -> Dict[str, int]:
+    """Units a reservation holds, per product"""
+    units: Dict[str, int] = {}
+    for item in reservation.get("items") or []:
+        units[item["productId"]] = units.get(item["productId"], 0) + sum(item["shards"].values())
+    return units
+
+
+class InventoryService:
+    """Sharded stock counters and the reservations checkout takes against them"""
+
+    def __init__(self, service, stats, shards: int, reservation_ttl: int):
+        self.db = service.db
+        self.stats = stats
+        self.shards = shards
+        self.reservation_ttl = reservation_ttl
+
+    def _shard_ref(self, product_id: str, shard: int):
+        return (
+            self.db.collection("products").document(product_id)
+            .collection(STOCK_SHARDS_COLLECTION).document(str(shard))
+        )
+
+    def _split(self, stock: int) -> List[int]:
+        """Spread units over the shards as evenly as possible"""
+        base, extra = divmod(max(stock, 0), self.shards)
+        return [base + (1 if shard < extra else 0) for shard in range(self.shards)]
+
+    @staticmethod
+    def _take(order: List[int], available: Dict[int, int], quantity: int) -> Optional[Dict[int, int]]:
+        """Decide how many units to draw from each shard, or None if there aren't enough"""
+        takes = {}
+        for shard in order:
+            if quantity <= 0:
+                break
+            take = min(available.get(shard, 0), quantity)
+            if take > 0:
+                takes[shard] = take
+                quantity -= take
+        return takes if quantity <= 0 else None
+
+    async def set_stock(self, product_id: str, stock: int) -> None:
+        """Set a product's units on hand, e.g. on creation or restock.
+
+        Units held for unpaid orders are part of ``stock`` but not for sale,
+        so the shards get what's left. Releasing a hold later brings the
+        product back up to ``stock`` rather than past it.
+        """
+        product_ref = self.db.collection("products").document(product_id)
+        holds = (
+            self.db.collection(RESERVATIONS_COLLECTION)
+            .where("productIds", "array_contains", product_id)
+            .where("status", "==", "held")
+        )
+
+        @firestore.async_transactional
+        async def _set(transaction):
+            held = 0
+            async for reservation in holds.stream(transaction=transaction):
+                held += reserved_units(reservation.to_dict()).get(product_id, 0)
+            for shard, units in enumerate(self._split(stock - held)):
+                transaction.set(self._shard_ref(product_id, shard), {"available": units})
+            transaction.update(product_ref, {"stock": stock})
+
+        await _set(self.db.transaction(max_attempts=TRANSACTION_ATTEMPTS))
+
+    async def get_available(self, product_id: str) -> int:
+        """Sum a product's stock shards"""
+        shards = self.db.collection("products").document(product_id).collection(STOCK_SHARDS_COLLECTION)
+        return sum([(doc.to_dict() or {}).get("available", 0) async for doc in shards.stream()])
+
+    async def _plan(
+        self, transaction, product_id: str, quantity: int, product: dict
+    ) -> Tuple[Optional[Dict[int, int]], Optional[List[int]]]:
+        """Read just enough shards inside the transaction to cover a quantity.
+
+        Returns the units to draw per shard (None if out of stock) and, for
+        products whose stock hasn't been sharded yet, the initial shard values
+        seeded from the product's stock field.
+        """
+        start = random.randrange(self.shards)
+        order = [(start + offset) % self.shards for offset in range(self.shards)]
+        available: Dict[int, int] = {}
+        for shard in order:
+            snapshot = await self._shard_ref(product_id, shard).get(transaction=transaction)
+            if not snapshot.exists and not available:
+                marker = snapshot if shard == 0 else await self._shard_ref(product_id, 0).get(
+                    transaction=transaction
+                )
+                if not marker.exists:
+                    initial = self._split(int(product.get("stock") or 0))
+                    return self._take(order, dict(enumerate(initial)), quantity), initial
+            available[shard] = (snapshot.to_dict() or {}).get("available", 0) if snapshot.exists else 0
+            if sum(available.values()) >= quantity:
+                break
+        return self._take(order, available, quantity), None
+
+    async def create_order(self, order_data: dict, quantities: Dict[str, int], products: Dict[str, dict]) -> str:
+        """Reserve stock for every item and create the order in one transaction.
+
+        Raises 409 if any product doesn't have enough units left; nothing is
+        written in that case.
+        """
+        order_ref = self.db.collection("orders").document()
+        reservation_ref = self.db.collection(RESERVATIONS_COLLECTION).document(order_ref.id)
+
+        @firestore.async_transactional
+        async def _reserve(transaction):
+            plans = {}
+            for product_id, quantity in quantities.items():
+                takes, initial = await self._plan(transaction, product_id, quantity, products[product_id])
+                if takes is None:
+                    raise HTTPException(
+                        status_code=status.HTTP_409_CONFLICT,
+                        detail=f"Not enough stock for {products[product_id].get('title', product_id)}"
+                    )
+                plans[product_id] = (takes, initial)
+            first_order = await self.stats.is_first_order(transaction, order_data["userId"])
+
+            for product_id, (takes, initial) in plans.items():
+                if initial is not None:
+                    for shard, units in enumerate(initial):
+                        transaction.set(
+                            self._shard_ref(product_id, shard),
+                            {"available": units - takes.get(shard, 0)}
+                        )
+                else:
+                    for shard, take in takes.items():
+                        transaction.update(
+                            self._shard_ref(product_id, shard),
+                            {"available": firestore.Increment(-take)}
+                        )
+            transaction.set(reservation_ref, {
+                "orderId": order_ref.id,
+                "userId": order_data["userId"],
+                "status": "held",
+                "productIds": list(plans),
+                "items": [
+                    {"productId": product_id, "shards": {str(shard): take for shard, take in takes.items()}}
+                    for product_id, (takes, _) in plans.items()
+                ],
+                "expiresAt": datetime.now() + timedelta(seconds=self.reservation_ttl),
+                "createdAt": datetime.now()
+            })
+            self.stats.stage_order(transaction, order_ref, order_data, first_order)
+
+        await _reserve(self.db.transaction(max_attempts=TRANSACTION_ATTEMPTS))
+        return order_ref.id
+
+    def stage_commit(self, transaction, reservation_ref, reservation: dict) -> None:
+        """Stage keeping a held reservation's units for good inside a running
+        transaction; they come off the products' stock"""
+        transaction.update(reservation_ref, {"status": "committed", "committedAt": datetime.now()})
+        for product_id, units in reserved_units(reservation).items():
+            transaction.update(
+                self.db.collection("products").document(product_id),
+                {"stock": firestore.Increment(-units)}
+            )
+
+    async def commit_reservation(self, order_id: str) -> bool:
+        """Keep a paid order's reserved units for good"""
+        reservation_ref = self.db.collection(RESERVATIONS_COLLECTION).document(order_id)
+
+        @firestore.async_transactional
+        async def _commit(transaction):
+            reservation = await reservation_ref.get(transaction=transaction)
+            if not reservation.exists:
+                return False
+            if reservation.get("status") == "released":
+                print(f"⚠ Order {order_id} was paid after its stock reservation expired")
+                return False
+            if reservation.get("status") != "held":
+                return False
+            self.stage_commit(transaction, reservation_ref, reservation.to_dict())
+            return True
+
+        return await _commit(self.db.transaction(max_attempts=TRANSACTION_ATTEMPTS))
+
+    async def release_reservation(self, order_id: str, payment_status: str = "expired") -> bool:
+        """Return a held reservation's units to stock and close its unpaid order.
+
+        Orders that turn out to be paid have their reservation committed
+        instead. Returns True if stock was released.
+        """
+        reservation_ref = self.db.collection(RESERVATIONS_COLLECTION).document(order_id)
+        order_ref = self.db.collection("orders").document(order_id)
+
+        @firestore.async_transactional
+        async def _release(transaction):
+            reservation = await reservation_ref.get(transaction=transaction)
+            if not reservation.exists or reservation.get("status") != "held":
+                return False
+            order = await order_ref.get(transaction=transaction)
+            if order.exists and order.get("paymentStatus") == "completed":
+                self.stage_commit(transaction, reservation_ref, reservation.to_dict())
+                return False
+
+            for item in reservation.get("items"):
+                for shard, take in item["shards"].items():
+                    transaction.update(
+                        self._shard_ref(item["productId"], int(shard)),
+                        {"available": firestore.Increment(take)}
+                    )
+            transaction.update(reservation_ref, {"status": "released", "releasedAt": datetime.now()})
+            if order.exists:
+                self.stats.stage_payment_status(
+                    transaction, order_ref, order.to_dict(), payment_status,
+                    {"status": "cancelled", "updatedAt": datetime.now()}
+                )
+            return True
+
+        return await _release(self.db.transaction(max_attempts=TRANSACTION_ATTEMPTS))
+
+    async def release_expired(self, limit: int = 100) -> int:
+        """Release reservations whose payment window has passed"""
+        query = (
+            self.db.collection(RESERVATIONS_COLLECTION)
+            .where("status", "==", "held")
+            .where("expiresAt", "<", datetime.now())
+            .limit(limit)
+        )
+        order_ids = [doc.id async for doc in query.stream()]
+        released = 0
+        for order_id in order_ids:
+            if await self.release_reservation(order_id):
+                released += 1
+        return released
+
+    async def run_expiry_loop(self, interval: float) -> None:
+        """Release expired reservations every ``interval`` seconds until cancelled"""
+        while True:
+            try:
+                released = await self.release_expired()
+                if released:
+                    print(f"Released stock for {released} expired orders")
+            except Exception as e:
+                print(f"Error releasing expired reservations: {e}")
+            await asyncio.sleep(interval)
+
+
+inventory_service = InventoryService(
+    firebase_service, stats_service, settings.stock_shards, settings.stock_reservation_ttl
+)
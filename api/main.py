@@ -1,22 +1,67 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Header
+from fastapi import FastAPI, Depends, HTTPException, status, Header, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from brotli_asgi import BrotliMiddleware
+from fastapi.concurrency import run_in_threadpool
 from typing import Optional, List
-from datetime import datetime
-import uuid
+from datetime import date, datetime, time, timedelta
+import asyncio
+import hashlib
+import json
+import orjson
 
 from config import settings
 from firebase_service import firebase_service
+from stats_service import stats_service
+from cache_service import catalog_cache
+from replica_service import catalog_replica
+from search_service import user_search_index, product_search_index
+from inventory_service import inventory_service
 from auth_service import auth_service
 from razorpay_service import razorpay_service
+from webhook_service import webhook_service
+from analytics_service import analytics_service
+from rollup_service import rollup_service, GLOBAL_SCOPE, artist_scope
+from export_service import export_service, ORDER_COLUMNS, USER_COLUMNS, MEDIA_TYPES
 from models import (
-    User, UserCreate, Product, ProductCreate, Order, OrderCreate,
+    User, UserCreate, Product, ProductCreate, ProductBatchRequest, Order, OrderCreate,
     BlogPost, BlogPostCreate, Magazine, WorkWithUsApplication, WorkWithUsCreate
 )
 
+def _json_default(value):
+    # Firestore returns DatetimeWithNanoseconds, a datetime subclass orjson
+    # won't serialize itself, so every date and time is handed back here
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return str(value)
+
+
+class FastJSONResponse(ORJSONResponse):
+    """orjson rendering with ISO-8601 timestamps, including Firestore's,
+    falling back to str() for any other value orjson doesn't know"""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(
+            content,
+            default=_json_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME
+        )
+
+
 app = FastAPI(
     title="GIA API",
     description="Great India Arts - Marketplace API",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
+)
+
+# Brotli for clients that accept it, gzip for the rest; small bodies aren't
+# worth the CPU
+app.add_middleware(
+    BrotliMiddleware,
+    quality=settings.brotli_quality,
+    minimum_size=settings.compression_minimum_size,
+    gzip_fallback=True
 )
 
 # CORS Configuration
@@ -29,6 +74,154 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+async def warm_auth_certificates():
+    """Fetch token signing certificates before the first request needs them"""
+    await auth_service.warm_certificates()
+
+
+@app.on_event("shutdown")
+async def close_razorpay_client():
+    await razorpay_service.aclose()
+
+
+@app.on_event("startup")
+async def start_reservation_expiry():
+    """Return stock held by orders that were never paid"""
+    app.state.reservation_expiry = asyncio.create_task(
+        inventory_service.run_expiry_loop(settings.stock_release_interval)
+    )
+
+
+@app.on_event("shutdown")
+async def stop_reservation_expiry():
+    app.state.reservation_expiry.cancel()
+
+
+@app.on_event("startup")
+async def start_webhook_worker():
+    """Apply queued Razorpay webhook events in the background"""
+    app.state.webhook_worker = asyncio.create_task(webhook_service.run())
+
+
+@app.on_event("shutdown")
+async def stop_webhook_worker():
+    app.state.webhook_worker.cancel()
+
+
+@app.on_event("startup")
+async def start_analytics_snapshot():
+    """Load the persisted analytics snapshot and keep it refreshed"""
+    try:
+        await asyncio.to_thread(analytics_service.load)
+    except Exception as e:
+        print(f"⚠ Analytics snapshot not loaded, rebuilding: {e}")
+    app.state.analytics_refresh = asyncio.create_task(analytics_service.run_refresh_loop())
+
+
+@app.on_event("shutdown")
+async def stop_analytics_snapshot():
+    app.state.analytics_refresh.cancel()
+
+
+@app.on_event("startup")
+async def start_catalog_cache():
+    """Keep the product cache fresh from a Firestore snapshot listener"""
+    if settings.catalog_cache_listen:
+        try:
+            catalog_cache.start()
+        except Exception as e:
+            print(f"⚠ Product cache listener not started, relying on TTL: {e}")
+
+
+@app.on_event("shutdown")
+async def stop_catalog_cache():
+    catalog_cache.stop()
+
+
+@app.on_event("startup")
+async def start_catalog_replica():
+    """Sync the local catalog replica and serve catalog reads from it"""
+    if settings.catalog_replica:
+        try:
+            if not await run_in_threadpool(catalog_replica.start):
+                print("⚠ Catalog replica still syncing, reading from Firestore meanwhile")
+        except Exception as e:
+            print(f"⚠ Catalog replica not started, reading from Firestore: {e}")
+
+
+@app.on_event("shutdown")
+async def stop_catalog_replica():
+    catalog_replica.stop()
+
+
+@app.on_event("startup")
+async def start_user_search_index():
+    """Load the admin user search index before serving"""
+    try:
+        if not await run_in_threadpool(user_search_index.start):
+            print("⚠ User search index still loading")
+    except Exception as e:
+        print(f"⚠ User search index not started: {e}")
+
+
+@app.on_event("shutdown")
+async def stop_user_search_index():
+    user_search_index.stop()
+
+
+@app.on_event("startup")
+async def start_product_search_index():
+    """Load the product full-text index before serving"""
+    try:
+        if not await run_in_threadpool(product_search_index.start):
+            print("⚠ Product search index still loading")
+    except Exception as e:
+        print(f"⚠ Product search index not started: {e}")
+
+
+@app.on_event("shutdown")
+async def stop_product_search_index():
+    product_search_index.stop()
+
+
+async def get_user_profile(decoded: dict) -> dict:
+    """Get a user's profile document, creating it from Firebase Auth if missing"""
+    user_data = await firebase_service.get_document("users", decoded["uid"])
+    
+    # If user doesn't exist in Firestore, create basic profile from Firebase
+    if not user_data:
+        try:
+            firebase_user = await run_in_threadpool(auth_service.get_user, decoded["uid"])
+            user_data = {
+                "id": decoded["uid"],
+                "email": firebase_user.get("email", ""),
+                "name": firebase_user.get("display_name", "User"),
+                "role": decoded.get("role", "user"),
+                "createdAt": datetime.now(),
+                "updatedAt": datetime.now()
+            }
+            # Save to Firestore for future use with specific document ID
+            await stats_service.create_user(decoded["uid"], user_data)
+            user_search_index.upsert(decoded["uid"], user_data)
+        except Exception:
+            # If we can't get Firebase user either, return minimal data
+            user_data = {
+                "id": decoded["uid"],
+                "email": decoded.get("email", ""),
+                "name": decoded.get("name", "User"),
+                "role": decoded.get("role", "user"),
+                "createdAt": datetime.now(),
+                "updatedAt": datetime.now()
+            }
+    
+    return user_data
+
+
+# UIDs whose role claim has been backfilled by this process
+_role_claims_synced = set()
+
+
 # Dependency to get current user
 async def get_current_user(authorization: Optional[str] = Header(None)):
     if not authorization:
@@ -39,55 +232,129 @@ async def get_current_user(authorization: Optional[str] = Header(None)):
     
     try:
         token = authorization.replace("Bearer ", "")
-        decoded = auth_service.verify_token(token)
-        
-        # Try to get user from Firestore
-        user_data = firebase_service.get_document("users", decoded["uid"])
-        
-        # If user doesn't exist in Firestore, create basic profile from Firebase
-        if not user_data:
-            try:
-                firebase_user = auth_service.get_user(decoded["uid"])
-                user_data = {
-                    "id": decoded["uid"],
-                    "email": firebase_user.get("email", ""),
-                    "name": firebase_user.get("display_name", "User"),
-                    "role": "user",
-                    "createdAt": datetime.now(),
-                    "updatedAt": datetime.now()
-                }
-                # Save to Firestore for future use with specific document ID
-                firebase_service.db.collection("users").document(decoded["uid"]).set(user_data)
-            except Exception as e:
-                # If we can't get Firebase user either, return minimal data
-                user_data = {
-                    "id": decoded["uid"],
-                    "email": decoded.get("email", ""),
-                    "name": decoded.get("name", "User"),
-                    "role": "user",
-                    "createdAt": datetime.now(),
-                    "updatedAt": datetime.now()
-                }
-        
-        return user_data
+        decoded = await auth_service.verify_token(token)
+        
+        # The role travels in the token as a custom claim, so authorization
+        # needs no Firestore read. Accounts from before role claims fall back
+        # to their profile document once, and get the claim written for
+        # their next token refresh.
+        role = decoded.get("role")
+        if role is None:
+            profile = await get_user_profile(decoded)
+            role = profile.get("role", "user")
+            if decoded["uid"] not in _role_claims_synced:
+                try:
+                    await run_in_threadpool(auth_service.set_role, decoded["uid"], role)
+                    _role_claims_synced.add(decoded["uid"])
+                except Exception as e:
+                    print(f"Error syncing role claim for {decoded['uid']}: {e}")
+        
+        return {
+            "id": decoded["uid"],
+            "email": decoded.get("email", ""),
+            "name": decoded.get("name", "User"),
+            "role": role
+        }
     except HTTPException:
         raise
-    except Exception as e:
+    except Exception:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token"
         )
 
 
+# ==================== HTTP CACHING ====================
+# Cache-Control per public read route. Browsers revalidate with If-None-Match
+# once max-age passes; shared caches may keep serving the stale copy for
+# stale-while-revalidate seconds while they refetch in the background.
+CACHE_POLICIES = {
+    "product": "public, max-age=60, stale-while-revalidate=600",
+    "products": "public, max-age=30, stale-while-revalidate=300",
+    "blog_post": "public, max-age=300, stale-while-revalidate=3600",
+    "magazines": "public, max-age=300, stale-while-revalidate=3600",
+}
+
+
+def cacheable_response(request: Request, content, policy: str) -> Response:
+    """Serialize a response body with an ETag of its bytes, answering 304
+    Not Modified when the client already holds that version.
+
+    The ETag is weak because the compression middleware sends the same
+    content as brotli, gzip or identity bytes, and Vary tells caches to keep
+    those apart even when the body is too small to compress.
+    """
+    response = FastJSONResponse(content)
+    tag = '"' + hashlib.sha256(response.body).hexdigest()[:32] + '"'
+    headers = {"ETag": "W/" + tag, "Cache-Control": CACHE_POLICIES[policy], "Vary": "Accept-Encoding"}
+    
+    if_none_match = request.headers.get("if-none-match", "")
+    candidates = {candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")}
+    if tag in candidates or "*" in candidates:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    response.headers.update(headers)
+    return response
+
+
+# ==================== FIELD PROJECTION ====================
+# Fields list endpoints return by default: what their card views show. Pass
+# ?fields=a,b,c for a different set or ?fields=* for whole documents.
+CARD_FIELDS = {
+    "products": [
+        "title", "price", "image", "category", "artistId", "artistName",
+        "description", "stock", "featured", "createdAt",
+    ],
+    "blog_posts": ["title", "content", "category", "featuredImage", "author", "authorId", "published", "createdAt"],
+    "magazines": ["issue", "title", "description", "coverImage", "articles", "releaseDate", "createdAt"],
+    "orders": ["userId", "artistIds", "items", "total", "status", "paymentStatus", "createdAt", "updatedAt"],
+}
+MAX_FIELDS = 50
+
+
+def select_fields(fields: Optional[str], default: Optional[List[str]]) -> Optional[List[str]]:
+    """Parse a ?fields= parameter into the fields to fetch, None meaning all"""
+    if fields is None:
+        return default
+    if fields.strip() == "*":
+        return None
+    selected = [field.strip() for field in fields.split(",") if field.strip()]
+    if not selected or len(selected) > MAX_FIELDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"fields must list 1 to {MAX_FIELDS} field names, or be *"
+        )
+    # The ID comes from the document name, not a field
+    return [field for field in selected if field != "id"] or ["__name__"]
+
+
+def skip_offset(skip: Optional[int], page_token: Optional[str]) -> int:
+    """Offset for clients still paging with ?skip=, which page_token replaced"""
+    if skip is not None and page_token:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Pass either page_token or skip, not both"
+        )
+    return skip or 0
+
+
+def catalog_reader(collection: str):
+    """The local replica once it is in sync for a collection, otherwise Firestore"""
+    return catalog_replica if catalog_replica.serves(collection) else firebase_service
+
+
 # ==================== AUTH ENDPOINTS ====================
 @app.post("/auth/signup")
 async def signup(user: UserCreate):
     """Create new user account"""
     try:
         # Create Firebase auth user
-        firebase_user = auth_service.create_user(user.email, user.password, user.name)
+        firebase_user = await run_in_threadpool(
+            auth_service.create_user, user.email, user.password, user.name
+        )
+        await run_in_threadpool(auth_service.set_role, firebase_user["uid"], "user")
         
-        # Create user document in Firestore
+        # Create user document in Firestore, keyed by UID
         user_data = {
             "email": user.email,
             "name": user.name,
@@ -97,7 +364,8 @@ async def signup(user: UserCreate):
             "createdAt": datetime.now(),
             "updatedAt": datetime.now()
         }
-        firebase_service.add_document("users", user_data)
+        await stats_service.create_user(firebase_user["uid"], user_data)
+        user_search_index.upsert(firebase_user["uid"], user_data)
         
         return {"message": "User created successfully", "uid": firebase_user["uid"]}
     except HTTPException as e:
@@ -112,27 +380,134 @@ async def signup(user: UserCreate):
 @app.get("/auth/user")
 async def get_user(current_user: dict = Depends(get_current_user)):
     """Get current user profile"""
-    return current_user
+    profile = await get_user_profile({"uid": current_user["id"], **current_user})
+    # The role claim is authoritative over the stored profile
+    return {**profile, "role": current_user["role"]}
 
 
 # ==================== PRODUCTS ENDPOINTS ====================
+# Sort orders accepted by GET /products; each needs a matching composite
+# index in firestore.indexes.json when combined with category/featured filters
+PRODUCT_SORTS = {
+    "newest": [("createdAt", "desc")],
+    "oldest": [("createdAt", "asc")],
+    "price_asc": [("price", "asc")],
+    "price_desc": [("price", "desc")],
+}
+# Upper bound on IDs accepted by POST /products/batch
+MAX_BATCH_PRODUCTS = 100
+# Upper bound on ?limit= for listing and search routes
+MAX_PAGE_SIZE = 100
+
+
 @app.get("/products")
 async def get_products(
-    skip: int = 0,
-    limit: int = 20,
+    request: Request,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    page_token: Optional[str] = None,
+    skip: Optional[int] = Query(None, ge=0, deprecated=True),
     featured: Optional[bool] = None,
-    category: Optional[str] = None
+    category: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    sort: Optional[str] = None,
+    fields: Optional[str] = None
 ):
     """Get all products with filters"""
     try:
-        products = firebase_service.get_collection("products", limit=limit, offset=skip)
+        selected = select_fields(fields, CARD_FIELDS["products"])
+        offset = skip_offset(skip, page_token)
+        if sort and sort not in PRODUCT_SORTS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid sort. Use one of: {', '.join(PRODUCT_SORTS)}"
+            )
         
+        filters = []
         if category:
-            products = [p for p in products if p.get("category") == category]
+            filters.append(("category", "==", category))
         if featured:
-            products = [p for p in products if p.get("featured", False)]
+            filters.append(("featured", "==", True))
+        if min_price is not None:
+            filters.append(("price", ">=", min_price))
+        if max_price is not None:
+            filters.append(("price", "<=", max_price))
+        
+        # Firestore needs a range filter's field as the first ordering
+        has_price_range = min_price is not None or max_price is not None
+        if has_price_range and sort not in ("price_asc", "price_desc"):
+            sort = "price_asc"
+        
+        if catalog_replica.serves("products"):
+            (products, next_page_token), total = await asyncio.gather(
+                catalog_replica.query_page(
+                    "products",
+                    filters=filters,
+                    order_by=PRODUCT_SORTS.get(sort),
+                    limit=limit,
+                    page_token=page_token,
+                    fields=selected,
+                    offset=offset
+                ),
+                catalog_replica.count("products", filters)
+            )
+        else:
+            (products, next_page_token), total = await asyncio.gather(
+                catalog_cache.query_page(
+                    filters=filters,
+                    order_by=PRODUCT_SORTS.get(sort),
+                    limit=limit,
+                    page_token=page_token,
+                    fields=selected,
+                    offset=offset
+                ),
+                catalog_cache.count(filters)
+            )
+        
+        return cacheable_response(
+            request, {"items": products, "total": total, "nextPageToken": next_page_token}, "products"
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
+@app.get("/products/search")
+async def search_products(
+    q: str,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    skip: int = Query(0, ge=0),
+    category: Optional[str] = None
+):
+    """Full-text product search, best matches first"""
+    try:
+        products, total = product_search_index.search(q, limit=limit, offset=skip, category=category)
+        return {"items": products, "total": total}
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
+@app.post("/products/batch")
+async def get_products_batch(request: ProductBatchRequest):
+    """Get many products by ID in one request (cart and checkout)"""
+    try:
+        if len(request.ids) > MAX_BATCH_PRODUCTS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"At most {MAX_BATCH_PRODUCTS} products per request"
+            )
         
-        return {"items": products, "total": len(products)}
+        products, missing = await catalog_cache.get_products(request.ids)
+        return {"items": products, "missing": missing}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -141,16 +516,19 @@ async def get_products(
 
 
 @app.get("/products/{product_id}")
-async def get_product(product_id: str):
+async def get_product(product_id: str, request: Request):
     """Get single product"""
     try:
-        product = firebase_service.get_document("products", product_id)
+        if catalog_replica.serves("products"):
+            product = await catalog_replica.get_document("products", product_id)
+        else:
+            product = await catalog_cache.get_product(product_id)
         if not product:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Product not found"
             )
-        return product
+        return cacheable_response(request, product, "product")
     except HTTPException:
         raise
     except Exception as e:
@@ -178,7 +556,10 @@ async def create_product(
         product_data["createdAt"] = datetime.now().isoformat()
         product_data["updatedAt"] = datetime.now().isoformat()
         
-        doc_id = firebase_service.add_document("products", product_data)
+        doc_id = await stats_service.create_product(product_data)
+        await inventory_service.set_stock(doc_id, product_data.get("stock", 0))
+        catalog_cache.invalidate(doc_id)
+        product_search_index.upsert(doc_id, product_data)
         return {
             "id": doc_id, 
             "title": product_data.get("title"),
@@ -213,7 +594,7 @@ async def update_product(
 ):
     """Update product (artist owner or admin only)"""
     try:
-        existing = firebase_service.get_document("products", product_id)
+        existing = await firebase_service.get_document("products", product_id)
         if not existing:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -232,7 +613,15 @@ async def update_product(
         if "createdAt" in existing:
             product_data["createdAt"] = existing["createdAt"]
         
-        firebase_service.update_document("products", product_id, product_data)
+        # Stock only changes through the inventory service, which keeps it in
+        # step with the shards and the units held for unpaid orders
+        await firebase_service.update_document(
+            "products", product_id, {k: v for k, v in product_data.items() if k != "stock"}
+        )
+        if product_data.get("stock") != existing.get("stock"):
+            await inventory_service.set_stock(product_id, product_data.get("stock", 0))
+        catalog_cache.invalidate(product_id)
+        product_search_index.upsert(product_id, {**existing, **product_data})
         return {
             "id": product_id,
             "title": product_data.get("title"),
@@ -267,27 +656,82 @@ async def create_order(
 ):
     """Create new order"""
     try:
-        # Create Razorpay order
-        razorpay_order = razorpay_service.create_order(
-            amount=order.total,
-            receipt=f"order_{uuid.uuid4().hex[:8]}",
-            notes={"userId": current_user["id"]}
-        )
+        quantities = {}
+        for item in order.items:
+            if item.quantity <= 0:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Quantity must be at least 1"
+                )
+            quantities[item.productId] = quantities.get(item.productId, 0) + item.quantity
+        
+        # Price the order from the catalog, never from client-supplied prices
+        found, missing = await firebase_service.get_documents("products", list(quantities))
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Products not found: {', '.join(missing)}"
+            )
+        products = {p["id"]: p for p in found}
+        items = [
+            {
+                "productId": product_id,
+                "title": products[product_id].get("title", ""),
+                "quantity": quantity,
+                "price": float(products[product_id].get("price", 0)),
+                # Seller and category as of the sale, so later catalog
+                # edits don't rewrite sales history
+                "artistId": products[product_id].get("artistId"),
+                "category": products[product_id].get("category")
+            }
+            for product_id, quantity in quantities.items()
+        ]
+        total = round(sum(item["price"] * item["quantity"] for item in items), 2)
+        
+        # Denormalize the selling artists onto the order so artist
+        # dashboards can find it with an array_contains query
+        artist_ids = sorted({p["artistId"] for p in found if p.get("artistId")})
+        # Each artist's share of the total and of the units, for their
+        # revenue rollups and dashboard
+        artist_totals = {}
+        artist_units = {}
+        for item in items:
+            artist_id = item["artistId"]
+            if artist_id:
+                artist_totals[artist_id] = round(artist_totals.get(artist_id, 0) + item["price"] * item["quantity"], 2)
+                artist_units[artist_id] = artist_units.get(artist_id, 0) + item["quantity"]
         
         # Create order document
         order_data = {
             "userId": current_user["id"],
-            "items": [item.dict() for item in order.items],
-            "total": order.total,
+            "artistIds": artist_ids,
+            "artistTotals": artist_totals,
+            "artistUnits": artist_units,
+            "items": items,
+            "total": total,
             "status": "pending",
             "paymentStatus": "pending",
-            "paymentId": razorpay_order["id"],
+            "paymentId": None,
             "shippingAddress": order.shippingAddress.dict(),
             "createdAt": datetime.now(),
             "updatedAt": datetime.now()
         }
         
-        doc_id = firebase_service.add_document("orders", order_data)
+        # Reserve stock and write the order in one transaction, before asking
+        # Razorpay for anything, so a sold-out item leaves no Razorpay order
+        doc_id = await inventory_service.create_order(order_data, quantities, products)
+        
+        try:
+            razorpay_order = await razorpay_service.create_order(
+                amount=total,
+                receipt=f"order_{doc_id}",
+                notes={"userId": current_user["id"], "orderId": doc_id}
+            )
+        except Exception:
+            await inventory_service.release_reservation(doc_id, payment_status="failed")
+            raise
+        order_data["paymentId"] = razorpay_order["id"]
+        await firebase_service.update_document("orders", doc_id, {"paymentId": razorpay_order["id"]})
         
         return {
             "id": doc_id,
@@ -295,6 +739,8 @@ async def create_order(
             "razorpayKeyId": settings.razorpay_key_id,
             **order_data
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -306,7 +752,7 @@ async def create_order(
 async def get_orders(current_user: dict = Depends(get_current_user)):
     """Get user's orders"""
     try:
-        orders = firebase_service.query_collection(
+        orders = await firebase_service.query_collection(
             "orders",
             "userId",
             "==",
@@ -337,18 +783,24 @@ async def verify_payment(
             razorpay_signature
         )
         
-        # Update order status
-        firebase_service.update_document(
-            "orders",
+        # Update order status. The signature only vouches for the Razorpay
+        # order, so it must be the one this order was paid through.
+        updated = await stats_service.set_order_payment_status(
             order_id,
-            {
-                "status": "confirmed",
-                "paymentStatus": "completed",
-                "updatedAt": datetime.now()
-            }
+            "completed",
+            {"status": "confirmed", "razorpayPaymentId": razorpay_payment_id, "updatedAt": datetime.now()},
+            expected={"paymentId": razorpay_order_id, "userId": current_user["id"]}
         )
+        if not updated:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Order not found"
+            )
+        await inventory_service.commit_reservation(order_id)
         
         return {"message": "Payment verified successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -356,14 +808,57 @@ async def verify_payment(
         )
 
 
+@app.post("/webhooks/razorpay")
+async def razorpay_webhook(
+    request: Request,
+    x_razorpay_signature: Optional[str] = Header(None),
+    x_razorpay_event_id: Optional[str] = Header(None)
+):
+    """Receive Razorpay payment events.
+
+    Events are recorded and acknowledged straight away, then applied to
+    orders in batches by the webhook worker. Redeliveries are ignored.
+    """
+    body = await request.body()
+    if not razorpay_service.verify_webhook_signature(body, x_razorpay_signature):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid webhook signature"
+        )
+    try:
+        event = json.loads(body)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid webhook body"
+        )
+    
+    event_id = x_razorpay_event_id or hashlib.sha256(body).hexdigest()
+    queued = await webhook_service.receive(event_id, event)
+    return {"status": "queued" if queued else "ignored"}
+
+
 # ==================== BLOG/ARTROOM ENDPOINTS ====================
 @app.get("/blog")
-async def get_blog_posts(skip: int = 0, limit: int = 20):
+async def get_blog_posts(
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    page_token: Optional[str] = None,
+    skip: Optional[int] = Query(None, ge=0, deprecated=True),
+    fields: Optional[str] = None
+):
     """Get all blog posts"""
     try:
-        posts = firebase_service.get_collection("blog_posts", limit=limit, offset=skip)
-        posts = [p for p in posts if p.get("published", False)]
-        return {"items": posts}
+        posts, next_page_token = await catalog_reader("blog_posts").query_page(
+            "blog_posts",
+            filters=[("published", "==", True)],
+            limit=limit,
+            page_token=page_token,
+            fields=select_fields(fields, CARD_FIELDS["blog_posts"]),
+            offset=skip_offset(skip, page_token)
+        )
+        return FastJSONResponse({"items": posts, "nextPageToken": next_page_token})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -372,16 +867,16 @@ async def get_blog_posts(skip: int = 0, limit: int = 20):
 
 
 @app.get("/blog/{post_id}")
-async def get_blog_post(post_id: str):
+async def get_blog_post(post_id: str, request: Request):
     """Get single blog post"""
     try:
-        post = firebase_service.get_document("blog_posts", post_id)
+        post = await catalog_reader("blog_posts").get_document("blog_posts", post_id)
         if not post or not post.get("published"):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Post not found"
             )
-        return post
+        return cacheable_response(request, post, "blog_post")
     except HTTPException:
         raise
     except Exception as e:
@@ -410,7 +905,7 @@ async def create_blog_post(
         post_data["createdAt"] = datetime.now()
         post_data["updatedAt"] = datetime.now()
         
-        doc_id = firebase_service.add_document("blog_posts", post_data)
+        doc_id = await firebase_service.add_document("blog_posts", post_data)
         return {"id": doc_id, **post_data}
     except HTTPException:
         raise
@@ -423,11 +918,25 @@ async def create_blog_post(
 
 # ==================== MAGAZINE ENDPOINTS ====================
 @app.get("/magazine")
-async def get_magazines(skip: int = 0, limit: int = 10):
+async def get_magazines(
+    request: Request,
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    page_token: Optional[str] = None,
+    skip: Optional[int] = Query(None, ge=0, deprecated=True),
+    fields: Optional[str] = None
+):
     """Get all magazines"""
     try:
-        magazines = firebase_service.get_collection("magazines", limit=limit, offset=skip)
-        return {"items": magazines}
+        magazines, next_page_token = await catalog_reader("magazines").get_collection_page(
+            "magazines", limit=limit, page_token=page_token,
+            fields=select_fields(fields, CARD_FIELDS["magazines"]),
+            offset=skip_offset(skip, page_token)
+        )
+        return cacheable_response(
+            request, {"items": magazines, "nextPageToken": next_page_token}, "magazines"
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -451,7 +960,7 @@ async def create_magazine(
         magazine_data = magazine.dict()
         magazine_data["createdAt"] = datetime.now()
         
-        doc_id = firebase_service.add_document("magazines", magazine_data)
+        doc_id = await firebase_service.add_document("magazines", magazine_data)
         return {"id": doc_id, **magazine_data}
     except HTTPException:
         raise
@@ -476,7 +985,7 @@ async def apply_work_with_us(
         app_data["createdAt"] = datetime.now()
         app_data["updatedAt"] = datetime.now()
         
-        doc_id = firebase_service.add_document("work_with_us_applications", app_data)
+        doc_id = await firebase_service.add_document("work_with_us_applications", app_data)
         return {"id": doc_id, **app_data}
     except Exception as e:
         raise HTTPException(
@@ -487,7 +996,7 @@ async def apply_work_with_us(
 
 # ==================== ARTIST DASHBOARD ENDPOINTS ====================
 @app.get("/artist/products")
-async def get_artist_products(current_user: dict = Depends(get_current_user)):
+async def get_artist_products(fields: Optional[str] = None, current_user: dict = Depends(get_current_user)):
     """Get all products for current artist/admin"""
     try:
         if current_user.get("role") not in ["artist", "admin"]:
@@ -496,13 +1005,14 @@ async def get_artist_products(current_user: dict = Depends(get_current_user)):
                 detail="Only artists can access this"
             )
         
-        products = firebase_service.query_collection(
-            "products",
-            "artistId",
-            "==",
-            current_user["id"]
+        products, total = await asyncio.gather(
+            firebase_service.query_collection(
+                "products", "artistId", "==", current_user["id"],
+                fields=select_fields(fields, CARD_FIELDS["products"])
+            ),
+            firebase_service.count("products", [("artistId", "==", current_user["id"])])
         )
-        return {"items": products, "total": len(products)}
+        return {"items": products, "total": total}
     except HTTPException:
         raise
     except Exception as e:
@@ -513,7 +1023,11 @@ async def get_artist_products(current_user: dict = Depends(get_current_user)):
 
 
 @app.get("/artist/orders")
-async def get_artist_orders(current_user: dict = Depends(get_current_user)):
+async def get_artist_orders(
+    limit: int = 50,
+    page_token: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
     """Get orders for products sold by artist/admin"""
     try:
         if current_user.get("role") not in ["artist", "admin"]:
@@ -522,23 +1036,23 @@ async def get_artist_orders(current_user: dict = Depends(get_current_user)):
                 detail="Only artists can access this"
             )
         
-        # Get artist's products
-        products = firebase_service.query_collection(
-            "products",
-            "artistId",
-            "==",
-            current_user["id"]
+        filters = [("artistIds", "array_contains", current_user["id"])]
+        (artist_orders, next_page_token), total = await asyncio.gather(
+            firebase_service.query_page(
+                "orders",
+                filters=filters,
+                order_by=[("createdAt", "desc")],
+                limit=limit,
+                page_token=page_token
+            ),
+            firebase_service.count("orders", filters)
         )
-        product_ids = [p.get("id") for p in products]
-        
-        # Get all orders and filter by product IDs
-        all_orders = firebase_service.get_collection("orders")
-        artist_orders = [
-            o for o in all_orders
-            if any(item.get("productId") in product_ids for item in o.get("items", []))
-        ]
         
-        return {"items": artist_orders, "total": len(artist_orders)}
+        return {
+            "items": artist_orders,
+            "total": total,
+            "nextPageToken": next_page_token
+        }
     except HTTPException:
         raise
     except Exception as e:
@@ -558,40 +1072,12 @@ async def get_artist_analytics(current_user: dict = Depends(get_current_user)):
                 detail="Only artists can access this"
             )
         
-        # Get artist's products
-        products = firebase_service.query_collection(
-            "products",
-            "artistId",
-            "==",
-            current_user["id"]
-        )
-        product_ids = [p.get("id") for p in products]
-        
-        # Get all orders
-        all_orders = firebase_service.get_collection("orders")
-        
-        # Filter orders for this artist's products
-        artist_orders = [
-            o for o in all_orders
-            if any(item.get("productId") in product_ids for item in o.get("items", []))
-        ]
+        total_products = await firebase_service.count("products", [("artistId", "==", current_user["id"])])
         
-        # Calculate analytics
-        completed_orders = [o for o in artist_orders if o.get("paymentStatus") == "completed"]
-        pending_orders = [o for o in artist_orders if o.get("paymentStatus") == "pending"]
+        # Sales of this artist's items only, from the analytics snapshot
+        summary = await analytics_service.artist_summary(current_user["id"])
         
-        total_sales = sum(o.get("total", 0) for o in completed_orders)
-        total_items = sum(len(o.get("items", [])) for o in completed_orders)
-        
-        return {
-            "totalProducts": len(products),
-            "totalOrders": len(artist_orders),
-            "completedOrders": len(completed_orders),
-            "pendingOrders": len(pending_orders),
-            "totalSales": total_sales,
-            "totalItemsSold": total_items,
-            "averageOrderValue": total_sales / len(completed_orders) if completed_orders else 0
-        }
+        return {"totalProducts": total_products, **summary}
     except HTTPException:
         raise
     except Exception as e:
@@ -612,22 +1098,18 @@ async def get_dashboard_overview(current_user: dict = Depends(get_current_user))
                 detail="Super user only"
             )
         
-        users = firebase_service.get_collection("users")
-        orders = firebase_service.get_collection("orders")
-        products = firebase_service.get_collection("products")
+        stats = await stats_service.get_totals()
         
-        total_revenue = sum(o.get("total", 0) for o in orders if o.get("paymentStatus") == "completed")
-        total_orders = len(orders)
-        completed_orders = len([o for o in orders if o.get("paymentStatus") == "completed"])
-        pending_orders = len([o for o in orders if o.get("paymentStatus") == "pending"])
+        total_revenue = stats.get("revenueCompleted", 0)
+        completed_orders = stats.get("ordersCompleted", 0)
         
         return {
-            "totalUsers": len(users),
-            "totalOrders": total_orders,
+            "totalUsers": stats.get("usersTotal", 0),
+            "totalOrders": stats.get("ordersTotal", 0),
             "completedOrders": completed_orders,
-            "pendingOrders": pending_orders,
+            "pendingOrders": stats.get("ordersPending", 0),
             "totalRevenue": total_revenue,
-            "totalProducts": len(products),
+            "totalProducts": stats.get("productsTotal", 0),
             "averageOrderValue": total_revenue / completed_orders if completed_orders > 0 else 0
         }
     except HTTPException:
@@ -639,9 +1121,137 @@ async def get_dashboard_overview(current_user: dict = Depends(get_current_user))
         )
 
 
+@app.get("/admin/analytics/revenue")
+async def get_revenue_breakdown(
+    by: str = "day",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    artist_id: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Completed revenue grouped by day, category, artist, region or product (super user only)"""
+    try:
+        if current_user.get("email") != "cnssreedhar2001@gmail.com":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Super user only"
+            )
+        
+        groups = analytics_service.revenue(
+            by,
+            start=datetime.fromisoformat(start) if start else None,
+            end=datetime.fromisoformat(end) if end else None,
+            artist_id=artist_id
+        )
+        return {"by": by, "items": groups, "asOf": analytics_service.refreshed_at}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
+def series_range(start: Optional[str], end: Optional[str]):
+    """Parse a time-series range, defaulting to the last 30 days"""
+    end_at = datetime.fromisoformat(end) if end else datetime.now()
+    start_at = datetime.fromisoformat(start) if start else end_at - timedelta(days=30)
+    return start_at, end_at
+
+
+@app.get("/admin/analytics/timeseries")
+async def get_timeseries(
+    resolution: str = "day",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Orders and revenue per hour, day, week or month (super user only)"""
+    try:
+        if current_user.get("email") != "cnssreedhar2001@gmail.com":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Super user only"
+            )
+        
+        start_at, end_at = series_range(start, end)
+        points = await rollup_service.get_series(GLOBAL_SCOPE, start_at, end_at, resolution)
+        return {"resolution": resolution, "items": points}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
+@app.get("/artist/analytics/timeseries")
+async def get_artist_timeseries(
+    resolution: str = "day",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """The artist's orders and revenue per hour, day, week or month"""
+    try:
+        if current_user.get("role") not in ["artist", "admin"]:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Only artists can access this"
+            )
+        
+        start_at, end_at = series_range(start, end)
+        points = await rollup_service.get_series(
+            artist_scope(current_user["id"]), start_at, end_at, resolution
+        )
+        return {"resolution": resolution, "items": points}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
+@app.get("/artist/analytics/revenue")
+async def get_artist_revenue_breakdown(
+    by: str = "day",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """The artist's completed revenue grouped by day, category, region or product"""
+    try:
+        if current_user.get("role") not in ["artist", "admin"]:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Only artists can access this"
+            )
+        
+        groups = analytics_service.revenue(
+            by,
+            start=datetime.fromisoformat(start) if start else None,
+            end=datetime.fromisoformat(end) if end else None,
+            artist_id=current_user["id"]
+        )
+        return {"by": by, "items": groups, "asOf": analytics_service.refreshed_at}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
 @app.get("/admin/users/search")
 async def search_users(
     query: str = "",
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    skip: int = Query(0, ge=0),
     current_user: dict = Depends(get_current_user)
 ):
     """Search users (super user only)"""
@@ -652,18 +1262,8 @@ async def search_users(
                 detail="Super user only"
             )
         
-        users = firebase_service.get_collection("users")
-        
-        if query.strip():
-            filtered = [
-                u for u in users 
-                if query.lower() in u.get("email", "").lower() or 
-                   query.lower() in u.get("name", "").lower()
-            ]
-        else:
-            filtered = users
-        
-        return {"items": filtered, "total": len(filtered)}
+        users, total = user_search_index.search(query, limit=limit, offset=skip)
+        return {"items": users, "total": total}
     except HTTPException:
         raise
     except Exception as e:
@@ -686,18 +1286,16 @@ async def grant_admin_access(
                 detail="Super user only"
             )
         
-        user = firebase_service.get_document("users", user_id)
+        user = await firebase_service.get_document("users", user_id)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not found"
             )
         
-        firebase_service.update_document(
-            "users",
-            user_id,
-            {"role": "admin", "updatedAt": datetime.now()}
-        )
+        await run_in_threadpool(auth_service.set_role, user_id, "admin")
+        await stats_service.set_user_role(user_id, user.get("role", "user"), "admin")
+        user_search_index.upsert(user_id, {"role": "admin"})
         
         return {"message": f"Admin access granted to {user.get('email')}", "userId": user_id}
     except HTTPException:
@@ -722,18 +1320,16 @@ async def revoke_admin_access(
                 detail="Super user only"
             )
         
-        user = firebase_service.get_document("users", user_id)
+        user = await firebase_service.get_document("users", user_id)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not found"
             )
         
-        firebase_service.update_document(
-            "users",
-            user_id,
-            {"role": "user", "updatedAt": datetime.now()}
-        )
+        await run_in_threadpool(auth_service.set_role, user_id, "user")
+        await stats_service.set_user_role(user_id, user.get("role", "user"), "user")
+        user_search_index.upsert(user_id, {"role": "user"})
         
         return {"message": f"Admin access revoked from {user.get('email')}", "userId": user_id}
     except HTTPException:
@@ -746,7 +1342,7 @@ async def revoke_admin_access(
 
 
 @app.get("/admin/orders/all")
-async def get_all_orders(current_user: dict = Depends(get_current_user)):
+async def get_all_orders(fields: Optional[str] = None, current_user: dict = Depends(get_current_user)):
     """Get all orders (super user only)"""
     try:
         if current_user.get("email") != "cnssreedhar2001@gmail.com":
@@ -755,8 +1351,11 @@ async def get_all_orders(current_user: dict = Depends(get_current_user)):
                 detail="Super user only"
             )
         
-        orders = firebase_service.get_collection("orders")
-        return {"items": orders, "total": len(orders)}
+        orders, total = await asyncio.gather(
+            firebase_service.get_collection("orders", fields=select_fields(fields, CARD_FIELDS["orders"])),
+            firebase_service.count("orders")
+        )
+        return FastJSONResponse({"items": orders, "total": total})
     except HTTPException:
         raise
     except Exception as e:
@@ -766,6 +1365,64 @@ async def get_all_orders(current_user: dict = Depends(get_current_user)):
         )
 
 
+def export_response(
+    collection: str, columns: List[str], fmt: str, start: Optional[str], end: Optional[str]
+) -> StreamingResponse:
+    """Stream a collection export for documents created in [start, end)"""
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"format must be one of: {', '.join(MEDIA_TYPES)}"
+        )
+    try:
+        start_at = datetime.fromisoformat(start) if start else None
+        end_at = datetime.fromisoformat(end) if end else None
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start and end must be ISO dates"
+        )
+    
+    filename = "-".join([collection, *(value for value in (start, end) if value)])
+    return StreamingResponse(
+        export_service.export(collection, columns, fmt, start_at, end_at),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'}
+    )
+
+
+@app.get("/admin/orders/export")
+async def export_orders(
+    fmt: str = Query("ndjson", alias="format"),
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Stream every order created in [start, end) as NDJSON or CSV (super user only)"""
+    if current_user.get("email") != "cnssreedhar2001@gmail.com":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Super user only"
+        )
+    return export_response("orders", ORDER_COLUMNS, fmt, start, end)
+
+
+@app.get("/admin/users/export")
+async def export_users(
+    fmt: str = Query("ndjson", alias="format"),
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Stream every user who signed up in [start, end) as NDJSON or CSV (super user only)"""
+    if current_user.get("email") != "cnssreedhar2001@gmail.com":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Super user only"
+        )
+    return export_response("users", USER_COLUMNS, fmt, start, end)
+
+
 @app.get("/admin/analytics/payments")
 async def get_payment_analytics(current_user: dict = Depends(get_current_user)):
     """Get payment analytics (super user only)"""
@@ -776,23 +1433,19 @@ async def get_payment_analytics(current_user: dict = Depends(get_current_user)):
                 detail="Super user only"
             )
         
-        orders = firebase_service.get_collection("orders")
-        
-        completed = [o for o in orders if o.get("paymentStatus") == "completed"]
-        pending = [o for o in orders if o.get("paymentStatus") == "pending"]
-        failed = [o for o in orders if o.get("paymentStatus") == "failed"]
+        stats = await stats_service.get_totals()
         
-        completed_revenue = sum(o.get("total", 0) for o in completed)
-        pending_revenue = sum(o.get("total", 0) for o in pending)
+        completed = stats.get("ordersCompleted", 0)
+        total = stats.get("ordersTotal", 0)
         
         return {
-            "completedPayments": len(completed),
-            "completedRevenue": completed_revenue,
-            "pendingPayments": len(pending),
-            "pendingRevenue": pending_revenue,
-            "failedPayments": len(failed),
-            "totalTransactions": len(orders),
-            "successRate": (len(completed) / len(orders) * 100) if orders else 0
+            "completedPayments": completed,
+            "completedRevenue": stats.get("revenueCompleted", 0),
+            "pendingPayments": stats.get("ordersPending", 0),
+            "pendingRevenue": stats.get("revenuePending", 0),
+            "failedPayments": stats.get("ordersFailed", 0),
+            "totalTransactions": total,
+            "successRate": (completed / total * 100) if total else 0
         }
     except HTTPException:
         raise
@@ -813,19 +1466,14 @@ async def get_user_analytics(current_user: dict = Depends(get_current_user)):
                 detail="Super user only"
             )
         
-        users = firebase_service.get_collection("users")
-        orders = firebase_service.get_collection("orders")
-        
-        admins = [u for u in users if u.get("role") == "admin"]
-        artists = [u for u in users if u.get("role") == "artist"]
-        regular = [u for u in users if u.get("role") == "user"]
+        stats = await stats_service.get_totals()
         
         return {
-            "totalUsers": len(users),
-            "adminCount": len(admins),
-            "artistCount": len(artists),
-            "regularUsers": len(regular),
-            "ordersByUsers": len(set(o.get("userId") for o in orders))
+            "totalUsers": stats.get("usersTotal", 0),
+            "adminCount": stats.get("usersAdmin", 0),
+            "artistCount": stats.get("usersArtist", 0),
+            "regularUsers": stats.get("usersUser", 0),
+            "ordersByUsers": stats.get("orderingUsers", 0)
         }
     except HTTPException:
         raise
@@ -857,15 +1505,15 @@ async def submit_artist_application(application: WorkWithUsCreate, current_user:
         }
         
         # Save to Firestore in 'work_with_us_applications' collection
-        app_id = firebase_service.add_document("work_with_us_applications", app_data)
+        app_id = await firebase_service.add_document("work_with_us_applications", app_data)
         
         # Also create/update user as artist in users collection
-        user_data = firebase_service.get_document("users", current_user.get("id"))
+        user_data = await firebase_service.get_document("users", current_user.get("id"))
         if user_data:
             user_data["role"] = "artist"
             user_data["artForm"] = application.artForm
             user_data["updatedAt"] = datetime.now()
-            firebase_service.update_document("users", current_user.get("id"), user_data)
+            await firebase_service.update_document("users", current_user.get("id"), user_data)
         
         return {
             "id": app_id,
@@ -889,7 +1537,7 @@ async def get_artist_applications(current_user: dict = Depends(get_current_user)
                 detail="Super user only"
             )
         
-        applications = firebase_service.get_collection("work_with_us_applications")
+        applications = await firebase_service.get_collection("work_with_us_applications")
         return {"items": applications}
     except HTTPException:
         raise
@@ -910,7 +1558,7 @@ async def get_admin_applications(current_user: dict = Depends(get_current_user))
                 detail="Super user only"
             )
         
-        applications = firebase_service.get_collection("work_with_us_applications")
+        applications = await firebase_service.get_collection("work_with_us_applications")
         return {"items": applications}
     except HTTPException:
         raise
@@ -932,7 +1580,7 @@ async def approve_application(app_id: str, current_user: dict = Depends(get_curr
             )
         
         # Get the application
-        app = firebase_service.get_document("work_with_us_applications", app_id)
+        app = await firebase_service.get_document("work_with_us_applications", app_id)
         if not app:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -942,7 +1590,16 @@ async def approve_application(app_id: str, current_user: dict = Depends(get_curr
         # Update application status to approved
         app["status"] = "approved"
         app["updatedAt"] = datetime.now()
-        firebase_service.update_document("work_with_us_applications", app_id, app)
+        await firebase_service.update_document("work_with_us_applications", app_id, app)
+        
+        # Make the applicant an artist, without demoting admins
+        if app.get("userId"):
+            applicant = await firebase_service.get_document("users", app["userId"])
+            if applicant is None or applicant.get("role", "user") == "user":
+                await run_in_threadpool(auth_service.set_role, app["userId"], "artist")
+            if applicant and applicant.get("role", "user") == "user":
+                await stats_service.set_user_role(app["userId"], applicant.get("role", "user"), "artist")
+                user_search_index.upsert(app["userId"], {"role": "artist"})
         
         # Add to onboarding worklist
         worklist_item = {
@@ -963,7 +1620,7 @@ async def approve_application(app_id: str, current_user: dict = Depends(get_curr
             "createdAt": datetime.now(),
             "updatedAt": datetime.now()
         }
-        firebase_service.add_document("onboarding_worklist", worklist_item)
+        await firebase_service.add_document("onboarding_worklist", worklist_item)
         
         return {
             "message": "Application approved",
@@ -990,7 +1647,7 @@ async def delete_application(app_id: str, current_user: dict = Depends(get_curre
             )
         
         # Check if application exists
-        app = firebase_service.get_document("work_with_us_applications", app_id)
+        app = await firebase_service.get_document("work_with_us_applications", app_id)
         if not app:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -998,7 +1655,7 @@ async def delete_application(app_id: str, current_user: dict = Depends(get_curre
             )
         
         # Delete the application
-        firebase_service.delete_document("work_with_us_applications", app_id)
+        await firebase_service.delete_document("work_with_us_applications", app_id)
         
         return {
             "message": "Application deleted successfully"
@@ -1023,7 +1680,7 @@ async def get_onboarding_list(current_user: dict = Depends(get_current_user)):
                 detail="Super user only"
             )
         
-        onboarding = firebase_service.get_collection("onboarding_worklist")
+        onboarding = await firebase_service.get_collection("onboarding_worklist")
         return {"items": onboarding}
     except HTTPException:
         raise
@@ -1052,7 +1709,7 @@ async def update_onboarding_status(worklist_id: str, status_data: dict, current_
             )
         
         # Get the worklist item
-        item = firebase_service.get_document("onboarding_worklist", worklist_id)
+        item = await firebase_service.get_document("onboarding_worklist", worklist_id)
         if not item:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -1062,7 +1719,7 @@ async def update_onboarding_status(worklist_id: str, status_data: dict, current_
         # Update status
         item["status"] = new_status
         item["updatedAt"] = datetime.now()
-        firebase_service.update_document("onboarding_worklist", worklist_id, item)
+        await firebase_service.update_document("onboarding_worklist", worklist_id, item)
         
         return {
             "message": f"Status updated to {new_status}",
@@ -1088,7 +1745,7 @@ async def delete_onboarding_entry(worklist_id: str, current_user: dict = Depends
             )
         
         # Check if entry exists
-        item = firebase_service.get_document("onboarding_worklist", worklist_id)
+        item = await firebase_service.get_document("onboarding_worklist", worklist_id)
         if not item:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -1096,7 +1753,7 @@ async def delete_onboarding_entry(worklist_id: str, current_user: dict = Depends
             )
         
         # Delete the entry
-        firebase_service.delete_document("onboarding_worklist", worklist_id)
+        await firebase_service.delete_document("onboarding_worklist", worklist_id)
         
         return {
             "message": "Onboarding entry deleted successfully"
@@ -0,0 +1,775 @@
+"""In-memory stand-in for the async Firestore client.
+
+Implements the part of the client API this app uses: documents
+(get/create/set/update/delete, subcollections), queries (where, order_by,
+limit, start_after, select, stream), count/sum/avg aggregations, batches,
+transactions that work with ``firestore.async_transactional``, and snapshot
+listeners. Values are ordered, compared and returned as Firestore does:
+timestamps come back as aware UTC datetimes, and a query leaves out
+documents missing a field it filters or orders on.
+
+Every call that would be a round trip to Firestore first sleeps for
+``latency`` seconds, so load tests see realistic concurrency without
+a network. Select it with ``FIRESTORE_BACKEND=memory``.
+"""
+
+from google.api_core.exceptions import Aborted, AlreadyExists, InvalidArgument, NotFound
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.base_aggregation import AggregationResult
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import bisect
+import copy
+import random
+import string
+import threading
+import uuid
+
+# Firestore caps a batch or transaction at 500 writes
+MAX_WRITES = 500
+_AUTO_ID_CHARS = string.ascii_letters + string.digits
+# Rank of each value type in Firestore's cross-type ordering
+_NULL, _BOOL, _NUMBER, _TIMESTAMP, _STRING, _BYTES, _REFERENCE, _ARRAY, _MAP = range(9)
+_RANGE_OPERATORS = {"<", "<=", ">", ">=", "!=", "not-in"}
+_ALIASES = {"array-contains": "array_contains", "array-contains-any": "array_contains_any"}
+_DIRECTIONS = {"ASCENDING": "ASCENDING", "DESCENDING": "DESCENDING", "asc": "ASCENDING", "desc": "DESCENDING"}
+
+
+def _utc(value: datetime) -> datetime:
+    """Firestore stores naive datetimes as UTC and returns aware ones"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _normalize(value: Any) -> Any:
+    """Copy a value the way a write round trip through Firestore would"""
+    if isinstance(value, datetime):
+        return _utc(value)
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    return value
+
+
+def _key(value: Any) -> tuple:
+    """Sort key matching Firestore's ordering of values, across types"""
+    if value is None:
+        return (_NULL,)
+    if isinstance(value, bool):
+        return (_BOOL, value)
+    if isinstance(value, (int, float)):
+        return (_NUMBER, value)
+    if isinstance(value, datetime):
+        return (_TIMESTAMP, _utc(value))
+    if isinstance(value, str):
+        return (_STRING, value)
+    if isinstance(value, bytes):
+        return (_BYTES, value)
+    if isinstance(value, MemoryDocumentReference):
+        return (_REFERENCE, value.path)
+    if isinstance(value, (list, tuple)):
+        return (_ARRAY, tuple(_key(item) for item in value))
+    if isinstance(value, dict):
+        return (_MAP, tuple(sorted((key, _key(item)) for key, item in value.items())))
+    raise TypeError(f"Unsupported Firestore value: {value!r}")
+
+
+class _Descending:
+    """Inverts the comparison of a sort key, for descending orderings"""
+
+    __slots__ = ("key",)
+
+    def __init__(self, key: tuple):
+        self.key = key
+
+    def __lt__(self, other: "_Descending") -> bool:
+        return other.key < self.key
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, _Descending) and other.key == self.key
+
+
+_MISSING = object()
+
+
+def _get_field(data: dict, field_path: str) -> Any:
+    value: Any = data
+    for part in field_path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _set_field(data: dict, field_path: str, value: Any) -> None:
+    *parents, last = field_path.split(".")
+    for part in parents:
+        child = data.get(part)
+        if not isinstance(child, dict):
+            child = data[part] = {}
+        data = child
+    data[last] = value
+
+
+def _delete_field(data: dict, field_path: str) -> None:
+    *parents, last = field_path.split(".")
+    for part in parents:
+        data = data.get(part)
+        if not isinstance(data, dict):
+            return
+    data.pop(last, None)
+
+
+def _apply_value(data: dict, field_path: str, value: Any, now: datetime) -> None:
+    """Write one field, resolving transforms and sentinels against its current value"""
+    if value is transforms.DELETE_FIELD:
+        _delete_field(data, field_path)
+        return
+    if isinstance(value, dict):
+        # A map value replaces the field; transforms inside it still apply
+        _set_field(data, field_path, {})
+        _merge(data, value, now, f"{field_path}.")
+        return
+    current = _get_field(data, field_path)
+    if value is transforms.SERVER_TIMESTAMP:
+        value = now
+    elif isinstance(value, transforms.Increment):
+        value = (current if isinstance(current, (int, float)) and not isinstance(current, bool) else 0) + value.value
+    elif isinstance(value, transforms.ArrayUnion):
+        union = list(current) if isinstance(current, list) else []
+        for item in _normalize(value.values):
+            if _key(item) not in {_key(existing) for existing in union}:
+                union.append(item)
+        value = union
+    elif isinstance(value, transforms.ArrayRemove):
+        removed = {_key(item) for item in value.values}
+        value = [item for item in current if _key(item) not in removed] if isinstance(current, list) else []
+    else:
+        value = _normalize(value)
+    _set_field(data, field_path, value)
+
+
+def _merge(data: dict, changes: dict, now: datetime, prefix: str = "") -> None:
+    """Apply set(merge=True): nested maps merge field by field"""
+    for key, value in changes.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict) and value:
+            if not isinstance(_get_field(data, path), dict):
+                _set_field(data, path, {})
+            _merge(data, value, now, f"{path}.")
+        else:
+            _apply_value(data, path, value, now)
+
+
+class ChangeType(Enum):
+    ADDED = 1
+    REMOVED = 2
+    MODIFIED = 3
+
+
+class DocumentChange:
+    def __init__(self, type: ChangeType, document: "MemoryDocumentSnapshot", old_index: int, new_index: int):
+        self.type = type
+        self.document = document
+        self.old_index = old_index
+        self.new_index = new_index
+
+
+class WriteResult:
+    def __init__(self, update_time: datetime):
+        self.update_time = update_time
+
+
+class _Stored:
+    __slots__ = ("data", "create_time", "update_time", "version")
+
+    def __init__(self, data: dict, create_time: datetime, update_time: datetime, version: int):
+        self.data = data
+        self.create_time = create_time
+        self.update_time = update_time
+        self.version = version
+
+
+class MemoryDocumentSnapshot:
+    def __init__(
+        self,
+        reference: "MemoryDocumentReference",
+        stored: Optional[_Stored],
+        read_time: datetime,
+        field_paths: Optional[List[str]] = None,
+    ):
+        self.reference = reference
+        self.read_time = read_time
+        self.exists = stored is not None
+        self.create_time = stored.create_time if stored else None
+        self.update_time = stored.update_time if stored else None
+        self._data = None
+        if stored is not None:
+            if field_paths is None:
+                # Stored data is never changed in place, so it is shared
+                # here and copied only when handed out
+                self._data = stored.data
+            else:
+                self._data = {}
+                for field_path in field_paths:
+                    value = _get_field(stored.data, field_path)
+                    if value is not _MISSING:
+                        _set_field(self._data, field_path, copy.deepcopy(value))
+
+    @property
+    def id(self) -> str:
+        return self.reference.id
+
+    def to_dict(self) -> Optional[dict]:
+        return copy.deepcopy(self._data)
+
+    def get(self, field_path: str) -> Any:
+        if self._data is None:
+            return None
+        value = _get_field(self._data, field_path)
+        if value is _MISSING:
+            raise KeyError(f"'{field_path}' is not contained in the data")
+        return copy.deepcopy(value)
+
+
+class _Watch:
+    def __init__(self, client: "MemoryClient", collection: str, callback: Callable):
+        self.client = client
+        self.collection = collection
+        self.callback = callback
+
+    def unsubscribe(self) -> None:
+        self.client._unwatch(self)
+
+
+class MemoryDocumentReference:
+    def __init__(self, client: "MemoryClient", path: str):
+        self._client = client
+        self.path = path
+        self._collection, _, self.id = path.rpartition("/")
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, MemoryDocumentReference) and other.path == self.path
+
+    def __hash__(self) -> int:
+        return hash(self.path)
+
+    def __repr__(self) -> str:
+        return f"<MemoryDocumentReference {self.path}>"
+
+    @property
+    def parent(self) -> "MemoryCollectionReference":
+        return MemoryCollectionReference(self._client, self._collection)
+
+    def collection(self, collection_id: str) -> "MemoryCollectionReference":
+        return MemoryCollectionReference(self._client, f"{self.path}/{collection_id}")
+
+    async def get(self, field_paths: Optional[List[str]] = None, transaction=None) -> MemoryDocumentSnapshot:
+        await self._client._round_trip()
+        return self._client._read([self], field_paths, transaction)[0]
+
+    async def create(self, document_data: dict):
+        batch = self._client.batch()
+        batch.create(self, document_data)
+        return (await batch.commit())[0]
+
+    async def set(self, document_data: dict, merge: bool = False):
+        batch = self._client.batch()
+        batch.set(self, document_data, merge=merge)
+        return (await batch.commit())[0]
+
+    async def update(self, field_updates: dict):
+        batch = self._client.batch()
+        batch.update(self, field_updates)
+        return (await batch.commit())[0]
+
+    async def delete(self):
+        batch = self._client.batch()
+        batch.delete(self)
+        return (await batch.commit())[0]
+
+
+class MemoryQuery:
+    def __init__(
+        self,
+        client: "MemoryClient",
+        collection: str,
+        filters: Tuple[Tuple[str, str, Any], ...] = (),
+        orders: Tuple[Tuple[str, str], ...] = (),
+        limit: Optional[int] = None,
+        cursor: Any = None,
+        projection: Optional[List[str]] = None,
+        offset: int = 0,
+    ):
+        self._client = client
+        self._collection = collection
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit
+        self._cursor = cursor
+        self._projection = projection
+        self._offset = offset
+
+    def _copy(self, **changes) -> "MemoryQuery":
+        fields = {
+            "filters": self._filters, "orders": self._orders, "limit": self._limit,
+            "cursor": self._cursor, "projection": self._projection, "offset": self._offset,
+        }
+        fields.update(changes)
+        return MemoryQuery(self._client, self._collection, **fields)
+
+    def where(self, field_path: str, op_string: str, value: Any) -> "MemoryQuery":
+        op_string = _ALIASES.get(op_string, op_string)
+        if op_string not in {"==", "!=", "<", "<=", ">", ">=", "in", "not-in", "array_contains", "array_contains_any"}:
+            raise ValueError(f"Operator string {op_string!r} is invalid")
+        if op_string in ("in", "not-in", "array_contains_any"):
+            value = list(value)
+            if len(value) > 30:
+                raise InvalidArgument(f"'{op_string}' filters support a maximum of 30 elements")
+        return self._copy(filters=self._filters + ((field_path, op_string, _normalize(value)),))
+
+    def order_by(self, field_path: str, direction: str = "ASCENDING") -> "MemoryQuery":
+        if direction not in _DIRECTIONS:
+            raise ValueError(f"Invalid direction {direction!r}")
+        return self._copy(orders=self._orders + ((field_path, _DIRECTIONS[direction]),))
+
+    def limit(self, count: int) -> "MemoryQuery":
+        return self._copy(limit=count)
+
+    def offset(self, num_to_skip: int) -> "MemoryQuery":
+        return self._copy(offset=num_to_skip)
+
+    def start_after(self, document_fields_or_snapshot) -> "MemoryQuery":
+        return self._copy(cursor=document_fields_or_snapshot)
+
+    def select(self, field_paths: Iterable[str]) -> "MemoryQuery":
+        return self._copy(projection=[path for path in field_paths if path != "__name__"])
+
+    def _effective_orders(self) -> List[Tuple[str, str]]:
+        """Explicit orderings, then inequality fields, then the document ID,
+        as Firestore orders an incompletely ordered query"""
+        orders = list(self._orders)
+        ordered = {field for field, _ in orders}
+        if not orders:
+            for field, operator, _ in self._filters:
+                if operator in _RANGE_OPERATORS and field not in ordered:
+                    orders.append((field, "ASCENDING"))
+                    ordered.add(field)
+        if "__name__" not in ordered:
+            orders.append(("__name__", orders[-1][1] if orders else "ASCENDING"))
+        return orders
+
+    def _cursor_key(self, orders: List[Tuple[str, str]]) -> tuple:
+        cursor = self._cursor
+        if isinstance(cursor, MemoryDocumentSnapshot):
+            values = [cursor.id if field == "__name__" else cursor.get(field) for field, _ in orders]
+        else:
+            values = [cursor[field] for field, _ in orders if field in cursor]
+        key = []
+        for (field, direction), value in zip(orders, values):
+            if field == "__name__":
+                if isinstance(value, MemoryDocumentReference):
+                    value = value.id
+                value = (_REFERENCE, str(value).rpartition("/")[2])
+            else:
+                value = _key(_normalize(value))
+            key.append(_Descending(value) if direction == "DESCENDING" else value)
+        return tuple(key)
+
+    def _run(self, transaction=None) -> List[MemoryDocumentSnapshot]:
+        client = self._client
+        orders = self._effective_orders()
+        with client._lock:
+            keys, ids = client._sorted(self._collection, tuple(orders))
+            start = 0
+            if self._cursor is not None:
+                start = bisect.bisect_right(keys, self._cursor_key(orders))
+            docs = client._collections.get(self._collection, {})
+            matched = []
+            skipped = 0
+            for i in range(start, len(ids)):
+                stored = docs[ids[i]]
+                if all(_matches(stored.data, *condition) for condition in self._filters):
+                    if skipped < self._offset:
+                        skipped += 1
+                        continue
+                    matched.append(ids[i])
+                    if self._limit is not None and len(matched) >= self._limit:
+                        break
+            refs = [MemoryDocumentReference(client, f"{self._collection}/{doc_id}") for doc_id in matched]
+            return client._read(refs, self._projection, transaction)
+
+    async def stream(self, transaction=None) -> AsyncIterator[MemoryDocumentSnapshot]:
+        await self._client._round_trip()
+        for snapshot in self._run(transaction):
+            yield snapshot
+
+    async def get(self, transaction=None) -> List[MemoryDocumentSnapshot]:
+        return [snapshot async for snapshot in self.stream(transaction=transaction)]
+
+    def count(self, alias: Optional[str] = None) -> "MemoryAggregationQuery":
+        return MemoryAggregationQuery(self).count(alias=alias)
+
+    def sum(self, field_ref: str, alias: Optional[str] = None) -> "MemoryAggregationQuery":
+        return MemoryAggregationQuery(self).sum(field_ref, alias=alias)
+
+    def avg(self, field_ref: str, alias: Optional[str] = None) -> "MemoryAggregationQuery":
+        return MemoryAggregationQuery(self).avg(field_ref, alias=alias)
+
+
+def _matches(data: dict, field_path: str, operator: str, value: Any) -> bool:
+    if field_path == "__name__":
+        raise InvalidArgument("Filtering on __name__ is not supported by the memory backend")
+    current = _get_field(data, field_path)
+    if current is _MISSING:
+        return False
+    if operator == "==":
+        return _key(current) == _key(value)
+    if operator == "!=":
+        return _key(current) != _key(value)
+    if operator == "in":
+        return _key(current) in {_key(item) for item in value}
+    if operator == "not-in":
+        return _key(current) not in {_key(item) for item in value}
+    if operator == "array_contains":
+        return isinstance(current, list) and _key(value) in {_key(item) for item in current}
+    if operator == "array_contains_any":
+        return isinstance(current, list) and bool(
+            {_key(item) for item in current} & {_key(item) for item in value}
+        )
+    # Range filters only match values of the same type
+    left, right = _key(current), _key(value)
+    if left[0] != right[0]:
+        return False
+    return {"<": left < right, "<=": left <= right, ">": left > right, ">=": left >= right}[operator]
+
+
+class MemoryAggregationQuery:
+    def __init__(self, query: MemoryQuery):
+        self._query = query
+        self._aggregations: List[Tuple[str, Optional[str], str]] = []
+
+    def _add(self, kind: str, field_ref: Optional[str], alias: Optional[str]) -> "MemoryAggregationQuery":
+        self._aggregations.append((kind, field_ref, alias or f"field_{len(self._aggregations) + 1}"))
+        return self
+
+    def count(self, alias: Optional[str] = None) -> "MemoryAggregationQuery":
+        return self._add("count", None, alias)
+
+    def sum(self, field_ref: str, alias: Optional[str] = None) -> "MemoryAggregationQuery":
+        return self._add("sum", field_ref, alias)
+
+    def avg(self, field_ref: str, alias: Optional[str] = None) -> "MemoryAggregationQuery":
+        return self._add("avg", field_ref, alias)
+
+    async def get(self, transaction=None) -> List[List[AggregationResult]]:
+        client = self._query._client
+        await client._round_trip()
+        snapshots = self._query._run(transaction)
+        read_time = client._now()
+        results = []
+        for kind, field_ref, alias in self._aggregations:
+            if kind == "count":
+                results.append(AggregationResult(alias, len(snapshots), read_time))
+                continue
+            numbers = [
+                value for value in (_get_field(snapshot._data, field_ref) for snapshot in snapshots)
+                if isinstance(value, (int, float)) and not isinstance(value, bool)
+            ]
+            if kind == "sum":
+                value = sum(numbers)
+            else:
+                value = sum(numbers) / len(numbers) if numbers else None
+            results.append(AggregationResult(alias, value, read_time))
+        return [results]
+
+
+class MemoryCollectionReference(MemoryQuery):
+    def __init__(self, client: "MemoryClient", path: str):
+        super().__init__(client, path)
+        self.path = path
+        self.id = path.rpartition("/")[2]
+
+    def document(self, document_id: Optional[str] = None) -> MemoryDocumentReference:
+        if document_id is None:
+            document_id = "".join(self._client._random.choice(_AUTO_ID_CHARS) for _ in range(20))
+        return MemoryDocumentReference(self._client, f"{self.path}/{document_id}")
+
+    async def add(self, document_data: dict) -> Tuple[datetime, MemoryDocumentReference]:
+        ref = self.document()
+        result = await ref.create(document_data)
+        return result.update_time, ref
+
+    def on_snapshot(self, callback: Callable) -> _Watch:
+        """Call ``callback(docs, changes, read_time)`` with the whole
+        collection now and with every committed change after"""
+        return self._client._watch(self.path, callback)
+
+
+class MemoryWriteBatch:
+    def __init__(self, client: "MemoryClient"):
+        self._client = client
+        self._writes: List[Tuple[str, MemoryDocumentReference, Any]] = []
+
+    def _add(self, kind: str, reference: MemoryDocumentReference, payload: Any) -> None:
+        self._writes.append((kind, reference, payload))
+
+    def create(self, reference: MemoryDocumentReference, document_data: dict) -> None:
+        self._add("create", reference, document_data)
+
+    def set(self, reference: MemoryDocumentReference, document_data: dict, merge: bool = False) -> None:
+        self._add("merge" if merge else "set", reference, document_data)
+
+    def update(self, reference: MemoryDocumentReference, field_updates: dict) -> None:
+        self._add("update", reference, field_updates)
+
+    def delete(self, reference: MemoryDocumentReference) -> None:
+        self._add("delete", reference, None)
+
+    async def commit(self) -> list:
+        await self._client._round_trip()
+        writes, self._writes = self._writes, []
+        return self._client._commit(writes)
+
+
+class MemoryTransaction(MemoryWriteBatch):
+    """Optimistic transaction: commit aborts, and ``async_transactional``
+    retries, if a document read in the transaction changed since"""
+
+    def __init__(self, client: "MemoryClient", max_attempts: int = 5, read_only: bool = False):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._id = None
+        self._read_versions: Dict[str, Optional[int]] = {}
+
+    @property
+    def in_progress(self) -> bool:
+        return self._id is not None
+
+    def _add(self, kind: str, reference: MemoryDocumentReference, payload: Any) -> None:
+        if self._read_only:
+            raise ValueError("Cannot perform write operation in read-only transaction.")
+        super()._add(kind, reference, payload)
+
+    def _record_read(self, path: str, stored: Optional[_Stored]) -> None:
+        if self._writes:
+            raise ValueError("Attempted read after write in a transaction.")
+        self._read_versions.setdefault(path, stored.version if stored else None)
+
+    def _clean_up(self) -> None:
+        self._writes = []
+        self._read_versions = {}
+        self._id = None
+
+    async def _begin(self, retry_id=None) -> None:
+        if self.in_progress:
+            raise ValueError("The transaction has already begun.")
+        await self._client._round_trip()
+        self._id = uuid.uuid4().bytes
+
+    async def _rollback(self) -> None:
+        self._clean_up()
+
+    async def _commit(self) -> list:
+        if not self.in_progress:
+            raise ValueError("The transaction has no transaction ID, so it cannot be committed.")
+        await self._client._round_trip()
+        writes, reads = self._writes, self._read_versions
+        self._clean_up()
+        return self._client._commit(writes, reads)
+
+    async def commit(self) -> list:
+        raise ValueError("Commit transactions through firestore.async_transactional")
+
+
+class MemoryClient:
+    """In-memory async Firestore client. Thread-safe; listeners run on the
+    thread that commits the change."""
+
+    def __init__(self, latency: float = 0.0, project: str = "memory", seed: Optional[int] = 0):
+        self.latency = latency
+        self.project = project
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._collections: Dict[str, Dict[str, _Stored]] = {}
+        self._generations: Dict[str, int] = {}
+        self._orderings: Dict[Tuple[str, tuple], Tuple[int, list, list]] = {}
+        self._watches: List[_Watch] = []
+        self._version = 0
+        self._clock = datetime.min.replace(tzinfo=timezone.utc)
+
+    def clear(self) -> None:
+        """Drop every document and listener, like restarting the emulator"""
+        with self._lock:
+            self._collections.clear()
+            self._generations.clear()
+            self._orderings.clear()
+            self._watches.clear()
+
+    async def _round_trip(self) -> None:
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+
+    def _now(self) -> datetime:
+        """Strictly increasing commit timestamps, like Firestore's"""
+        with self._lock:
+            self._clock = max(datetime.now(timezone.utc), self._clock + timedelta(microseconds=1))
+            return self._clock
+
+    def collection(self, path: str) -> MemoryCollectionReference:
+        return MemoryCollectionReference(self, path)
+
+    def document(self, path: str) -> MemoryDocumentReference:
+        return MemoryDocumentReference(self, path)
+
+    def batch(self) -> MemoryWriteBatch:
+        return MemoryWriteBatch(self)
+
+    def transaction(self, max_attempts: int = 5, read_only: bool = False) -> MemoryTransaction:
+        return MemoryTransaction(self, max_attempts=max_attempts, read_only=read_only)
+
+    async def get_all(
+        self, references: List[MemoryDocumentReference], field_paths: Optional[List[str]] = None, transaction=None
+    ) -> AsyncIterator[MemoryDocumentSnapshot]:
+        await self._round_trip()
+        unique = list({ref.path: ref for ref in references}.values())
+        for snapshot in self._read(unique, field_paths, transaction):
+            yield snapshot
+
+    def _read(self, references, field_paths, transaction) -> List[MemoryDocumentSnapshot]:
+        with self._lock:
+            read_time = self._clock
+            snapshots = []
+            for ref in references:
+                stored = self._collections.get(ref._collection, {}).get(ref.id)
+                if transaction is not None:
+                    transaction._record_read(ref.path, stored)
+                snapshots.append(MemoryDocumentSnapshot(ref, stored, read_time, field_paths))
+            return snapshots
+
+    def _sorted(self, collection: str, orders: tuple) -> Tuple[list, list]:
+        """Sort keys and IDs of the collection's documents that have every
+        ordered field, cached until the collection next changes"""
+        generation = self._generations.get(collection, 0)
+        cached = self._orderings.get((collection, orders))
+        if cached is not None and cached[0] == generation:
+            return cached[1], cached[2]
+        rows = []
+        for doc_id, stored in self._collections.get(collection, {}).items():
+            key = []
+            for field, direction in orders:
+                value = (_REFERENCE, doc_id) if field == "__name__" else _get_field(stored.data, field)
+                if value is _MISSING:
+                    break
+                if field != "__name__":
+                    value = _key(value)
+                key.append(_Descending(value) if direction == "DESCENDING" else value)
+            else:
+                rows.append((tuple(key), doc_id))
+        rows.sort(key=lambda row: row[0])
+        keys, ids = [row[0] for row in rows], [row[1] for row in rows]
+        self._orderings[(collection, orders)] = (generation, keys, ids)
+        return keys, ids
+
+    def _commit(self, writes: list, reads: Optional[Dict[str, Optional[int]]] = None) -> list:
+        if len(writes) > MAX_WRITES:
+            raise InvalidArgument(f"A write batch can contain at most {MAX_WRITES} writes")
+        with self._lock:
+            for path, version in (reads or {}).items():
+                collection, _, doc_id = path.rpartition("/")
+                stored = self._collections.get(collection, {}).get(doc_id)
+                if (stored.version if stored else None) != version:
+                    raise Aborted("Transaction lock timeout; a document read in it was changed")
+
+            now = self._now()
+            # Validate and stage every write before applying any of them
+            staged: Dict[str, Tuple[MemoryDocumentReference, Optional[dict], Optional[_Stored]]] = {}
+            for kind, ref, payload in writes:
+                docs = self._collections.get(ref._collection, {})
+                previous = staged[ref.path][2] if ref.path in staged else docs.get(ref.id)
+                data = copy.deepcopy(staged[ref.path][1]) if ref.path in staged else (
+                    copy.deepcopy(docs[ref.id].data) if ref.id in docs else None
+                )
+                if kind == "create" and data is not None:
+                    raise AlreadyExists(f"Document already exists: {ref.path}")
+                if kind == "update" and data is None:
+                    raise NotFound(f"No document to update: {ref.path}")
+                if kind == "delete":
+                    data = None
+                elif kind in ("create", "set"):
+                    data = {}
+                    _merge(data, payload, now)
+                else:
+                    data = data or {}
+                    if kind == "merge":
+                        _merge(data, payload, now)
+                    else:
+                        for field_path, value in payload.items():
+                            _apply_value(data, field_path, value, now)
+                staged[ref.path] = (ref, data, previous)
+
+            results = []
+            changed: Dict[str, List[Tuple[MemoryDocumentReference, Optional[_Stored], Optional[_Stored]]]] = {}
+            for path, (ref, data, _) in staged.items():
+                docs = self._collections.setdefault(ref._collection, {})
+                old = docs.get(ref.id)
+                if data is None:
+                    docs.pop(ref.id, None)
+                    new = None
+                else:
+                    self._version += 1
+                    new = _Stored(data, old.create_time if old else now, now, self._version)
+                    docs[ref.id] = new
+                self._generations[ref._collection] = self._generations.get(ref._collection, 0) + 1
+                changed.setdefault(ref._collection, []).append((ref, old, new))
+                results.append(WriteResult(now))
+
+            # Listeners hear about commits in commit order
+            for watch in list(self._watches):
+                if watch.collection in changed:
+                    docs, changes = self._changes(watch.collection, changed[watch.collection], now)
+                    watch.callback(docs, changes, now)
+        return results
+
+    def _changes(self, collection: str, changed, read_time: datetime):
+        """The collection's documents and the changes to them, as a listener sees them"""
+        ids = sorted(self._collections.get(collection, {}))
+        docs = [
+            MemoryDocumentSnapshot(self.document(f"{collection}/{doc_id}"), self._collections[collection][doc_id], read_time)
+            for doc_id in ids
+        ]
+        changes = []
+        for ref, old, new in changed:
+            if new is None and old is None:
+                continue
+            if new is None:
+                changes.append(DocumentChange(ChangeType.REMOVED, MemoryDocumentSnapshot(ref, old, read_time), -1, -1))
+            else:
+                index = bisect.bisect_left(ids, ref.id)
+                change_type = ChangeType.ADDED if old is None else ChangeType.MODIFIED
+                changes.append(DocumentChange(change_type, docs[index], -1 if old is None else index, index))
+        return docs, changes
+
+    def _watch(self, collection: str, callback: Callable) -> _Watch:
+        watch = _Watch(self, collection, callback)
+        with self._lock:
+            read_time = self._clock
+            ids = sorted(self._collections.get(collection, {}))
+            docs = [
+                MemoryDocumentSnapshot(self.document(f"{collection}/{doc_id}"), self._collections[collection][doc_id], read_time)
+                for doc_id in ids
+            ]
+            self._watches.append(watch)
+            changes = [DocumentChange(ChangeType.ADDED, doc, -1, i) for i, doc in enumerate(docs)]
+            callback(docs, changes, read_time)
+        return watch
+
+    def _unwatch(self, watch: _Watch) -> None:
+        with self._lock:
+            if watch in self._watches:
+                self._watches.remove(watch)
@@ -67,6 +67,10 @@ class Product(ProductCreate):
     updatedAt: datetime
 
 
+class ProductBatchRequest(BaseModel):
+    ids: List[str]
+
+
 class CartItemBase(BaseModel):
     productId: str
     quantity: int
@@ -1,16 +1,165 @@
-import razorpay
 from config import settings
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from datetime import datetime
+import asyncio
+import hashlib
+import hmac
+import random
+import time
+import httpx
+
+# Consecutive failures that open the circuit, and how long it stays open
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_COOLDOWN = 30.0
+# Each request earns this fraction of a retry; retries stop when the budget
+# is spent, so an outage can't multiply our traffic to Razorpay
+RETRY_BUDGET_RATIO = 0.1
+RETRY_BUDGET_MAX = 10.0
+RETRY_BASE_DELAY = 0.2
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class RazorpayUnavailable(Exception):
+    """Raised without calling Razorpay while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        # Set while the single trial request of the half-open state is out.
+        # A trial that never reports back (e.g. cancelled) is given up on
+        # after another cooldown.
+        self.half_open_in_flight = False
+        self.trial_started_at = 0.0
+
+    def allow(self) -> bool:
+        """Closed, or open for long enough that one trial request may go through"""
+        if self.opened_at is None:
+            return True
+        now = time.monotonic()
+        if now - self.opened_at < self.cooldown:
+            return False
+        if self.half_open_in_flight and now - self.trial_started_at < self.cooldown:
+            return False
+        self.half_open_in_flight = True
+        self.trial_started_at = now
+        return True
+
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.half_open_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.half_open_in_flight or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+        self.half_open_in_flight = False
+
+
+class RetryBudget:
+    def __init__(self, ratio: float, maximum: float):
+        self.ratio = ratio
+        self.maximum = maximum
+        self.tokens = maximum
+
+    def deposit(self) -> None:
+        self.tokens = min(self.maximum, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
 
 
 class RazorpayService:
+    """Async Razorpay REST client over a pooled keep-alive HTTP connection.
+
+    Every call has a timeout, failed calls are retried with jittered backoff
+    while the retry budget lasts, and repeated failures open a circuit
+    breaker so a Razorpay outage fails fast instead of tying up workers.
+    """
+
     def __init__(self):
-        self.client = razorpay.Client(
-            auth=(settings.razorpay_key_id, settings.razorpay_key_secret)
-        )
+        self._client: Optional[httpx.AsyncClient] = None
+        self.breaker = CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_COOLDOWN)
+        self.retry_budget = RetryBudget(RETRY_BUDGET_RATIO, RETRY_BUDGET_MAX)
 
-    def create_order(
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=settings.razorpay_base_url,
+                auth=(settings.razorpay_key_id, settings.razorpay_key_secret),
+                timeout=settings.razorpay_timeout,
+                limits=httpx.Limits(
+                    max_connections=settings.razorpay_max_connections,
+                    max_keepalive_connections=settings.razorpay_max_connections
+                )
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        """Close pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _request(
+        self, method: str, path: str, json: Optional[dict] = None, params: Optional[dict] = None
+    ) -> Dict[str, Any]:
+        """Call the Razorpay API with timeout, retries and circuit breaking.
+
+        Non-GET requests are only retried when the connection failed before
+        the request was sent, so an order or refund is never created twice.
+        """
+        if not self.breaker.allow():
+            raise RazorpayUnavailable("Razorpay is unavailable, try again shortly")
+        self.retry_budget.deposit()
+
+        attempt = 0
+        while True:
+            retryable = False
+            try:
+                response = await self.client.request(method, path, json=json, params=params)
+                if response.status_code in RETRYABLE_STATUS:
+                    # A rate-limited request was not processed, so any method may retry
+                    retryable = method == "GET" or response.status_code == 429
+                    response.raise_for_status()
+                if response.status_code >= 400:
+                    # Client errors are our fault, not Razorpay's health
+                    self.breaker.record_success()
+                    response.raise_for_status()
+                self.breaker.record_success()
+                return response.json()
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code not in RETRYABLE_STATUS:
+                    raise
+                error = e
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                retryable = True
+                error = e
+            except httpx.TransportError as e:
+                retryable = method == "GET"
+                error = e
+
+            self.breaker.record_failure()
+            if (
+                not retryable or self.breaker.is_open() or attempt >= settings.razorpay_max_retries
+                or not self.retry_budget.withdraw()
+            ):
+                raise error
+            attempt += 1
+            await asyncio.sleep(random.uniform(0, RETRY_BASE_DELAY * 2 ** attempt))
+
+    async def create_order(
         self,
         amount: float,
         currency: str = "INR",
@@ -20,13 +169,12 @@ class RazorpayService:
         """Create a Razorpay order"""
         try:
             order_data = {
-                "amount": int(amount * 100),  # Amount in paise
+                "amount": int(round(amount * 100)),  # Amount in paise
                 "currency": currency,
                 "receipt": receipt or f"order_{datetime.now().timestamp()}",
                 "notes": notes or {}
             }
-            order = self.client.order.create(data=order_data)
-            return order
+            return await self._request("POST", "/orders", json=order_data)
         except Exception as e:
             raise Exception(f"Failed to create order: {str(e)}")
 
@@ -37,25 +185,42 @@ class RazorpayService:
         razorpay_signature: str
     ) -> bool:
         """Verify Razorpay payment signature"""
-        try:
-            self.client.utility.verify_payment_signature({
-                'razorpay_order_id': razorpay_order_id,
-                'razorpay_payment_id': razorpay_payment_id,
-                'razorpay_signature': razorpay_signature
-            })
-            return True
-        except Exception as e:
-            raise Exception(f"Payment verification failed: {str(e)}")
+        message = f"{razorpay_order_id}|{razorpay_payment_id}".encode()
+        expected = hmac.new(settings.razorpay_key_secret.encode(), message, hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(expected, razorpay_signature or ""):
+            raise Exception("Payment verification failed: signature mismatch")
+        return True
 
-    def fetch_payment(self, payment_id: str) -> Dict[str, Any]:
+    def verify_webhook_signature(self, body: bytes, signature: Optional[str]) -> bool:
+        """Check a webhook body against its X-Razorpay-Signature header"""
+        if not settings.razorpay_webhook_secret or not signature:
+            return False
+        expected = hmac.new(settings.razorpay_webhook_secret.encode(), body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expected, signature)
+
+    async def fetch_payment(self, payment_id: str) -> Dict[str, Any]:
         """Fetch payment details"""
         try:
-            payment = self.client.payment.fetch(payment_id)
-            return payment
+            return await self._request("GET", f"/payments/{payment_id}")
         except Exception as e:
             raise Exception(f"Failed to fetch payment: {str(e)}")
 
-    def refund_payment(
+    async def list_payments(
+        self, start: datetime, end: datetime, count: int = 100, skip: int = 0
+    ) -> List[Dict[str, Any]]:
+        """List one page of the payments created between start and end, newest first"""
+        try:
+            response = await self._request("GET", "/payments", params={
+                "from": int(start.timestamp()),
+                "to": int(end.timestamp()),
+                "count": count,
+                "skip": skip
+            })
+            return response.get("items", [])
+        except Exception as e:
+            raise Exception(f"Failed to list payments: {str(e)}")
+
+    async def refund_payment(
         self,
         payment_id: str,
         amount: Optional[float] = None,
@@ -67,14 +232,13 @@ class RazorpayService:
                 "notes": notes or {}
             }
             if amount:
-                refund_data["amount"] = int(amount * 100)
-            
-            refund = self.client.payment.refund(payment_id, refund_data)
-            return refund
+                refund_data["amount"] = int(round(amount * 100))
+
+            return await self._request("POST", f"/payments/{payment_id}/refund", json=refund_data)
         except Exception as e:
             raise Exception(f"Failed to refund payment: {str(e)}")
 
-    def create_subscription(
+    async def create_subscription(
         self,
         plan_id: str,
         customer_notify: int = 1,
@@ -89,8 +253,7 @@ class RazorpayService:
                 "quantity": quantity,
                 "notes": notes or {}
             }
-            subscription = self.client.subscription.create(data=subscription_data)
-            return subscription
+            return await self._request("POST", "/subscriptions", json=subscription_data)
         except Exception as e:
             raise Exception(f"Failed to create subscription: {str(e)}")
 
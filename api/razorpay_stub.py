@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Local stand-in for the Razorpay REST API, for load tests and offline work.
+
+Answers the endpoints razorpay_service calls with plausible responses after
+an optional delay, and fails a share of requests with 503 so retries and the
+circuit breaker can be exercised:
+
+    RAZORPAY_STUB_LATENCY=0.05 RAZORPAY_STUB_FAILURE_RATE=0.1 python razorpay_stub.py
+    RAZORPAY_BASE_URL=http://localhost:9000/v1 uvicorn main:app
+"""
+
+import asyncio
+import os
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, HTTPException, Request
+
+LATENCY = float(os.getenv("RAZORPAY_STUB_LATENCY", "0"))
+FAILURE_RATE = float(os.getenv("RAZORPAY_STUB_FAILURE_RATE", "0"))
+
+app = FastAPI(title="Razorpay Stub")
+
+
+def _id(prefix: str) -> str:
+    return f"{prefix}_{uuid.uuid4().hex[:14]}"
+
+
+async def _simulate() -> None:
+    if LATENCY:
+        await asyncio.sleep(LATENCY)
+    if random.random() < FAILURE_RATE:
+        raise HTTPException(status_code=503, detail="Simulated Razorpay outage")
+
+
+@app.post("/v1/orders")
+async def create_order(request: Request):
+    await _simulate()
+    body = await request.json()
+    return {
+        "id": _id("order"),
+        "entity": "order",
+        "amount": body.get("amount"),
+        "amount_paid": 0,
+        "amount_due": body.get("amount"),
+        "currency": body.get("currency", "INR"),
+        "receipt": body.get("receipt"),
+        "status": "created",
+        "notes": body.get("notes", {}),
+        "created_at": int(time.time())
+    }
+
+
+@app.get("/v1/payments")
+async def list_payments(count: int = 10, skip: int = 0):
+    await _simulate()
+    # The stub keeps no state, so there are never any payments to list
+    return {"entity": "collection", "count": 0, "items": []}
+
+
+@app.get("/v1/payments/{payment_id}")
+async def fetch_payment(payment_id: str):
+    await _simulate()
+    return {
+        "id": payment_id,
+        "entity": "payment",
+        "amount": 100,
+        "currency": "INR",
+        "status": "captured",
+        "order_id": _id("order"),
+        "created_at": int(time.time())
+    }
+
+
+@app.post("/v1/payments/{payment_id}/refund")
+async def refund_payment(payment_id: str, request: Request):
+    await _simulate()
+    body = await request.json()
+    return {
+        "id": _id("rfnd"),
+        "entity": "refund",
+        "payment_id": payment_id,
+        "amount": body.get("amount"),
+        "currency": "INR",
+        "status": "processed",
+        "notes": body.get("notes", {}),
+        "created_at": int(time.time())
+    }
+
+
+@app.post("/v1/subscriptions")
+async def create_subscription(request: Request):
+    await _simulate()
+    body = await request.json()
+    return {
+        "id": _id("sub"),
+        "entity": "subscription",
+        "plan_id": body.get("plan_id"),
+        "quantity": body.get("quantity", 1),
+        "status": "created",
+        "notes": body.get("notes", {}),
+        "created_at": int(time.time())
+    }
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("RAZORPAY_STUB_PORT", "9000")))
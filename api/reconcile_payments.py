@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""Reconcile unpaid orders against the payments Razorpay actually took.
+
+Orders stay pending when the buyer's browser never confirmed the payment
+and no webhook arrived. Run nightly; by default it checks yesterday's orders:
+
+    python reconcile_payments.py
+    python reconcile_payments.py --start 2026-01-01 --end 2026-01-08
+
+Progress is checkpointed per window in ``reconciliation_runs``, so an
+interrupted run carries on where it stopped. Pass --restart to start over.
+"""
+
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from google.cloud import firestore
+
+from config import settings
+from firebase_service import firebase_service
+from inventory_service import inventory_service, RESERVATIONS_COLLECTION, TRANSACTION_ATTEMPTS
+from razorpay_service import razorpay_service
+from stats_service import stats_service
+
+RUNS_COLLECTION = "reconciliation_runs"
+# Payments per Razorpay page (at most 100). Each page of corrections is
+# applied with the checkpoint in one transaction, and each corrected order
+# writes itself, its reservation, its products' stock, a counter shard and
+# its rollups.
+PAGE_SIZE = 50
+ORDER_PAGE_SIZE = 1000
+# Payment status on Razorpay -> our order payment status
+PAYMENT_STATUSES = {"captured": "completed", "refunded": "refunded", "failed": "failed"}
+# When several payments were attempted for one order, the strongest wins
+PRECEDENCE = {"failed": 0, "completed": 1, "refunded": 2}
+
+
+async def load_unpaid_orders(start: datetime, end: datetime) -> Dict[str, str]:
+    """Map Razorpay order IDs to our IDs for unpaid orders created in the window"""
+    unpaid = {}
+    page_token = None
+    while True:
+        orders, page_token = await firebase_service.query_page(
+            "orders",
+            filters=[
+                ("paymentStatus", "in", ["pending", "failed"]),
+                ("createdAt", ">=", start),
+                ("createdAt", "<", end),
+            ],
+            order_by=[("createdAt", "asc")],
+            limit=ORDER_PAGE_SIZE,
+            page_token=page_token
+        )
+        for order in orders:
+            if order.get("paymentId"):
+                unpaid[order["paymentId"]] = order["id"]
+        if not page_token:
+            return unpaid
+
+
+def corrections(payments: List[dict], unpaid: Dict[str, str]) -> Dict[str, dict]:
+    """Pick the payment that decides each unpaid order's status"""
+    found = {}
+    for payment in payments:
+        order_id = unpaid.get(payment.get("order_id"))
+        payment_status = PAYMENT_STATUSES.get(payment.get("status"))
+        if order_id is None or payment_status is None:
+            continue
+        if payment_status == "refunded" and payment.get("amount_refunded", 0) < payment.get("amount", 0):
+            payment_status = "completed"
+        current = found.get(order_id)
+        if current is None or PRECEDENCE[payment_status] > PRECEDENCE[current["paymentStatus"]]:
+            found[order_id] = {"paymentStatus": payment_status, "payment": payment}
+    return found
+
+
+async def apply_page(run_ref, fixes: Dict[str, dict], checkpoint: dict) -> int:
+    """Correct one page of orders and advance the checkpoint atomically"""
+    db = firebase_service.db
+    order_refs = {order_id: db.collection("orders").document(order_id) for order_id in fixes}
+    reservation_refs = {
+        order_id: db.collection(RESERVATIONS_COLLECTION).document(order_id) for order_id in fixes
+    }
+
+    @firestore.async_transactional
+    async def _apply(transaction):
+        snapshots = {}
+        refs = list(order_refs.values()) + list(reservation_refs.values())
+        async for doc in db.get_all(refs, transaction=transaction):
+            snapshots[doc.reference.path] = doc
+
+        corrected = 0
+        now = datetime.now()
+        for order_id, fix in fixes.items():
+            order = snapshots[order_refs[order_id].path]
+            # Anything a webhook or the client settled meanwhile is left alone
+            if not order.exists or order.get("paymentStatus") not in ("pending", "failed"):
+                continue
+            payment_status = fix["paymentStatus"]
+            if payment_status == order.get("paymentStatus"):
+                continue
+            payment = fix["payment"]
+            updates = {"razorpayPaymentId": payment.get("id"), "reconciledAt": now, "updatedAt": now}
+            if payment_status == "completed":
+                updates["status"] = "confirmed"
+            elif payment_status == "refunded":
+                updates["status"] = "refunded"
+                updates["refundedAmount"] = round(payment.get("amount_refunded", 0) / 100, 2)
+            stats_service.stage_payment_status(
+                transaction, order_refs[order_id], order.to_dict(), payment_status, updates
+            )
+
+            reservation = snapshots[reservation_refs[order_id].path]
+            if payment_status != "failed" and reservation.exists and reservation.get("status") == "held":
+                inventory_service.stage_commit(transaction, reservation_refs[order_id], reservation.to_dict())
+            corrected += 1
+
+        transaction.set(run_ref, {
+            **checkpoint, "corrected": firestore.Increment(corrected), "updatedAt": now
+        }, merge=True)
+        return corrected
+
+    return await _apply(db.transaction(max_attempts=TRANSACTION_ATTEMPTS))
+
+
+def advance(cursor: Optional[int], cursor_ids: List[str], payments: List[dict]) -> Tuple[int, List[str]]:
+    """Move the checkpoint past a page of payments, newest first.
+
+    The cursor is the creation time of the oldest payment checked, with the
+    IDs checked at that second. Offsets into the listing aren't stable while
+    payments are still coming in, since new ones go on top, but everything
+    at or before the cursor is.
+    """
+    oldest = payments[-1]["created_at"]
+    ids = [payment["id"] for payment in payments if payment["created_at"] == oldest]
+    if oldest == cursor:
+        ids = cursor_ids + [payment_id for payment_id in ids if payment_id not in cursor_ids]
+    return oldest, ids
+
+
+async def reconcile(start: datetime, end: datetime, restart: bool = False) -> int:
+    """Reconcile orders created in [start, end) and return how many were corrected"""
+    run_ref = firebase_service.db.collection(RUNS_COLLECTION).document(
+        f"{start:%Y%m%dT%H%M%S}_{end:%Y%m%dT%H%M%S}"
+    )
+    run = await run_ref.get()
+    cursor, cursor_ids, checked = None, [], 0
+    if run.exists and not restart:
+        if run.get("status") == "done":
+            print("[RECONCILE] Window already reconciled, pass --restart to run it again")
+            return 0
+        # Runs checkpointed by offset before the cursor existed start over
+        cursor = run.to_dict().get("cursor")
+        cursor_ids = run.to_dict().get("cursorIds") or []
+        checked = run.to_dict().get("checked", 0)
+        print(f"[RECONCILE] Resuming after {checked} payments")
+    else:
+        await run_ref.set({
+            "start": start, "end": end, "cursor": None, "cursorIds": [], "checked": 0,
+            "corrected": 0, "status": "running"
+        })
+
+    unpaid = await load_unpaid_orders(start, end)
+    print(f"[RECONCILE] {len(unpaid)} unpaid orders between {start} and {end}")
+
+    # Payments can land up to the reservation window after their order
+    payments_end = end + timedelta(seconds=settings.stock_reservation_ttl)
+    corrected = 0
+    while unpaid:
+        # Razorpay's bounds are inclusive, so the page starts with the
+        # payments already checked at the cursor's second
+        payments = await razorpay_service.list_payments(
+            start, datetime.fromtimestamp(cursor) if cursor is not None else payments_end,
+            count=PAGE_SIZE, skip=len(cursor_ids)
+        )
+        if not payments:
+            break
+        fresh = [payment for payment in payments if payment["id"] not in cursor_ids]
+        cursor, cursor_ids = advance(cursor, cursor_ids, payments)
+        checked += len(fresh)
+        fixes = corrections(fresh, unpaid)
+        corrected += await apply_page(run_ref, fixes, {"cursor": cursor, "cursorIds": cursor_ids, "checked": checked})
+        print(f"[RECONCILE] Checked {checked} payments, corrected {corrected} orders")
+        if len(payments) < PAGE_SIZE:
+            break
+
+    await run_ref.update({"status": "done", "finishedAt": datetime.now()})
+    return corrected
+
+
+def _yesterday():
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - timedelta(days=1), today
+
+
+async def main(args) -> int:
+    default_start, default_end = _yesterday()
+    start = datetime.fromisoformat(args.start) if args.start else default_start
+    end = datetime.fromisoformat(args.end) if args.end else default_end
+    try:
+        return await reconcile(start, end, restart=args.restart)
+    finally:
+        await razorpay_service.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--start", help="Start of the order window (ISO date or datetime), default yesterday")
+    parser.add_argument("--end", help="End of the order window, exclusive, default today")
+    parser.add_argument("--restart", action="store_true", help="Ignore any checkpoint for this window")
+    count = asyncio.run(main(parser.parse_args()))
+    print(f"[RECONCILE] Done, {count} orders corrected")
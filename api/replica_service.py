@@ -0,0 +1,326 @@
+from firebase_service import firebase_service, _decode_page_token, _encode_page_token
+from config import settings
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+
+# Replicated collections and the fields copied into indexed columns, which
+# are the only fields the replica can filter and order on
+REPLICATED = {
+    "products": ("category", "featured", "price", "createdAt", "artistId"),
+    "blog_posts": ("published", "createdAt"),
+    "magazines": ("createdAt",),
+}
+# Column sets indexed per collection, mirroring firestore.indexes.json
+INDEXES = {
+    "products": [
+        ("category", "createdAt"), ("category", "price"), ("featured", "createdAt"),
+        ("featured", "price"), ("category", "featured", "createdAt"),
+        ("category", "featured", "price"), ("createdAt",), ("price",), ("artistId",),
+    ],
+    "blog_posts": [("published", "createdAt"), ("createdAt",)],
+    "magazines": [("createdAt",)],
+}
+_SQL_OPERATORS = {"==": "=", "!=": "!=", "<": "<", "<=": "<=", ">": ">", ">=": ">="}
+
+
+def _column(value: Any) -> Any:
+    """Convert a Firestore value into the form stored in an indexed column.
+
+    Datetimes become fixed-width UTC strings so they sort as text; other
+    types SQLite can't compare are left out of the index.
+    """
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.strftime("%Y-%m-%dT%H:%M:%S.%f")
+    if isinstance(value, (bool, int, float, str)):
+        return value
+    return None
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    return str(value)
+
+
+def _json_object(value: dict) -> Any:
+    if len(value) == 1 and "$dt" in value:
+        return datetime.fromisoformat(value["$dt"])
+    return value
+
+
+def _dumps(data: dict) -> str:
+    return json.dumps(data, default=_json_default, separators=(",", ":"))
+
+
+def _loads(data: str) -> dict:
+    return json.loads(data, object_hook=_json_object)
+
+
+class CatalogReplica:
+    """Local SQLite copy of the catalog collections for the read path.
+
+    A snapshot listener per collection writes every change into an indexed
+    table, and marks the collection as synced in the same SQLite
+    transaction. On startup a collection synced before is served from the
+    file straight away while the listener's initial snapshot, which reads
+    the whole collection again, resyncs it; rows whose update time hasn't
+    changed are left alone and rows deleted in Firestore meanwhile are
+    dropped. A collection never synced is served from Firestore until its
+    first sync completes.
+
+    The methods mirror FirebaseService's read methods, so a route can use
+    either. SQLite calls run in worker threads to keep the event loop free.
+    Results lag Firestore by the listener's delivery delay, usually well
+    under a second.
+    """
+
+    def __init__(self, service, path: str):
+        self.service = service
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._serving: Set[str] = set()
+        self._synced: Dict[str, threading.Event] = {
+            collection: threading.Event() for collection in REPLICATED
+        }
+        self._watches: Dict[str, Any] = {}
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread; WAL lets readers run alongside the writer"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _create_schema(self) -> None:
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sync_state (collection TEXT PRIMARY KEY, synced_at TEXT)"
+        )
+        for collection, fields in REPLICATED.items():
+            columns = ", ".join(f'"{field}"' for field in fields)
+            conn.execute(
+                f'CREATE TABLE IF NOT EXISTS "{collection}" '
+                f"(id TEXT PRIMARY KEY, data TEXT NOT NULL, update_time TEXT, {columns})"
+            )
+            for index in INDEXES[collection]:
+                name = f"{collection}_{'_'.join(index)}"
+                indexed = ", ".join(f'"{field}"' for field in index)
+                conn.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{collection}" ({indexed}, id)')
+
+    def _upsert(self, conn: sqlite3.Connection, collection: str, doc) -> None:
+        data = doc.to_dict()
+        fields = REPLICATED[collection]
+        columns = ", ".join(f'"{field}"' for field in fields)
+        conn.execute(
+            f'INSERT OR REPLACE INTO "{collection}" (id, data, update_time, {columns}) '
+            f"VALUES (?, ?, ?{', ?' * len(fields)})",
+            [doc.id, _dumps(data), str(doc.update_time)] + [_column(data.get(field)) for field in fields],
+        )
+
+    def _on_snapshot(self, collection: str, docs, changes, read_time) -> None:
+        with self._write_lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if not self._synced[collection].is_set():
+                    # Initial snapshot: reconcile the whole table against it
+                    stored = dict(conn.execute(f'SELECT id, update_time FROM "{collection}"'))
+                    for doc in docs:
+                        if stored.pop(doc.id, None) != str(doc.update_time):
+                            self._upsert(conn, collection, doc)
+                    conn.executemany(
+                        f'DELETE FROM "{collection}" WHERE id = ?', [(doc_id,) for doc_id in stored]
+                    )
+                else:
+                    for change in changes:
+                        if change.type.name == "REMOVED":
+                            conn.execute(f'DELETE FROM "{collection}" WHERE id = ?', (change.document.id,))
+                        else:
+                            self._upsert(conn, collection, change.document)
+                conn.execute(
+                    "INSERT OR REPLACE INTO sync_state (collection, synced_at) VALUES (?, ?)",
+                    (collection, datetime.now().isoformat()),
+                )
+                conn.execute("COMMIT")
+            except Exception as e:
+                conn.execute("ROLLBACK")
+                print(f"Error replicating {collection}: {e}")
+                return
+        if not self._synced[collection].is_set():
+            self._synced[collection].set()
+            self._serving.add(collection)
+
+    def start(self, timeout: float = 30) -> bool:
+        """Open the replica, attach the listeners and wait for any collection
+        without a checkpoint to finish its first sync"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._create_schema()
+        checkpointed = {row[0] for row in self._connection().execute("SELECT collection FROM sync_state")}
+        self._serving.update(checkpointed & set(REPLICATED))
+        for collection in REPLICATED:
+            if collection not in self._watches:
+                self._watches[collection] = self.service.watch_collection(
+                    collection,
+                    lambda docs, changes, read_time, collection=collection:
+                        self._on_snapshot(collection, docs, changes, read_time)
+                )
+        return all(
+            self._synced[collection].wait(timeout)
+            for collection in REPLICATED if collection not in checkpointed
+        )
+
+    def stop(self) -> None:
+        """Stop following writes; reads fall back to Firestore"""
+        self._serving.clear()
+        for watch in self._watches.values():
+            watch.unsubscribe()
+        self._watches.clear()
+        for event in self._synced.values():
+            event.clear()
+
+    def serves(self, collection: str) -> bool:
+        """Whether reads of a collection should be answered from the replica"""
+        return collection in self._serving
+
+    def _where(
+        self, collection: str, filters: Optional[List[Tuple[str, str, Any]]]
+    ) -> Tuple[List[str], List[Any]]:
+        clauses, params = [], []
+        for field, operator, value in filters or []:
+            if field not in REPLICATED[collection]:
+                raise ValueError(f"{field} is not replicated for {collection}")
+            if operator in ("in", "not-in"):
+                placeholders = ", ".join("?" * len(value))
+                clauses.append(f'"{field}" {"IN" if operator == "in" else "NOT IN"} ({placeholders})')
+                params.extend(_column(item) for item in value)
+            elif operator in _SQL_OPERATORS:
+                clauses.append(f'"{field}" {_SQL_OPERATORS[operator]} ?')
+                params.append(_column(value))
+            else:
+                raise ValueError(f"Unsupported operator: {operator}")
+        return clauses, params
+
+    @staticmethod
+    def _project(doc_id: str, data: dict, fields: Optional[List[str]], order_fields: List[str]) -> dict:
+        if fields:
+            data = {field: data[field] for field in dict.fromkeys([*fields, *order_fields]) if field in data}
+        return {**data, "id": doc_id}
+
+    def _fetch(self, sql: str, params: List[Any]) -> List[tuple]:
+        return self._connection().execute(sql, params).fetchall()
+
+    async def _query(self, sql: str, params: List[Any]) -> List[tuple]:
+        """Run a read on a worker thread, with that thread's connection"""
+        return await asyncio.to_thread(self._fetch, sql, params)
+
+    async def get_document(self, collection: str, doc_id: str) -> Optional[dict]:
+        """Get a single document by ID"""
+        rows = await self._query(f'SELECT data FROM "{collection}" WHERE id = ?', [doc_id])
+        return {**_loads(rows[0][0]), "id": doc_id} if rows else None
+
+    async def get_documents(self, collection: str, doc_ids: List[str]) -> Tuple[List[dict], List[str]]:
+        """Get many documents by ID; returns those found in order and the missing IDs"""
+        unique_ids = list(dict.fromkeys(doc_ids))
+        found = {}
+        if unique_ids:
+            rows = await self._query(
+                f'SELECT id, data FROM "{collection}" WHERE id IN ({", ".join("?" * len(unique_ids))})',
+                unique_ids,
+            )
+            found = {doc_id: {**_loads(data), "id": doc_id} for doc_id, data in rows}
+        documents = [found[doc_id] for doc_id in unique_ids if doc_id in found]
+        missing = [doc_id for doc_id in unique_ids if doc_id not in found]
+        return documents, missing
+
+    async def query_page(
+        self,
+        collection: str,
+        filters: Optional[List[Tuple[str, str, Any]]] = None,
+        order_by: Optional[List[Tuple[str, str]]] = None,
+        limit: int = 20,
+        page_token: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+        offset: int = 0,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """Run a filtered, ordered query and return one page plus the next page token.
+
+        Ordering, cursors and page tokens match FirebaseService.query_page,
+        so a client can page through either one with the same token.
+        """
+        clauses, params = self._where(collection, filters)
+        order_fields = [field for field, _ in order_by or []]
+        direction = "asc"
+        for field, direction in order_by or []:
+            if field not in REPLICATED[collection]:
+                raise ValueError(f"{field} is not replicated for {collection}")
+            # Firestore leaves out documents that lack an ordered field
+            clauses.append(f'"{field}" IS NOT NULL')
+        directions = [direction for _, direction in order_by or []] + [direction]
+        columns = [f'"{field}"' for field in order_fields] + ["id"]
+
+        if page_token:
+            values = _decode_page_token(page_token)
+            if len(values) != len(columns):
+                raise ValueError("Invalid page token")
+            values = [_column(value) for value in values]
+            # Rows strictly after the cursor in the query's ordering
+            after = []
+            for i, column in enumerate(columns):
+                equal = [f"{columns[j]} = ?" for j in range(i)]
+                after.append("(" + " AND ".join(equal + [f"{column} {'>' if directions[i] == 'asc' else '<'} ?"]) + ")")
+                params.extend(values[:i] + [values[i]])
+            clauses.append("(" + " OR ".join(after) + ")")
+
+        sql = f'SELECT id, data FROM "{collection}"'
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY " + ", ".join(f"{column} {directions[i].upper()}" for i, column in enumerate(columns))
+        sql += " LIMIT ? OFFSET ?"
+        rows = await self._query(sql, params + [limit, offset])
+
+        items, last = [], None
+        for doc_id, data in rows:
+            last = _loads(data)
+            items.append(self._project(doc_id, last, fields, order_fields))
+        next_page_token = None
+        if last is not None and len(items) == limit:
+            next_page_token = _encode_page_token([last.get(field) for field in order_fields] + [rows[-1][0]])
+        return items, next_page_token
+
+    async def get_collection_page(
+        self,
+        collection: str,
+        limit: int = 20,
+        page_token: Optional[str] = None,
+        order_by: Optional[List[Tuple[str, str]]] = None,
+        fields: Optional[List[str]] = None,
+        offset: int = 0,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """Get one page of a collection and the token for the next page"""
+        return await self.query_page(
+            collection, order_by=order_by, limit=limit, page_token=page_token, fields=fields, offset=offset
+        )
+
+    async def count(self, collection: str, filters: Optional[List[Tuple[str, str, Any]]] = None) -> int:
+        """Count matching documents"""
+        clauses, params = self._where(collection, filters)
+        sql = f'SELECT COUNT(*) FROM "{collection}"'
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        return (await self._query(sql, params))[0][0]
+
+
+catalog_replica = CatalogReplica(firebase_service, settings.catalog_replica_path)
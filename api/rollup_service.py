@@ -0,0 +1,200 @@
+from google.cloud import firestore
+from firebase_service import firebase_service
+from config import settings
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+import asyncio
+import random
+
+# One document per scope and day, rollups/{scope}_{YYYY-MM-DD}_{shard}, holding
+# the day's totals under "day" and hourly totals under "hours.HH". Scope is
+# "global" or "artist-{uid}". Only the global scope is sharded; an artist's
+# day document sees that artist's orders alone.
+ROLLUPS_COLLECTION = "rollups"
+GLOBAL_SCOPE = "global"
+# Order events counted in the rollups, and the metrics each one adds to
+EVENT_METRICS = {
+    "created": ("ordersCreated", "revenueCreated"),
+    "paid": ("ordersPaid", "revenuePaid"),
+    "refunded": ("ordersRefunded", "revenueRefunded"),
+}
+METRICS = [metric for metrics in EVENT_METRICS.values() for metric in metrics]
+RESOLUTIONS = ("hour", "day", "week", "month")
+# Longest range each resolution may span, in days
+MAX_RANGE_DAYS = {"hour": 31, "day": 731, "week": 731, "month": 731}
+# Firestore caps a batch at 500 writes
+BATCH_LIMIT = 500
+
+
+def artist_scope(artist_id: str) -> str:
+    return f"artist-{artist_id}"
+
+
+def _bucket(moment: datetime, resolution: str) -> str:
+    if resolution == "hour":
+        return moment.strftime("%Y-%m-%dT%H:00")
+    if resolution == "day":
+        return moment.strftime("%Y-%m-%d")
+    if resolution == "week":
+        return (moment - timedelta(days=moment.weekday())).strftime("%Y-%m-%d")
+    return moment.strftime("%Y-%m")
+
+
+def _empty() -> Dict[str, float]:
+    return {metric: 0 for metric in METRICS}
+
+
+class RollupService:
+    """Hourly and daily order and revenue totals for time-series charts.
+
+    Rollups are staged in the same batch or transaction as the order write
+    they count, through StatsService, so they stay in step with the orders.
+    A year of daily points costs 365 document reads per shard.
+    """
+
+    def __init__(self, service, shards: int):
+        self.db = service.db
+        self.shards = shards
+
+    def _doc_ref(self, scope: str, day: str, shard: int):
+        return self.db.collection(ROLLUPS_COLLECTION).document(f"{scope}_{day}_{shard}")
+
+    @staticmethod
+    def _amounts(order: dict) -> Dict[str, float]:
+        """The order total per scope: the whole order globally, and each
+        artist's share of it"""
+        amounts = {GLOBAL_SCOPE: order.get("total", 0)}
+        for artist_id, amount in (order.get("artistTotals") or {}).items():
+            amounts[artist_scope(artist_id)] = amount
+        return amounts
+
+    def stage(self, writer, order: dict, event: str, at: Optional[datetime] = None) -> None:
+        """Stage an order event's increments in a batch or transaction"""
+        at = at or datetime.now()
+        count_field, revenue_field = EVENT_METRICS[event]
+        day, hour = at.strftime("%Y-%m-%d"), at.strftime("%H")
+        for scope, amount in self._amounts(order).items():
+            shard = random.randrange(self.shards) if scope == GLOBAL_SCOPE else 0
+            increments = {count_field: firestore.Increment(1), revenue_field: firestore.Increment(amount)}
+            writer.set(self._doc_ref(scope, day, shard), {
+                "scope": scope,
+                "date": day,
+                "day": increments,
+                "hours": {hour: increments},
+            }, merge=True)
+
+    async def get_series(
+        self, scope: str, start: datetime, end: datetime, resolution: str = "day"
+    ) -> List[dict]:
+        """Totals per bucket between start and end, downsampled from the
+        hourly and daily rollups. Empty buckets are included as zeros."""
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"resolution must be one of: {', '.join(RESOLUTIONS)}")
+        if end <= start:
+            raise ValueError("end must be after start")
+        if (end - start).days > MAX_RANGE_DAYS[resolution]:
+            raise ValueError(f"{resolution} series can span at most {MAX_RANGE_DAYS[resolution]} days")
+
+        series: Dict[str, Dict[str, float]] = {}
+        step = timedelta(hours=1) if resolution == "hour" else timedelta(days=1)
+        moment = start.replace(minute=0, second=0, microsecond=0)
+        if resolution != "hour":
+            moment = moment.replace(hour=0)
+        while moment < end:
+            series.setdefault(_bucket(moment, resolution), _empty())
+            moment += step
+
+        days = []
+        day = start.date()
+        while day <= end.date():
+            days.append(day)
+            day += timedelta(days=1)
+        shards = self.shards if scope == GLOBAL_SCOPE else 1
+        refs = [self._doc_ref(scope, day.isoformat(), shard) for day in days for shard in range(shards)]
+
+        async for doc in self.db.get_all(refs):
+            if not doc.exists:
+                continue
+            rollup = doc.to_dict()
+            day_start = datetime.combine(date.fromisoformat(rollup["date"]), datetime.min.time())
+            if resolution == "hour":
+                points = [
+                    (day_start + timedelta(hours=int(hour)), totals)
+                    for hour, totals in (rollup.get("hours") or {}).items()
+                ]
+            else:
+                points = [(day_start, rollup.get("day") or {})]
+            for moment, totals in points:
+                bucket = series.get(_bucket(moment, resolution))
+                if bucket is None:
+                    continue
+                for metric in METRICS:
+                    bucket[metric] += totals.get(metric, 0)
+
+        return [
+            {
+                "bucket": bucket,
+                **{metric: round(value, 2) for metric, value in totals.items()},
+                "netRevenue": round(totals["revenuePaid"] - totals["revenueRefunded"], 2),
+            }
+            for bucket, totals in sorted(series.items())
+        ]
+
+    async def rebuild(self) -> int:
+        """Recompute every rollup from the orders collection.
+
+        A one-off full scan for seeding rollups on an existing database.
+        Orders that were paid or refunded are bucketed by their last update,
+        the closest record of when that happened. Returns the number of
+        rollup documents written.
+        """
+        rollups: Dict[str, dict] = {}
+
+        def add(order: dict, event: str, at: datetime) -> None:
+            at = at.replace(tzinfo=None)
+            count_field, revenue_field = EVENT_METRICS[event]
+            day, hour = at.strftime("%Y-%m-%d"), at.strftime("%H")
+            for scope, amount in self._amounts(order).items():
+                rollup = rollups.setdefault(
+                    self._doc_ref(scope, day, 0).id,
+                    {"scope": scope, "date": day, "day": _empty(), "hours": {}}
+                )
+                hours = rollup["hours"].setdefault(hour, _empty())
+                for totals in (rollup["day"], hours):
+                    totals[count_field] += 1
+                    totals[revenue_field] += amount
+
+        async for doc in self.db.collection("orders").stream():
+            order = doc.to_dict()
+            created = order.get("createdAt")
+            if created is None:
+                continue
+            add(order, "created", created)
+            updated = order.get("updatedAt") or created
+            if order.get("paymentStatus") in ("completed", "refunded"):
+                add(order, "paid", updated)
+            if order.get("paymentStatus") == "refunded":
+                add(order, "refunded", updated)
+
+        stale = [doc.reference async for doc in self.db.collection(ROLLUPS_COLLECTION).stream()]
+        for start in range(0, len(stale), BATCH_LIMIT):
+            batch = self.db.batch()
+            for ref in stale[start:start + BATCH_LIMIT]:
+                batch.delete(ref)
+            await batch.commit()
+
+        docs = list(rollups.items())
+        for start in range(0, len(docs), BATCH_LIMIT):
+            batch = self.db.batch()
+            for doc_id, rollup in docs[start:start + BATCH_LIMIT]:
+                batch.set(self.db.collection(ROLLUPS_COLLECTION).document(doc_id), rollup)
+            await batch.commit()
+        return len(docs)
+
+
+rollup_service = RollupService(firebase_service, settings.rollup_shards)
+
+
+if __name__ == "__main__":
+    # Seed or repair the rollups: python rollup_service.py
+    print(f"Wrote {asyncio.run(rollup_service.rebuild())} rollup documents")
@@ -0,0 +1,321 @@
+from firebase_service import firebase_service
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import bisect
+import heapq
+import math
+import re
+import threading
+import unicodedata
+
+_WORD_RE = re.compile(r"[^\w]+")
+# Snapshots with more changes than this rebuild the sorted term list in one
+# pass instead of inserting term by term
+BULK_LOAD_THRESHOLD = 200
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SnapshotIndex:
+    """Base for in-memory indexes loaded and kept current by a snapshot listener"""
+
+    collection = ""
+
+    def __init__(self, service):
+        self.service = service
+        self._lock = threading.RLock()
+        self._ready = threading.Event()
+        self._watch = None
+
+    def _apply(self, changes) -> None:
+        raise NotImplementedError
+
+    def _on_snapshot(self, docs, changes, read_time) -> None:
+        with self._lock:
+            self._apply(changes)
+        self._ready.set()
+
+    def start(self, timeout: float = 30) -> bool:
+        """Attach the listener and wait for the initial snapshot to load"""
+        if self._watch is None:
+            self._watch = self.service.watch_collection(self.collection, self._on_snapshot)
+        return self._ready.wait(timeout)
+
+    def stop(self) -> None:
+        """Stop following writes"""
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+
+class UserSearchIndex(SnapshotIndex):
+    """In-memory search index over user email and name.
+
+    Substring queries of three or more characters are answered from a
+    trigram index, shorter ones by prefix lookups in a sorted term list, so
+    search-as-you-type never scans the users collection. The index is loaded
+    by a snapshot listener on ``users`` and follows every later write.
+    """
+
+    collection = "users"
+
+    def __init__(self, service):
+        super().__init__(service)
+        self._users: Dict[str, dict] = {}
+        self._trigrams: Dict[str, Set[str]] = defaultdict(set)
+        self._terms: List[Tuple[str, str]] = []
+        self._user_keys: Dict[str, Tuple[Set[str], Set[str]]] = {}
+
+    @staticmethod
+    def _fields(user: dict) -> Tuple[str, str]:
+        return (user.get("email") or "").lower(), (user.get("name") or "").lower()
+
+    def _keys(self, user: dict) -> Tuple[Set[str], Set[str]]:
+        email, name = self._fields(user)
+        terms = {email, name, *_WORD_RE.split(email), *_WORD_RE.split(name)}
+        terms.discard("")
+        return terms, _trigrams(email) | _trigrams(name)
+
+    def _remove(self, uid: str, sorted_terms: bool = True) -> None:
+        terms, grams = self._user_keys.pop(uid, (set(), set()))
+        for gram in grams:
+            postings = self._trigrams.get(gram)
+            if postings is not None:
+                postings.discard(uid)
+                if not postings:
+                    del self._trigrams[gram]
+        if sorted_terms:
+            for term in terms:
+                i = bisect.bisect_left(self._terms, (term, uid))
+                if i < len(self._terms) and self._terms[i] == (term, uid):
+                    del self._terms[i]
+        self._users.pop(uid, None)
+
+    def _upsert(self, uid: str, fields: dict, sorted_terms: bool = True) -> None:
+        user = {**self._users.get(uid, {}), **fields, "id": uid}
+        self._remove(uid, sorted_terms)
+        terms, grams = self._keys(user)
+        for gram in grams:
+            self._trigrams[gram].add(uid)
+        if sorted_terms:
+            for term in terms:
+                bisect.insort(self._terms, (term, uid))
+        self._user_keys[uid] = (terms, grams)
+        self._users[uid] = user
+
+    def upsert(self, uid: str, fields: dict) -> None:
+        """Add a user or merge changed fields into their entry"""
+        with self._lock:
+            self._upsert(uid, fields)
+
+    def remove(self, uid: str) -> None:
+        """Drop a user from the index"""
+        with self._lock:
+            self._remove(uid)
+
+    def _candidates(self, query: str) -> Iterable[str]:
+        if not query:
+            return list(self._users)
+        if len(query) >= 3:
+            postings = sorted((self._trigrams.get(g, set()) for g in _trigrams(query)), key=len)
+            return set.intersection(*postings) if postings else set()
+        start = bisect.bisect_left(self._terms, (query, ""))
+        matches = set()
+        for term, uid in self._terms[start:]:
+            if not term.startswith(query):
+                break
+            matches.add(uid)
+        return matches
+
+    @classmethod
+    def _score(cls, user: dict, query: str) -> int:
+        if not query:
+            return 1
+        email, name = cls._fields(user)
+        if query in (email, name):
+            return 100
+        if email.startswith(query) or name.startswith(query):
+            return 60
+        words = [*_WORD_RE.split(email), *_WORD_RE.split(name)]
+        if any(word.startswith(query) for word in words):
+            return 40
+        if query in email or query in name:
+            return 10
+        return 0
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> Tuple[List[dict], int]:
+        """Rank users matching a query and return one page plus the total match count"""
+        query = query.strip().lower()
+        with self._lock:
+            scored = []
+            for uid in self._candidates(query):
+                user = self._users[uid]
+                score = self._score(user, query)
+                if score:
+                    scored.append((-score, *self._fields(user)[::-1], user))
+        scored.sort(key=lambda entry: entry[:3])
+        return [entry[3] for entry in scored[offset:offset + limit]], len(scored)
+
+    def _apply(self, changes) -> None:
+        bulk = len(changes) > BULK_LOAD_THRESHOLD
+        for change in changes:
+            doc = change.document
+            if change.type.name == "REMOVED":
+                self._remove(doc.id, sorted_terms=not bulk)
+            else:
+                self._upsert(doc.id, doc.to_dict(), sorted_terms=not bulk)
+        if bulk:
+            self._terms = sorted(
+                (term, uid) for uid, (terms, _) in self._user_keys.items() for term in terms
+            )
+
+
+# Spelling variants common in romanized Indian words (Madhubanee/Madhubani,
+# Pattachitra/Patachitra, Warli/Varli, Kalamkaari/Kalamkari), folded to one
+# form at index and query time. Order matters: longer patterns first.
+_TRANSLITERATION_FOLDS = [
+    ("aa", "a"), ("ee", "i"), ("ii", "i"), ("oo", "u"), ("uu", "u"),
+    ("sh", "s"), ("ph", "f"), ("w", "v"),
+    ("kh", "k"), ("gh", "g"), ("chh", "ch"), ("jh", "j"),
+    ("th", "t"), ("dh", "d"), ("bh", "b"),
+]
+_REPEATED_RE = re.compile(r"([a-z])\1+")
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is",
+    "it", "of", "on", "or", "that", "the", "this", "to", "with",
+}
+
+
+def _fold_latin(token: str) -> str:
+    for pattern, replacement in _TRANSLITERATION_FOLDS:
+        token = token.replace(pattern, replacement)
+    return _REPEATED_RE.sub(r"\1", token)
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into search terms.
+
+    Diacritics are stripped from Latin letters (IAST "Madhubanī" matches
+    "Madhubani") and romanized spellings are folded together, while
+    Devanagari and other Indic scripts keep their vowel signs so words are
+    not split apart at each matra.
+    """
+    chars = []
+    for char in unicodedata.normalize("NFKD", (text or "").lower()):
+        category = unicodedata.category(char)
+        if category[0] == "M":
+            # Drop accents on Latin letters, keep Indic vowel signs
+            if chars and chars[-1].isascii():
+                continue
+            chars.append(char)
+        elif category[0] in "LN":
+            chars.append(char)
+        else:
+            chars.append(" ")
+    tokens = []
+    for token in "".join(chars).split():
+        if token in _STOPWORDS:
+            continue
+        tokens.append(_fold_latin(token) if token.isascii() else token)
+    return tokens
+
+
+class ProductSearchIndex(SnapshotIndex):
+    """In-memory inverted index over product text with BM25 ranking.
+
+    Matches in the title count for more than matches in the longer
+    description, art story and cultural context fields.
+    """
+
+    collection = "products"
+    field_weights = {"title": 3.0, "description": 1.0, "artStory": 1.0, "culturalContext": 1.0}
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self, service):
+        super().__init__(service)
+        self._products: Dict[str, dict] = {}
+        self._postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self._doc_terms: Dict[str, Set[str]] = {}
+        self._doc_lengths: Dict[str, float] = {}
+        self._total_length = 0.0
+
+    def _remove(self, product_id: str) -> None:
+        for term in self._doc_terms.pop(product_id, ()):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(product_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._doc_lengths.pop(product_id, 0.0)
+        self._products.pop(product_id, None)
+
+    def _upsert(self, product_id: str, product: dict) -> None:
+        self._remove(product_id)
+        frequencies: Dict[str, float] = defaultdict(float)
+        length = 0.0
+        for field, weight in self.field_weights.items():
+            for term in tokenize(product.get(field) or ""):
+                frequencies[term] += weight
+                length += weight
+        for term, frequency in frequencies.items():
+            self._postings[term][product_id] = frequency
+        self._doc_terms[product_id] = set(frequencies)
+        self._doc_lengths[product_id] = length
+        self._total_length += length
+        self._products[product_id] = {**product, "id": product_id}
+
+    def upsert(self, product_id: str, product: dict) -> None:
+        """Index a new or changed product"""
+        with self._lock:
+            self._upsert(product_id, product)
+
+    def remove(self, product_id: str) -> None:
+        """Drop a product from the index"""
+        with self._lock:
+            self._remove(product_id)
+
+    def _apply(self, changes) -> None:
+        for change in changes:
+            doc = change.document
+            if change.type.name == "REMOVED":
+                self._remove(doc.id)
+            else:
+                self._upsert(doc.id, doc.to_dict())
+
+    def search(
+        self, query: str, limit: int = 20, offset: int = 0, category: Optional[str] = None
+    ) -> Tuple[List[dict], int]:
+        """Rank products against a query and return one page plus the total match count"""
+        terms = set(tokenize(query))
+        with self._lock:
+            count = len(self._products)
+            if not terms or not count:
+                return [], 0
+            average_length = self._total_length / count or 1.0
+            scores: Dict[str, float] = defaultdict(float)
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for product_id, frequency in postings.items():
+                    norm = 1 - self.b + self.b * self._doc_lengths[product_id] / average_length
+                    scores[product_id] += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * norm)
+            if category:
+                scores = {
+                    pid: score for pid, score in scores.items()
+                    if self._products[pid].get("category") == category
+                }
+            ranked = heapq.nlargest(offset + limit, scores.items(), key=lambda item: item[1])
+            items = [
+                {**self._products[pid], "score": round(score, 4)}
+                for pid, score in ranked[offset:]
+            ]
+        return items, len(scores)
+
+
+user_search_index = UserSearchIndex(firebase_service)
+product_search_index = ProductSearchIndex(firebase_service)
@@ -0,0 +1,216 @@
+from google.cloud import firestore
+from fastapi import HTTPException, status
+from firebase_service import firebase_service
+from rollup_service import rollup_service
+from config import settings
+from datetime import datetime
+from typing import Any, Dict, Optional
+import asyncio
+import random
+
+# Counter shards live under stats/global/shards/{0..n-1}. Writers increment a
+# random shard so concurrent orders don't contend on one document; readers sum
+# every shard.
+STATS_SHARDS_PATH = "stats/global/shards"
+# One marker document per user who has placed an order, for the distinct count
+ORDER_USERS_COLLECTION = "stats_order_users"
+# Firestore caps a batch at 500 writes
+BATCH_LIMIT = 500
+
+
+def _role_field(role: str) -> str:
+    return f"users{(role or 'user').capitalize()}"
+
+
+def _payment_fields(payment_status: str):
+    suffix = (payment_status or "pending").capitalize()
+    return f"orders{suffix}", f"revenue{suffix}"
+
+
+class StatsService:
+    """Sharded dashboard counters, updated in the same batch or transaction
+    as the write they describe so they never drift from the data."""
+
+    def __init__(self, service, shards: int):
+        self.db = service.db
+        self.shards = shards
+
+    def _shard_ref(self, shard: Optional[int] = None):
+        if shard is None:
+            shard = random.randrange(self.shards)
+        return self.db.collection(STATS_SHARDS_PATH).document(str(shard))
+
+    def stage(self, writer, deltas: Dict[str, float]) -> None:
+        """Stage counter increments on a random shard in a batch or transaction"""
+        deltas = {k: v for k, v in deltas.items() if v}
+        if deltas:
+            writer.set(
+                self._shard_ref(),
+                {field: firestore.Increment(value) for field, value in deltas.items()},
+                merge=True
+            )
+
+    @staticmethod
+    def order_deltas(order_data: dict, sign: int = 1) -> Dict[str, float]:
+        """Counter changes for an order entering (sign=1) or leaving (sign=-1) the stats"""
+        count_field, revenue_field = _payment_fields(order_data.get("paymentStatus"))
+        return {
+            "ordersTotal": sign,
+            count_field: sign,
+            revenue_field: sign * order_data.get("total", 0),
+        }
+
+    async def create_user(self, uid: str, user_data: dict) -> str:
+        """Create a user document and count it"""
+        batch = self.db.batch()
+        batch.set(self.db.collection("users").document(uid), user_data)
+        self.stage(batch, {"usersTotal": 1, _role_field(user_data.get("role")): 1})
+        await batch.commit()
+        return uid
+
+    async def set_user_role(self, uid: str, old_role: str, new_role: str) -> None:
+        """Update a user's role and move them between role counters"""
+        batch = self.db.batch()
+        batch.update(
+            self.db.collection("users").document(uid),
+            {"role": new_role, "updatedAt": datetime.now()}
+        )
+        if old_role != new_role:
+            self.stage(batch, {_role_field(old_role): -1, _role_field(new_role): 1})
+        await batch.commit()
+
+    async def create_product(self, product_data: dict) -> str:
+        """Create a product document and count it"""
+        doc_ref = self.db.collection("products").document()
+        batch = self.db.batch()
+        batch.set(doc_ref, product_data)
+        self.stage(batch, {"productsTotal": 1})
+        await batch.commit()
+        return doc_ref.id
+
+    async def is_first_order(self, transaction, user_id: str) -> bool:
+        """Read, inside a transaction, whether a user has never ordered before.
+
+        Firestore transactions must do all reads before any writes, so call
+        this before staging anything.
+        """
+        marker = await self.db.collection(ORDER_USERS_COLLECTION).document(user_id).get(
+            transaction=transaction
+        )
+        return not marker.exists
+
+    def stage_order(self, transaction, order_ref, order_data: dict, first_order: bool) -> None:
+        """Stage an order write and its counters inside a running transaction"""
+        deltas = self.order_deltas(order_data)
+        if first_order:
+            marker_ref = self.db.collection(ORDER_USERS_COLLECTION).document(order_data["userId"])
+            transaction.set(marker_ref, {"firstOrderId": order_ref.id})
+            deltas["orderingUsers"] = 1
+        transaction.set(order_ref, order_data)
+        self.stage(transaction, deltas)
+        rollup_service.stage(transaction, order_data, "created", order_data.get("createdAt"))
+
+    def stage_payment_status(
+        self, transaction, order_ref, order: dict, payment_status: str,
+        updates: Optional[Dict[str, Any]] = None
+    ) -> dict:
+        """Stage a payment status change on an order already read in the
+        transaction, moving it between payment counters. Returns the order
+        as it will be after the write."""
+        changes = {**(updates or {}), "paymentStatus": payment_status}
+        transaction.update(order_ref, changes)
+        if order.get("paymentStatus") != payment_status:
+            deltas = self.order_deltas(order, sign=-1)
+            for field, value in self.order_deltas({**order, **changes}).items():
+                deltas[field] = deltas.get(field, 0) + value
+            self.stage(transaction, deltas)
+            if payment_status == "completed":
+                rollup_service.stage(transaction, {**order, **changes}, "paid")
+            elif payment_status == "refunded":
+                rollup_service.stage(transaction, {**order, **changes}, "refunded")
+        return {**order, **changes, "id": order_ref.id}
+
+    async def set_order_payment_status(
+        self, order_id: str, payment_status: str, updates: Optional[Dict[str, Any]] = None,
+        expected: Optional[Dict[str, Any]] = None
+    ) -> Optional[dict]:
+        """Change an order's payment status and move it between payment counters.
+
+        Returns the updated order, or None if it doesn't exist. Repeating a
+        transition the order already made leaves the counters untouched.
+        Raises 403 without writing anything if any field in ``expected``
+        doesn't match the order.
+        """
+        order_ref = self.db.collection("orders").document(order_id)
+
+        @firestore.async_transactional
+        async def _transition(transaction):
+            snapshot = await order_ref.get(transaction=transaction)
+            if not snapshot.exists:
+                return None
+            order = snapshot.to_dict()
+            if any(order.get(field) != value for field, value in (expected or {}).items()):
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail="Payment does not belong to this order"
+                )
+            return self.stage_payment_status(
+                transaction, order_ref, order, payment_status, updates
+            )
+
+        return await _transition(self.db.transaction())
+
+    async def get_totals(self) -> Dict[str, float]:
+        """Sum every counter across all shards"""
+        totals: Dict[str, float] = {}
+        async for shard in self.db.collection(STATS_SHARDS_PATH).stream():
+            for field, value in (shard.to_dict() or {}).items():
+                totals[field] = totals.get(field, 0) + value
+        return totals
+
+    async def rebuild(self) -> Dict[str, float]:
+        """Recount everything from the source collections.
+
+        A one-off full scan for seeding the counters on an existing database
+        or repairing them; the totals go to shard 0 and the other shards are
+        cleared.
+        """
+        totals: Dict[str, float] = {"usersTotal": 0, "ordersTotal": 0, "productsTotal": 0}
+
+        async for doc in self.db.collection("users").stream():
+            field = _role_field(doc.to_dict().get("role"))
+            totals["usersTotal"] += 1
+            totals[field] = totals.get(field, 0) + 1
+
+        async for doc in self.db.collection("products").stream():
+            totals["productsTotal"] += 1
+
+        ordering_users = {}
+        async for doc in self.db.collection("orders").stream():
+            order = doc.to_dict()
+            for field, value in self.order_deltas(order).items():
+                totals[field] = totals.get(field, 0) + value
+            if order.get("userId"):
+                ordering_users.setdefault(order["userId"], doc.id)
+        totals["orderingUsers"] = len(ordering_users)
+
+        writes = [(self._shard_ref(0), totals)]
+        writes += [(self._shard_ref(shard), {}) for shard in range(1, self.shards)]
+        writes += [
+            (self.db.collection(ORDER_USERS_COLLECTION).document(uid), {"firstOrderId": order_id})
+            for uid, order_id in ordering_users.items()
+        ]
+        for start in range(0, len(writes), BATCH_LIMIT):
+            batch = self.db.batch()
+            for ref, data in writes[start:start + BATCH_LIMIT]:
+                batch.set(ref, data)
+            await batch.commit()
+        return totals
+
+
+stats_service = StatsService(firebase_service, settings.stats_shards)
+
+
+if __name__ == "__main__":
+    # Seed or repair the counters: python stats_service.py
+    print(asyncio.run(stats_service.rebuild()))
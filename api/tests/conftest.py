@@ -0,0 +1,28 @@
+"""Tests run against the in-memory Firestore backend, so they need neither
+credentials nor the emulators. Settings are read at import time, so the
+environment is set up before any app module is imported."""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_DIR)
+
+os.environ["FIRESTORE_BACKEND"] = "memory"
+os.environ["FIRESTORE_LATENCY"] = "0"
+os.environ["CATALOG_REPLICA"] = "false"
+os.environ["ANALYTICS_DIR"] = tempfile.mkdtemp(prefix="gia-analytics-")
+os.environ.pop("FIREBASE_AUTH_EMULATOR_HOST", None)
+os.environ.pop("FIRESTORE_EMULATOR_HOST", None)
+
+
+@pytest.fixture(autouse=True)
+def db():
+    """The shared in-memory client, emptied before every test"""
+    from firebase_service import firebase_service
+
+    firebase_service.db.clear()
+    return firebase_service.db
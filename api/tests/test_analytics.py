@@ -0,0 +1,113 @@
+import asyncio
+import fcntl
+import os
+from datetime import datetime
+
+import pytest
+
+from analytics_service import AnalyticsService, LOCK_FILE
+from backfill_order_artists import backfill
+from cache_service import catalog_cache
+from firebase_service import firebase_service
+
+
+def order(items, payment_status="completed"):
+    artist_totals, artist_units = {}, {}
+    for item in items:
+        artist_totals[item["artistId"]] = artist_totals.get(item["artistId"], 0) + item["price"] * item["quantity"]
+        artist_units[item["artistId"]] = artist_units.get(item["artistId"], 0) + item["quantity"]
+    return {
+        "userId": "buyer-1", "items": items, "total": sum(artist_totals.values()),
+        "artistIds": sorted(artist_totals), "artistTotals": artist_totals, "artistUnits": artist_units,
+        "paymentStatus": payment_status, "createdAt": datetime(2026, 1, 5), "updatedAt": datetime(2026, 1, 5),
+        "shippingAddress": {"state": "Kerala"},
+    }
+
+
+def item(product_id, artist_id, category, quantity=1, price=100.0):
+    return {"productId": product_id, "artistId": artist_id, "category": category, "quantity": quantity, "price": price}
+
+
+@pytest.fixture
+def analytics(db, tmp_path):
+    async def seed():
+        await db.collection("products").document("vase").set({"artistId": "artist-1", "category": "pottery"})
+        await db.collection("orders").document("o1").set(order([item("vase", "artist-1", "pottery", 2)]))
+        await db.collection("orders").document("o2").set(
+            order([item("vase", "artist-1", "pottery"), item("shawl", "artist-2", "textile", price=50.0)])
+        )
+        await db.collection("orders").document("o3").set(order([item("vase", "artist-1", "pottery")], "pending"))
+
+    asyncio.run(seed())
+    catalog_cache.invalidate()
+    return AnalyticsService(firebase_service, catalog_cache, str(tmp_path), 300)
+
+
+def test_artist_summary_is_counted_in_firestore_until_the_snapshot_loads(analytics):
+    expected = {
+        "totalOrders": 3, "completedOrders": 2, "pendingOrders": 1,
+        "totalSales": 300.0, "totalItemsSold": 3, "averageOrderValue": 150.0,
+    }
+    assert asyncio.run(analytics.artist_summary("artist-1")) == expected
+
+    asyncio.run(analytics.refresh())
+    assert asyncio.run(analytics.artist_summary("artist-1")) == expected
+
+
+def test_recategorizing_a_product_keeps_its_sales_history(analytics, db):
+    async def recategorize():
+        await db.collection("products").document("vase").update({"artistId": "artist-9", "category": "decor"})
+        catalog_cache.invalidate()
+        await analytics.refresh()
+
+    asyncio.run(recategorize())
+
+    assert [group["key"] for group in analytics.revenue("category")] == ["pottery", "textile"]
+    assert analytics.revenue("artist", artist_id="artist-9") == []
+
+
+def test_orders_without_item_sellers_fall_back_to_the_catalog(analytics, db):
+    legacy = order([item("vase", "artist-1", "pottery")])
+    for line in legacy["items"]:
+        del line["artistId"], line["category"]
+    asyncio.run(db.collection("orders").document("o4").set(legacy))
+
+    asyncio.run(analytics.refresh())
+
+    [pottery] = [group for group in analytics.revenue("category") if group["key"] == "pottery"]
+    assert pottery["orders"] == 3
+
+
+def test_backfill_restores_artist_revenue_on_old_orders(analytics, db):
+    legacy = order([item("vase", "artist-1", "pottery", 2)])
+    for line in legacy["items"]:
+        del line["artistId"], line["category"]
+    for field in ("artistIds", "artistTotals", "artistUnits"):
+        del legacy[field]
+    asyncio.run(db.collection("orders").document("o4").set(legacy))
+    # Half migrated by an earlier version of the backfill
+    partial = order([item("vase", "artist-1", "pottery")])
+    del partial["artistTotals"]
+    asyncio.run(db.collection("orders").document("o5").set(partial))
+
+    assert asyncio.run(backfill()) == 2
+    assert asyncio.run(backfill()) == 0
+
+    summary = asyncio.run(analytics.artist_summary("artist-1"))
+    assert summary["completedOrders"] == 4
+    assert summary["totalSales"] == 600.0
+    assert summary["totalItemsSold"] == 6
+
+
+def test_only_one_worker_saves_the_snapshot_at_a_time(analytics, tmp_path):
+    asyncio.run(analytics.refresh())
+
+    with open(tmp_path / LOCK_FILE, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        assert not analytics._save()
+    assert analytics._save()
+
+    restarted = AnalyticsService(firebase_service, catalog_cache, str(tmp_path), 300)
+    assert restarted.load()
+    assert restarted.revenue("category") == analytics.revenue("category")
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
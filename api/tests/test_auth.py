@@ -0,0 +1,121 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import jwt
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from fastapi import HTTPException
+
+from auth_service import AuthService, SigningCertCache
+from config import settings
+
+
+def signing_key():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "securetoken.system.gserviceaccount.com")])
+    now = datetime.now(timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name).public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(days=1)).not_valid_after(now + timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    return key, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+KEY_A, CERT_A = signing_key()
+KEY_B, CERT_B = signing_key()
+
+
+def token(key, kid, expires_in=3600, **claims):
+    now = int(time.time())
+    payload = {
+        "iss": f"https://securetoken.google.com/{settings.firebase_project_id}",
+        "aud": settings.firebase_project_id,
+        "sub": "user-1", "iat": now, "exp": now + expires_in, "role": "artist", **claims,
+    }
+    return jwt.encode(payload, key, algorithm="RS256", headers={"kid": kid})
+
+
+@pytest.fixture
+def google(monkeypatch):
+    """Serves the signing certificates in ``published`` and counts fetches"""
+    state = {"published": {"a": CERT_A}, "fetches": 0, "max_age": 3600}
+
+    def handler(request):
+        state["fetches"] += 1
+        return httpx.Response(
+            200, json=state["published"], headers={"cache-control": f"public, max-age={state['max_age']}"}
+        )
+
+    client = httpx.AsyncClient
+    monkeypatch.setattr(httpx, "AsyncClient", lambda **kwargs: client(transport=httpx.MockTransport(handler), **kwargs))
+    return state
+
+
+def service(min_refresh_interval=60):
+    auth = AuthService()
+    auth.certs = SigningCertCache(min_refresh_interval=min_refresh_interval)
+    return auth
+
+
+def rejected(auth, value):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(auth.verify_token(value))
+    return error.value.status_code == 401
+
+
+def test_valid_token_is_verified_once_and_cached(google):
+    auth = service()
+    value = token(KEY_A, "a")
+
+    claims = asyncio.run(auth.verify_token(value))
+    assert claims["uid"] == "user-1" and claims["role"] == "artist"
+    assert asyncio.run(auth.verify_token(value)) is claims
+    assert google["fetches"] == 1
+
+
+def test_unknown_kids_refetch_at_most_once_per_interval(google):
+    auth = service()
+    asyncio.run(auth.warm_certificates())
+
+    for i in range(20):
+        assert rejected(auth, token(KEY_B, f"forged-{i}"))
+    assert google["fetches"] == 1
+    assert asyncio.run(auth.verify_token(token(KEY_A, "a")))["uid"] == "user-1"
+
+
+def test_unknown_kid_picks_up_rotated_keys_once_due(google):
+    auth = service(min_refresh_interval=0)
+    asyncio.run(auth.warm_certificates())
+    google["published"] = {"b": CERT_B}
+
+    assert asyncio.run(auth.verify_token(token(KEY_B, "b")))["uid"] == "user-1"
+    assert google["fetches"] == 2
+    # The retired key went with the rotation
+    assert rejected(auth, token(KEY_A, "a", sub="user-2"))
+
+
+def test_expired_certificates_are_refetched(google):
+    google["max_age"] = 0
+    auth = service(min_refresh_interval=0)
+    asyncio.run(auth.warm_certificates())
+    google["published"] = {"b": CERT_B}
+
+    assert rejected(auth, token(KEY_A, "a"))
+    assert google["fetches"] == 2
+
+
+def test_expired_and_forged_tokens_are_rejected(google):
+    auth = service()
+
+    assert rejected(auth, token(KEY_A, "a", expires_in=-60))
+    assert rejected(auth, token(KEY_B, "a"))
+    assert rejected(auth, token(KEY_A, "a", aud="another-project"))
+    assert rejected(auth, "not a token")
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from cache_service import CatalogCache
+from firebase_service import firebase_service
+from inventory_service import inventory_service
+
+
+class CountingService:
+    """FirebaseService reads, counted"""
+
+    def __init__(self):
+        self.reads = 0
+
+    def __getattr__(self, name):
+        method = getattr(firebase_service, name)
+        if name in ("get_document", "get_documents", "query_page", "count"):
+            async def counted(*args, **kwargs):
+                self.reads += 1
+                return await method(*args, **kwargs)
+            return counted
+        return method
+
+
+@pytest.fixture
+def cache(db):
+    async def seed():
+        for i, category in enumerate(["pottery", "pottery", "textile"]):
+            await db.collection("products").document(f"p{i}").set(
+                {"title": f"Product {i}", "category": category, "price": 100.0 + i, "stock": 5}
+            )
+        await inventory_service.set_stock("p0", 5)
+
+    asyncio.run(seed())
+    service = CountingService()
+    cache = CatalogCache(service, max_size=100, ttl=300)
+    cache.start()
+    yield cache
+    cache.stop()
+
+
+def listing(cache):
+    items, _ = asyncio.run(cache.query_page(filters=[("category", "==", "pottery")], limit=10))
+    return items
+
+
+def test_initial_snapshot_fills_the_cache(cache):
+    products, missing = asyncio.run(cache.get_products(["p0", "p1", "p2"]))
+
+    assert [product["title"] for product in products] == ["Product 0", "Product 1", "Product 2"]
+    assert missing == []
+    assert cache.service.reads == 0
+
+
+def test_stock_changes_keep_listing_pages(cache, db):
+    listing(cache)
+    reads = cache.service.reads
+
+    asyncio.run(inventory_service.set_stock("p0", 2))
+
+    assert asyncio.run(cache.get_product("p0"))["stock"] == 2
+    listing(cache)
+    assert cache.service.reads == reads
+
+
+def test_listing_changes_drop_listing_pages(cache, db):
+    listing(cache)
+
+    asyncio.run(db.collection("products").document("p2").update({"category": "pottery"}))
+
+    assert [product["id"] for product in listing(cache)] == ["p0", "p1", "p2"]
+    asyncio.run(db.collection("products").document("p1").update({"title": "Renamed"}))
+    assert [product["title"] for product in listing(cache)][1] == "Renamed"
+    asyncio.run(db.collection("products").document("p0").delete())
+    assert [product["id"] for product in listing(cache)] == ["p1", "p2"]
@@ -0,0 +1,60 @@
+import asyncio
+
+import httpx
+
+from cache_service import catalog_cache
+from main import app
+
+PRODUCT = {"title": "Blue Pottery Vase", "price": 100.0, "category": "pottery", "artistId": "artist-1", "stock": 3}
+
+
+def get(path, **headers):
+    async def send():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.get(path, headers=headers)
+
+    return asyncio.run(send())
+
+
+def add_product(db, product_id, **fields):
+    asyncio.run(db.collection("products").document(product_id).set({**PRODUCT, **fields}))
+    catalog_cache.invalidate()
+
+
+def test_etag_is_weak_and_shared_across_encodings(db):
+    # Big enough for the compression middleware to kick in
+    add_product(db, "vase", description="Hand painted. " * 200)
+
+    identity = get("/products/vase", **{"Accept-Encoding": "identity"})
+    brotli = get("/products/vase", **{"Accept-Encoding": "br"})
+    gzip = get("/products/vase", **{"Accept-Encoding": "gzip"})
+
+    assert brotli.headers["content-encoding"] == "br"
+    assert gzip.headers["content-encoding"] == "gzip"
+    assert identity.headers["etag"].startswith('W/"')
+    assert identity.headers["etag"] == brotli.headers["etag"] == gzip.headers["etag"]
+    for response in (identity, brotli, gzip):
+        assert "Accept-Encoding" in response.headers["vary"]
+
+
+def test_small_responses_still_vary_on_encoding(db):
+    add_product(db, "vase")
+
+    response = get("/products/vase")
+
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+def test_revalidation_answers_not_modified(db):
+    add_product(db, "vase")
+    etag = get("/products/vase").headers["etag"]
+
+    assert get("/products/vase", **{"If-None-Match": etag}).status_code == 304
+    # A strong form of the same tag, as some proxies send it, matches too
+    not_modified = get("/products/vase", **{"If-None-Match": etag.removeprefix("W/")})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["vary"] == "Accept-Encoding"
+
+    add_product(db, "vase", price=120.0)
+    assert get("/products/vase", **{"If-None-Match": etag}).status_code == 200
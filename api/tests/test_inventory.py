@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import hmac
+
+import httpx
+import pytest
+
+from config import settings
+from inventory_service import inventory_service, RESERVATIONS_COLLECTION
+from main import app, get_current_user
+from razorpay_service import razorpay_service
+
+BUYER = {"id": "buyer-1", "email": "buyer@example.com", "name": "Buyer", "role": "user"}
+ARTIST = {"id": "artist-1", "email": "artist@example.com", "name": "Artist", "role": "artist"}
+ADDRESS = {
+    "fullName": "Buyer", "phone": "9999999999", "email": "buyer@example.com",
+    "addressLine1": "1 Main Road", "city": "Jaipur", "state": "RJ", "postalCode": "302001", "country": "IN",
+}
+PRODUCT = {
+    "title": "Blue Pottery Vase", "description": "Hand painted", "price": 100.0, "image": "vase.jpg",
+    "category": "pottery", "artStory": "Story", "careInstructions": "Dust", "culturalContext": "Jaipur",
+}
+
+
+@pytest.fixture
+def razorpay_orders(monkeypatch):
+    """Razorpay orders the API asked for, answered without the network"""
+    created = []
+
+    async def create_order(amount, currency="INR", receipt=None, notes=None):
+        created.append({"amount": amount, "receipt": receipt, "notes": notes})
+        return {"id": f"order_rzp{len(created)}", "amount": int(amount * 100)}
+
+    monkeypatch.setattr(razorpay_service, "create_order", create_order)
+    return created
+
+
+def request(method, path, user, **kwargs):
+    async def send():
+        app.dependency_overrides[get_current_user] = lambda: user
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                return await client.request(method, path, **kwargs)
+        finally:
+            app.dependency_overrides.clear()
+
+    return asyncio.run(send())
+
+
+def add_product(db, product_id, stock):
+    async def add():
+        await db.collection("products").document(product_id).set(
+            {**PRODUCT, "stock": stock, "artistId": ARTIST["id"]}
+        )
+        await inventory_service.set_stock(product_id, stock)
+
+    asyncio.run(add())
+
+
+def order(product_id, quantity):
+    return request("POST", "/orders", BUYER, json={
+        "items": [{"productId": product_id, "title": "ignored", "quantity": quantity, "price": 1}],
+        "total": 1,
+        "shippingAddress": ADDRESS,
+    })
+
+
+def available(product_id):
+    return asyncio.run(inventory_service.get_available(product_id))
+
+
+def stored(db, path):
+    return asyncio.run(db.document(path).get()).to_dict()
+
+
+def test_checkout_reserves_stock_and_links_razorpay(db, razorpay_orders):
+    add_product(db, "vase", 4)
+
+    response = order("vase", 3)
+
+    assert response.status_code == 200
+    order_id = response.json()["id"]
+    assert available("vase") == 1
+    assert razorpay_orders == [
+        {"amount": 300.0, "receipt": f"order_{order_id}", "notes": {"userId": BUYER["id"], "orderId": order_id}}
+    ]
+    assert stored(db, f"orders/{order_id}")["paymentId"] == "order_rzp1"
+    assert stored(db, f"{RESERVATIONS_COLLECTION}/{order_id}")["productIds"] == ["vase"]
+
+
+def test_sold_out_checkout_never_reaches_razorpay(db, razorpay_orders):
+    add_product(db, "vase", 2)
+
+    response = order("vase", 3)
+
+    assert response.status_code == 409
+    assert razorpay_orders == []
+    assert available("vase") == 2
+    assert asyncio.run(db.collection("orders").get()) == []
+
+
+def test_razorpay_failure_releases_the_reservation(db, monkeypatch):
+    add_product(db, "vase", 4)
+
+    async def unavailable(**kwargs):
+        raise Exception("Failed to create order: Razorpay is unavailable")
+
+    monkeypatch.setattr(razorpay_service, "create_order", unavailable)
+    response = order("vase", 3)
+
+    assert response.status_code == 400
+    assert available("vase") == 4
+    [cancelled] = asyncio.run(db.collection("orders").get())
+    assert cancelled.get("status") == "cancelled"
+    assert cancelled.get("paymentStatus") == "failed"
+    assert stored(db, f"{RESERVATIONS_COLLECTION}/{cancelled.id}")["status"] == "released"
+
+
+def test_restock_counts_units_held_for_unpaid_orders(db, razorpay_orders):
+    add_product(db, "vase", 4)
+    order_id = order("vase", 3).json()["id"]
+
+    response = request("PUT", "/products/vase", ARTIST, json={**PRODUCT, "stock": 5})
+
+    assert response.status_code == 200
+    assert available("vase") == 2
+    assert asyncio.run(inventory_service.release_reservation(order_id))
+    assert available("vase") == 5
+    assert stored(db, "products/vase")["stock"] == 5
+
+
+def test_payment_takes_units_off_product_stock(db, razorpay_orders):
+    add_product(db, "vase", 4)
+    order_id = order("vase", 3).json()["id"]
+
+    assert asyncio.run(inventory_service.commit_reservation(order_id))
+    assert not asyncio.run(inventory_service.release_reservation(order_id))
+    assert stored(db, "products/vase")["stock"] == 1
+    assert available("vase") == 1
+
+    # An edit that leaves stock alone keeps what was sold off it, and
+    # restocking to the old figure is a real change
+    request("PUT", "/products/vase", ARTIST, json={**PRODUCT, "title": "Vase", "stock": 1})
+    assert stored(db, "products/vase")["stock"] == 1
+    request("PUT", "/products/vase", ARTIST, json={**PRODUCT, "stock": 4})
+    assert available("vase") == 4
+
+
+def pay(order_id, razorpay_order_id, user=BUYER, payment_id="pay_1"):
+    signature = hmac.new(
+        settings.razorpay_key_secret.encode(), f"{razorpay_order_id}|{payment_id}".encode(), hashlib.sha256
+    ).hexdigest()
+    return request("POST", f"/orders/{order_id}/payment", user, params={
+        "razorpay_order_id": razorpay_order_id, "razorpay_payment_id": payment_id, "razorpay_signature": signature,
+    })
+
+
+def test_verified_payment_commits_the_reservation(db, razorpay_orders):
+    add_product(db, "vase", 4)
+    order_id = order("vase", 3).json()["id"]
+
+    assert pay(order_id, "order_rzp1").status_code == 200
+    paid = stored(db, f"orders/{order_id}")
+    assert paid["paymentStatus"] == "completed" and paid["razorpayPaymentId"] == "pay_1"
+    assert stored(db, f"{RESERVATIONS_COLLECTION}/{order_id}")["status"] == "committed"
+    assert stored(db, "products/vase")["stock"] == 1
+
+
+def test_payment_for_another_order_is_rejected(db, razorpay_orders):
+    add_product(db, "vase", 4)
+    add_product(db, "bowl", 4)
+    cheap = order("bowl", 1).json()["id"]
+    expensive = order("vase", 3).json()["id"]
+    other_buyer = {**BUYER, "id": "buyer-2"}
+
+    # A valid signature for the cheap order's Razorpay order, replayed on the
+    # expensive one, and the right payment reported by someone else
+    assert pay(expensive, "order_rzp1").status_code == 403
+    assert pay(expensive, "order_rzp2", user=other_buyer).status_code == 403
+
+    assert stored(db, f"orders/{expensive}")["paymentStatus"] == "pending"
+    assert stored(db, f"{RESERVATIONS_COLLECTION}/{expensive}")["status"] == "held"
+    assert stored(db, "products/vase")["stock"] == 4
+    assert stored(db, f"orders/{cheap}")["paymentStatus"] == "pending"
@@ -0,0 +1,60 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+
+from cache_service import catalog_cache
+from main import app
+
+
+def get(path, **params):
+    async def send():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.get(path, params=params)
+
+    return asyncio.run(send())
+
+
+@pytest.fixture
+def catalog(db):
+    async def seed():
+        for i in range(7):
+            created = datetime(2026, 2, 1) + timedelta(days=i)
+            await db.collection("products").document(f"p{i}").set(
+                {"title": f"Product {i}", "price": 100.0, "createdAt": created}
+            )
+            await db.collection("blog_posts").document(f"b{i}").set(
+                {"title": f"Post {i}", "published": True, "createdAt": created}
+            )
+            await db.collection("magazines").document(f"m{i}").set({"title": f"Issue {i}", "createdAt": created})
+
+    asyncio.run(seed())
+    catalog_cache.invalidate()
+
+
+@pytest.mark.parametrize("path", ["/products", "/blog", "/magazine"])
+def test_skip_still_pages_for_older_clients(catalog, path):
+    everything = [item["id"] for item in get(path, limit=100).json()["items"]]
+
+    page = get(path, limit=3, skip=3).json()
+
+    assert [item["id"] for item in page["items"]] == everything[3:6]
+    # The response carries a token, so a client can move over to cursors
+    rest = get(path, limit=100, page_token=page["nextPageToken"]).json()["items"]
+    assert [item["id"] for item in rest] == everything[6:]
+
+
+@pytest.mark.parametrize("path", ["/products", "/blog", "/magazine"])
+def test_paging_parameters_are_checked(catalog, path):
+    token = get(path, limit=3).json()["nextPageToken"]
+
+    assert get(path, limit=3, skip=3, page_token=token).status_code == 400
+    assert get(path, skip=-1).status_code == 422
+    assert get(path, limit=0).status_code == 422
+    assert get(path, limit=101).status_code == 422
+
+
+def test_skip_works_with_sorts(catalog):
+    newest = get("/products", sort="newest", limit=2, skip=1).json()["items"]
+    assert [item["id"] for item in newest] == ["p5", "p4"]
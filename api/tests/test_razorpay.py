@@ -0,0 +1,128 @@
+import asyncio
+
+import httpx
+import pytest
+
+import razorpay_service as razorpay_module
+from razorpay_service import CircuitBreaker, RazorpayService, RazorpayUnavailable, RetryBudget
+
+
+class Razorpay:
+    """Answers each call with the next scripted reply: a status code or an exception"""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.calls = 0
+
+    async def __call__(self, request):
+        self.calls += 1
+        reply = self.replies.pop(0) if len(self.replies) > 1 else self.replies[0]
+        if callable(reply):
+            reply = await reply()
+        if isinstance(reply, Exception):
+            raise reply
+        return httpx.Response(reply, json={"id": "pay_1"})
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(razorpay_module, "RETRY_BASE_DELAY", 0)
+
+
+def service(razorpay, threshold=5, budget=10.0):
+    client = RazorpayService()
+    client.breaker = CircuitBreaker(threshold, cooldown=30)
+    client.retry_budget = RetryBudget(0.1, budget)
+    client._client = httpx.AsyncClient(base_url="https://razorpay.test", transport=httpx.MockTransport(razorpay))
+    return client
+
+
+def call(client, method="GET"):
+    return asyncio.run(client._request(method, "/payments/pay_1"))
+
+
+def test_server_errors_and_connect_timeouts_are_retried():
+    razorpay = Razorpay(503, httpx.ConnectTimeout("timed out"), 200)
+
+    assert call(service(razorpay)) == {"id": "pay_1"}
+    assert razorpay.calls == 3
+
+
+def test_client_errors_are_not_retried_and_keep_the_circuit_closed():
+    razorpay = Razorpay(400)
+    client = service(razorpay, threshold=1)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        call(client)
+    assert razorpay.calls == 1
+    assert client.breaker.allow()
+
+
+def test_writes_are_not_retried_once_sent():
+    razorpay = Razorpay(httpx.ReadTimeout("timed out"), 200)
+
+    with pytest.raises(httpx.ReadTimeout):
+        call(service(razorpay), method="POST")
+    assert razorpay.calls == 1
+
+
+def test_retries_stop_when_the_budget_is_spent():
+    razorpay = Razorpay(503)
+    client = service(razorpay, budget=1.0)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        call(client)
+    assert razorpay.calls == 2
+    with pytest.raises(httpx.HTTPStatusError):
+        call(client)
+    assert razorpay.calls == 3
+
+
+def test_circuit_opens_then_admits_a_single_trial():
+    razorpay = Razorpay(503)
+    client = service(razorpay, threshold=2)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        call(client)
+    # Opening the circuit also ends the retries
+    assert razorpay.calls == 2
+    with pytest.raises(RazorpayUnavailable):
+        call(client)
+    assert razorpay.calls == 2
+
+    async def half_open():
+        released = asyncio.Event()
+
+        async def slow_success():
+            await released.wait()
+            return 200
+
+        razorpay.replies = [slow_success]
+        client.breaker.opened_at -= client.breaker.cooldown
+        requests = [asyncio.ensure_future(client._request("GET", "/payments/pay_1")) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        released.set()
+        return await asyncio.gather(*requests, return_exceptions=True)
+
+    results = asyncio.run(half_open())
+    assert razorpay.calls == 3
+    assert results.count({"id": "pay_1"}) == 1
+    assert sum(isinstance(result, RazorpayUnavailable) for result in results) == 4
+
+    # The trial succeeded, so the circuit is closed again
+    razorpay.replies = [200]
+    assert call(client) == {"id": "pay_1"}
+
+
+def test_failed_trial_reopens_the_circuit():
+    razorpay = Razorpay(503)
+    client = service(razorpay, threshold=2)
+    with pytest.raises(httpx.HTTPStatusError):
+        call(client)
+
+    client.breaker.opened_at -= client.breaker.cooldown
+    with pytest.raises(httpx.HTTPStatusError):
+        call(client)
+    assert razorpay.calls == 3
+    with pytest.raises(RazorpayUnavailable):
+        call(client)
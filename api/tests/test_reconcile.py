@@ -0,0 +1,97 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import reconcile_payments
+from razorpay_service import razorpay_service
+
+START = datetime(2026, 3, 1)
+END = START + timedelta(days=1)
+
+
+class Razorpay:
+    """GET /payments over an in-memory list: newest first, inclusive bounds"""
+
+    def __init__(self):
+        self.payments = []
+        self.fail_on_call = None
+        self.calls = 0
+        self.arrivals = []
+
+    def add(self, payment_id, order_id, created_at, status="captured"):
+        self.payments.append({
+            "id": payment_id, "order_id": order_id, "status": status, "amount": 10000,
+            "created_at": int(created_at.timestamp()),
+        })
+
+    async def list_payments(self, start, end, count=100, skip=0):
+        self.calls += 1
+        if self.calls == self.fail_on_call:
+            raise Exception("Failed to list payments: connection reset")
+        matching = sorted(
+            (payment for payment in self.payments
+             if int(start.timestamp()) <= payment["created_at"] <= int(end.timestamp())),
+            key=lambda payment: (-payment["created_at"], payment["id"]),
+        )
+        page = matching[skip:skip + count]
+        # Payments taken while the run is going land on top of the listing
+        while self.arrivals:
+            self.add(*self.arrivals.pop())
+        return page
+
+
+@pytest.fixture
+def razorpay(db, monkeypatch):
+    fake = Razorpay()
+    monkeypatch.setattr(razorpay_service, "list_payments", fake.list_payments)
+    monkeypatch.setattr(reconcile_payments, "PAGE_SIZE", 3)
+    return fake
+
+
+def seed_orders(db, count):
+    async def seed():
+        for i in range(count):
+            await db.collection("orders").document(f"o{i}").set({
+                "userId": "buyer-1", "items": [], "total": 100.0, "status": "pending",
+                "paymentStatus": "pending", "paymentId": f"order_rzp{i}",
+                "createdAt": START + timedelta(hours=i), "updatedAt": START + timedelta(hours=i),
+            })
+
+    asyncio.run(seed())
+
+
+def payment_statuses(db, count):
+    return [
+        asyncio.run(db.collection("orders").document(f"o{i}").get()).get("paymentStatus") for i in range(count)
+    ]
+
+
+def test_interrupted_run_resumes_without_skipping_payments(db, razorpay):
+    seed_orders(db, 8)
+    # Several payments share a second, and so straddle page boundaries
+    for i in range(8):
+        razorpay.add(f"pay_{i}", f"order_rzp{i}", START + timedelta(hours=i // 3))
+    razorpay.fail_on_call = 2
+    # Payments keep arriving while the window is still open
+    razorpay.arrivals = [(f"pay_late{i}", "order_other", END + timedelta(seconds=i)) for i in range(4)]
+
+    with pytest.raises(Exception):
+        asyncio.run(reconcile_payments.reconcile(START, END))
+    assert payment_statuses(db, 8).count("completed") == 3
+
+    razorpay.arrivals = [(f"pay_later{i}", "order_other", END + timedelta(seconds=10 + i)) for i in range(4)]
+    assert asyncio.run(reconcile_payments.reconcile(START, END)) == 5
+    assert payment_statuses(db, 8) == ["completed"] * 8
+
+    run = asyncio.run(db.collection(reconcile_payments.RUNS_COLLECTION).get())[0].to_dict()
+    assert run["status"] == "done" and run["checked"] == 8 and run["corrected"] == 8
+
+
+def test_payments_sharing_a_second_across_several_pages(db, razorpay):
+    seed_orders(db, 7)
+    for i in range(7):
+        razorpay.add(f"pay_{i}", f"order_rzp{i}", START + timedelta(hours=1))
+
+    assert asyncio.run(reconcile_payments.reconcile(START, END)) == 7
+    assert payment_statuses(db, 7) == ["completed"] * 7
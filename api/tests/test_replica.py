@@ -0,0 +1,118 @@
+import asyncio
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from firebase_service import firebase_service
+from replica_service import CatalogReplica
+
+LAUNCH = datetime(2026, 3, 1, 9, 30)
+
+
+@pytest.fixture
+def replica(db, tmp_path):
+    """A replica in sync with a catalog whose products tie on createdAt and price"""
+    async def seed():
+        for i in range(17):
+            product = {
+                "title": f"Product {i}",
+                "category": "pottery" if i % 3 else "textile",
+                "featured": i % 2 == 0,
+                # Groups of three share a timestamp, so the ID settles the order
+                "createdAt": LAUNCH + timedelta(hours=i // 3, microseconds=250),
+                "price": float(100 * (i % 4)),
+                "artistId": f"artist-{i % 2}",
+            }
+            if i == 7:
+                # Firestore leaves a document out of orderings on a field it lacks
+                del product["price"]
+            await db.collection("products").document(f"p{i:02d}").set(product)
+
+    asyncio.run(seed())
+    replica = CatalogReplica(firebase_service, str(tmp_path / "catalog.db"))
+    assert replica.start(timeout=5)
+    yield replica
+    replica.stop()
+
+
+QUERIES = [
+    ([], [("createdAt", "desc")]),
+    ([("category", "==", "pottery")], [("createdAt", "asc")]),
+    ([("category", "==", "pottery")], [("price", "desc")]),
+    ([("featured", "==", True)], [("price", "asc")]),
+    ([("price", ">=", 100.0)], [("price", "asc")]),
+]
+
+
+def walk(sources, filters, order_by, limit=4):
+    """Page through a query, taking each page from the next source in turn"""
+    ids, token, page = [], None, 0
+    while True:
+        source = sources[page % len(sources)]
+        items, token = asyncio.run(source.query_page(
+            "products", filters=filters, order_by=order_by, limit=limit, page_token=token
+        ))
+        ids.extend(item["id"] for item in items)
+        page += 1
+        if token is None:
+            return ids
+
+
+@pytest.mark.parametrize("filters,order_by", QUERIES)
+def test_page_tokens_carry_over_between_replica_and_firestore(replica, filters, order_by):
+    expected = walk([firebase_service], filters, order_by, limit=100)
+    assert len(expected) == len(set(expected)) > 4
+
+    assert walk([replica], filters, order_by) == expected
+    assert walk([firebase_service, replica], filters, order_by) == expected
+    assert walk([replica, firebase_service], filters, order_by) == expected
+
+
+def test_replica_follows_writes_made_mid_pagination(replica, db):
+    order_by = [("createdAt", "asc")]
+    first, token = asyncio.run(replica.query_page("products", order_by=order_by, limit=5))
+    assert first[0]["id"] == "p00"
+
+    # A product moved from before the cursor to the end turns up again
+    asyncio.run(db.collection("products").document("p00").update({"createdAt": LAUNCH + timedelta(days=1)}))
+
+    pages = [
+        asyncio.run(source.query_page("products", order_by=order_by, limit=100, page_token=token))[0]
+        for source in (replica, firebase_service)
+    ]
+    from_replica, from_firestore = ([item["id"] for item in page] for page in pages)
+    assert from_replica == from_firestore
+    assert from_replica[-1] == "p00"
+
+
+def test_reads_run_off_the_event_loop(replica, monkeypatch):
+    threads = []
+    fetch = replica._fetch
+
+    def recording_fetch(sql, params):
+        threads.append(threading.current_thread())
+        return fetch(sql, params)
+
+    monkeypatch.setattr(replica, "_fetch", recording_fetch)
+
+    async def read():
+        await replica.get_document("products", "p00")
+        await replica.get_documents("products", ["p01", "p02"])
+        await replica.query_page("products", order_by=[("price", "asc")])
+        return await replica.count("products", [("category", "==", "pottery")])
+
+    assert asyncio.run(read()) == 11
+    assert len(threads) == 4 and threading.main_thread() not in threads
+
+
+@pytest.mark.parametrize("filters,order_by", QUERIES)
+def test_skip_offsets_match_firestore(replica, filters, order_by):
+    pages = [
+        asyncio.run(source.query_page("products", filters=filters, order_by=order_by, limit=3, offset=2))
+        for source in (replica, firebase_service)
+    ]
+    (from_replica, replica_token), (from_firestore, firestore_token) = pages
+
+    assert [item["id"] for item in from_replica] == [item["id"] for item in from_firestore]
+    assert replica_token == firestore_token
@@ -0,0 +1,20 @@
+from datetime import date, datetime, timezone
+
+import orjson
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+
+from main import FastJSONResponse
+
+
+def render(content):
+    return orjson.loads(FastJSONResponse(content).body)
+
+
+def test_firestore_timestamps_render_as_iso_8601():
+    timestamp = DatetimeWithNanoseconds(2024, 1, 2, 3, 4, 5, 123456, tzinfo=timezone.utc)
+    assert render({"createdAt": timestamp}) == {"createdAt": "2024-01-02T03:04:05.123456+00:00"}
+
+
+def test_plain_dates_and_unknown_values():
+    body = render({"at": datetime(2024, 1, 2, 3, 4, 5), "day": date(2024, 1, 2), "other": 1.5j})
+    assert body == {"at": "2024-01-02T03:04:05", "day": "2024-01-02", "other": "1.5j"}
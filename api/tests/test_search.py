@@ -0,0 +1,160 @@
+import asyncio
+
+import httpx
+import pytest
+
+from firebase_service import firebase_service
+from main import app, get_current_user
+from search_service import ProductSearchIndex, UserSearchIndex, tokenize
+
+PRODUCTS = {
+    "madhubani": {
+        "title": "Madhubani Fish Painting", "category": "painting",
+        "description": "Hand painted on handmade paper with natural colours",
+    },
+    "warli": {
+        "title": "Warli Harvest Dance Painting", "category": "painting",
+        "description": "Tribal art of a harvest festival",
+    },
+    "pattachitra": {
+        "title": "Pattachitra Scroll", "category": "painting",
+        "description": "Cloth scroll telling the story of Jagannath",
+    },
+    "shawl": {
+        "title": "Pashmina Shawl", "category": "textile",
+        "description": "Soft shawl with a paisley painting motif",
+    },
+}
+
+
+def get(path, **params):
+    async def send():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.get(path, params=params)
+
+    return asyncio.run(send())
+
+
+@pytest.fixture
+def products(db):
+    async def seed():
+        for product_id, product in PRODUCTS.items():
+            await db.collection("products").document(product_id).set(product)
+
+    asyncio.run(seed())
+    index = ProductSearchIndex(firebase_service)
+    assert index.start(timeout=5)
+    yield index
+    index.stop()
+
+
+def ids(results):
+    items, _ = results
+    return [item["id"] for item in items]
+
+
+def test_romanized_and_accented_spellings_fold_together():
+    assert tokenize("Madhubanee") == tokenize("Madhubani") == tokenize("Madhubanī")
+    assert tokenize("Varli") == tokenize("Warli")
+    assert tokenize("Patachitra") == tokenize("Pattachitra")
+    # Devanagari keeps its vowel signs
+    assert tokenize("मधुबनी पेंटिंग") == ["मधुबनी", "पेंटिंग"]
+
+
+def test_spelling_variants_find_the_product(products):
+    assert ids(products.search("madhubanee")) == ["madhubani"]
+    assert ids(products.search("Varli dance")) == ["warli"]
+    assert ids(products.search("patachitra")) == ["pattachitra"]
+
+
+def test_title_matches_rank_first(products):
+    items, total = products.search("painting")
+
+    assert total == 3
+    assert {items[0]["id"], items[1]["id"]} == {"madhubani", "warli"}
+    assert items[-1]["id"] == "shawl"
+    assert [item["score"] for item in items] == sorted((item["score"] for item in items), reverse=True)
+
+
+def test_category_filter_and_paging(products):
+    assert ids(products.search("painting", category="textile")) == ["shawl"]
+
+    first, total = products.search("painting", limit=2)
+    second, _ = products.search("painting", limit=2, offset=2)
+    assert total == 3
+    assert [item["id"] for item in first + second] == ids(products.search("painting"))
+
+
+def test_index_follows_writes(products, db):
+    asyncio.run(db.collection("products").document("warli").delete())
+    asyncio.run(db.collection("products").document("gond").set({"title": "Gond Tree of Life", "category": "painting"}))
+
+    assert ids(products.search("warli")) == []
+    assert ids(products.search("gond")) == ["gond"]
+
+
+def test_product_search_bounds_limit_and_skip():
+    assert get("/products/search", q="painting", limit=1000).status_code == 422
+    assert get("/products/search", q="painting", limit=0).status_code == 422
+    assert get("/products/search", q="painting", skip=-1).status_code == 422
+    assert get("/products/search", q="painting", limit=100).status_code == 200
+
+
+USERS = {
+    "u1": {"email": "priya.sharma@example.com", "name": "Priya Sharma"},
+    "u2": {"email": "sharmila@example.com", "name": "Sharmila Rao"},
+    "u3": {"email": "arjun@example.com", "name": "Arjun Priyadarshi"},
+    "u4": {"email": "pr@example.com", "name": "PR Team"},
+}
+SUPER_USER = {"id": "admin-1", "email": "cnssreedhar2001@gmail.com", "name": "Admin", "role": "admin"}
+
+
+@pytest.fixture
+def users(db):
+    async def seed():
+        for uid, user in USERS.items():
+            await db.collection("users").document(uid).set(user)
+
+    asyncio.run(seed())
+    index = UserSearchIndex(firebase_service)
+    assert index.start(timeout=5)
+    yield index
+    index.stop()
+
+
+def test_user_search_ranks_exact_then_prefix_then_substring(users):
+    # Exact name, then name prefix, then a word prefix, then a substring
+    assert ids(users.search("pr team")) == ["u4"]
+    assert ids(users.search("priya")) == ["u1", "u3"]
+    assert ids(users.search("sharm")) == ["u2", "u1"]
+    assert ids(users.search("darshi")) == ["u3"]
+
+
+def test_short_queries_match_word_prefixes(users):
+    assert ids(users.search("pr")) == ["u4", "u1", "u3"]
+    assert ids(users.search("a")) == ["u3"]
+    assert ids(users.search("ra")) == ["u2"]
+
+
+def test_user_search_pages_and_follows_writes(users, db):
+    everyone, total = users.search("")
+    assert total == 4
+    assert ids(users.search("", limit=2)) + ids(users.search("", limit=2, offset=2)) == [
+        user["id"] for user in everyone
+    ]
+
+    asyncio.run(db.collection("users").document("u2").update({"name": "Meera Rao"}))
+    asyncio.run(db.collection("users").document("u4").delete())
+    assert ids(users.search("sharmila rao")) == []
+    assert ids(users.search("meera")) == ["u2"]
+    assert ids(users.search("pr team")) == []
+
+
+def test_user_search_bounds_limit_and_skip():
+    app.dependency_overrides[get_current_user] = lambda: SUPER_USER
+    try:
+        assert get("/admin/users/search", query="pr", limit=1000).status_code == 422
+        assert get("/admin/users/search", query="pr", skip=-1).status_code == 422
+        assert get("/admin/users/search", query="pr", limit=100).status_code == 200
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,133 @@
+import asyncio
+import hashlib
+import hmac
+import json
+
+import httpx
+import pytest
+
+from config import settings
+from inventory_service import inventory_service, RESERVATIONS_COLLECTION
+from main import app, get_current_user
+from razorpay_service import razorpay_service
+from stats_service import stats_service
+from webhook_service import webhook_service, EVENTS_COLLECTION
+
+SECRET = "whsec_test"
+BUYER = {"id": "buyer-1", "email": "buyer@example.com", "name": "Buyer", "role": "user"}
+ADDRESS = {
+    "fullName": "Buyer", "phone": "9999999999", "email": "buyer@example.com",
+    "addressLine1": "1 Main Road", "city": "Jaipur", "state": "RJ", "postalCode": "302001", "country": "IN",
+}
+
+
+@pytest.fixture
+def order(db, monkeypatch):
+    """A pending order for 3 of the 4 vases in stock, paid through Razorpay order ``order_rzp1``"""
+    async def create_order(amount, currency="INR", receipt=None, notes=None):
+        return {"id": "order_rzp1", "amount": int(amount * 100)}
+
+    monkeypatch.setattr(razorpay_service, "create_order", create_order)
+    monkeypatch.setattr(settings, "razorpay_webhook_secret", SECRET)
+
+    async def place():
+        await db.collection("products").document("vase").set(
+            {"title": "Blue Pottery Vase", "price": 100.0, "artistId": "artist-1", "category": "pottery", "stock": 4}
+        )
+        await inventory_service.set_stock("vase", 4)
+        app.dependency_overrides[get_current_user] = lambda: BUYER
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                response = await client.post("/orders", json={
+                    "items": [{"productId": "vase", "title": "Vase", "quantity": 3, "price": 100.0}],
+                    "total": 300.0,
+                    "shippingAddress": ADDRESS,
+                })
+        finally:
+            app.dependency_overrides.clear()
+        return response.json()["id"]
+
+    return asyncio.run(place())
+
+
+def deliver(event_id, name, **entities):
+    """POST a signed Razorpay event to the webhook endpoint"""
+    body = json.dumps({
+        "event": name,
+        "payload": {entity: {"entity": fields} for entity, fields in entities.items()},
+    }).encode()
+    signature = hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+
+    async def send():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.post("/webhooks/razorpay", content=body, headers={
+                "X-Razorpay-Signature": signature, "X-Razorpay-Event-Id": event_id,
+            })
+
+    return asyncio.run(send()).json()["status"]
+
+
+def captured(event_id):
+    return deliver(event_id, "payment.captured", payment={"id": "pay_1", "order_id": "order_rzp1"})
+
+
+def stored(db, path):
+    return asyncio.run(db.document(path).get()).to_dict()
+
+
+def totals():
+    return asyncio.run(stats_service.get_totals())
+
+
+def test_redelivered_events_are_recorded_once(db, order):
+    assert captured("evt_1") == "queued"
+    assert captured("evt_1") == "ignored"
+    assert deliver("evt_2", "payment.authorized", payment={"id": "pay_1", "order_id": "order_rzp1"}) == "ignored"
+
+    [event] = asyncio.run(db.collection(EVENTS_COLLECTION).get())
+    assert event.id == "evt_1" and event.get("status") == "pending"
+
+
+def test_capture_is_applied_once(db, order):
+    before = totals()
+    captured("evt_1")
+
+    asyncio.run(webhook_service.process(["evt_1"]))
+
+    paid = stored(db, f"orders/{order}")
+    assert paid["paymentStatus"] == "completed" and paid["razorpayPaymentId"] == "pay_1"
+    assert stored(db, f"{RESERVATIONS_COLLECTION}/{order}")["status"] == "committed"
+    assert stored(db, "products/vase")["stock"] == 1
+    assert stored(db, f"{EVENTS_COLLECTION}/evt_1")["status"] == "processed"
+    after = totals()
+    assert after["ordersCompleted"] == before.get("ordersCompleted", 0) + 1
+    assert after["revenueCompleted"] == before.get("revenueCompleted", 0) + 300.0
+
+    # Processing the same event again, e.g. after a sweep raced the worker,
+    # changes nothing
+    asyncio.run(webhook_service.process(["evt_1"]))
+    assert stored(db, "products/vase")["stock"] == 1
+    assert totals() == after
+
+
+def test_duplicate_captures_in_one_batch_count_once(db, order):
+    # Razorpay can report the same capture under two event IDs
+    captured("evt_1")
+    captured("evt_2")
+
+    asyncio.run(webhook_service.process(["evt_1", "evt_2", "evt_1"]))
+
+    assert stored(db, "products/vase")["stock"] == 1
+    assert asyncio.run(inventory_service.get_available("vase")) == 1
+    assert stored(db, f"{EVENTS_COLLECTION}/evt_1")["status"] == "processed"
+    assert stored(db, f"{EVENTS_COLLECTION}/evt_2")["status"] == "ignored"
+    assert totals()["ordersCompleted"] == 1
+
+
+def test_failed_payment_keeps_the_stock_held(db, order):
+    deliver("evt_1", "payment.failed", payment={"id": "pay_1", "order_id": "order_rzp1"})
+    asyncio.run(webhook_service.process(["evt_1"]))
+
+    assert stored(db, f"orders/{order}")["paymentStatus"] == "failed"
+    assert stored(db, f"{RESERVATIONS_COLLECTION}/{order}")["status"] == "held"
+    assert asyncio.run(inventory_service.get_available("vase")) == 1
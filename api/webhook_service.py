@@ -0,0 +1,247 @@
+from google.cloud import firestore
+from google.api_core.exceptions import AlreadyExists
+from firebase_service import firebase_service
+from stats_service import stats_service
+from inventory_service import inventory_service, RESERVATIONS_COLLECTION, TRANSACTION_ATTEMPTS
+from config import settings
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import asyncio
+import time
+
+# Every delivery is stored under its Razorpay event ID before it is
+# acknowledged, so redeliveries are dropped and nothing is lost on a crash
+EVENTS_COLLECTION = "razorpay_events"
+HANDLED_EVENTS = {"payment.captured", "payment.failed", "refund.processed"}
+# Events applied per transaction. Each writes its order, reservation, the
+# stock of each product in it, a counter shard, rollups and its own record,
+# well under Firestore's 500 writes for typical orders.
+BATCH_SIZE = 50
+# Firestore caps "in" filters at 30 values
+IN_QUERY_LIMIT = 30
+# An event that fails this many times is parked as "failed" for inspection
+MAX_ATTEMPTS = 5
+
+
+def _entity(payload: dict, name: str) -> dict:
+    return ((payload or {}).get(name) or {}).get("entity") or {}
+
+
+class WebhookService:
+    """Idempotent queue of Razorpay webhook events.
+
+    The endpoint only records each event and acknowledges it. A background
+    worker drains the queue and applies whatever has accumulated to orders,
+    reservations and counters in one transaction per batch, so a burst of
+    payments costs a handful of commits instead of one per event.
+    """
+
+    def __init__(self, service, stats, inventory, sweep_interval: float):
+        self.service = service
+        self.db = service.db
+        self.stats = stats
+        self.inventory = inventory
+        self.sweep_interval = sweep_interval
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+
+    async def receive(self, event_id: str, event: dict) -> bool:
+        """Record a verified event and queue it.
+
+        Returns False for events we don't handle and for redeliveries of an
+        event already recorded.
+        """
+        if event.get("event") not in HANDLED_EVENTS:
+            return False
+        try:
+            await self.db.collection(EVENTS_COLLECTION).document(event_id).create({
+                "event": event["event"],
+                "payload": event.get("payload") or {},
+                "status": "pending",
+                "attempts": 0,
+                "receivedAt": datetime.now()
+            })
+        except AlreadyExists:
+            return False
+        self._queue.put_nowait(event_id)
+        return True
+
+    async def _order_ids(self, razorpay_order_ids: List[str]) -> Dict[str, str]:
+        """Map Razorpay order IDs to our order IDs"""
+        order_ids = {}
+        for start in range(0, len(razorpay_order_ids), IN_QUERY_LIMIT):
+            chunk = razorpay_order_ids[start:start + IN_QUERY_LIMIT]
+            for order in await self.service.query_all("orders", [("paymentId", "in", chunk)]):
+                order_ids[order["paymentId"]] = order["id"]
+        return order_ids
+
+    def _stage_event(self, transaction, name: str, payload: dict, order_ref, order: dict) -> Optional[dict]:
+        """Stage one event's effect on an order. Returns the order as it will
+        be afterwards, or None if the event doesn't apply to it."""
+        payment = _entity(payload, "payment")
+        payment_status = order.get("paymentStatus")
+        now = datetime.now()
+
+        if name == "payment.captured":
+            if payment_status in ("completed", "refunded"):
+                return None
+            return self.stats.stage_payment_status(
+                transaction, order_ref, order, "completed",
+                {"status": "confirmed", "razorpayPaymentId": payment.get("id"), "updatedAt": now}
+            )
+
+        if name == "payment.failed":
+            # The buyer can retry the same order, so the stock stays reserved
+            # until the payment window runs out
+            if payment_status != "pending":
+                return None
+            return self.stats.stage_payment_status(
+                transaction, order_ref, order, "failed",
+                {"razorpayPaymentId": payment.get("id"), "updatedAt": now}
+            )
+
+        if name == "refund.processed":
+            if payment_status != "completed":
+                return None
+            refunded = round(order.get("refundedAmount", 0) + _entity(payload, "refund").get("amount", 0) / 100, 2)
+            if refunded < order.get("total", 0):
+                changes = {"refundedAmount": refunded, "updatedAt": now}
+                transaction.update(order_ref, changes)
+                return {**order, **changes}
+            return self.stats.stage_payment_status(
+                transaction, order_ref, order, "refunded",
+                {"status": "refunded", "refundedAmount": refunded, "updatedAt": now}
+            )
+        return None
+
+    async def _apply(self, event_ids: List[str]) -> None:
+        """Apply a batch of pending events in a single transaction"""
+        event_ids = list(dict.fromkeys(event_ids))
+        events_ref = self.db.collection(EVENTS_COLLECTION)
+        event_refs = [events_ref.document(event_id) for event_id in event_ids]
+
+        # Which order an event belongs to never changes, so resolve that
+        # outside the transaction to keep it short
+        events = {}
+        async for doc in self.db.get_all(event_refs):
+            if doc.exists:
+                events[doc.id] = doc.to_dict()
+        razorpay_order_ids = sorted({
+            _entity(event["payload"], "payment").get("order_id")
+            for event in events.values()
+        } - {None})
+        order_ids = await self._order_ids(razorpay_order_ids)
+        order_refs = {
+            order_id: self.db.collection("orders").document(order_id) for order_id in order_ids.values()
+        }
+        reservation_refs = {
+            order_id: self.db.collection(RESERVATIONS_COLLECTION).document(order_id) for order_id in order_ids.values()
+        }
+
+        @firestore.async_transactional
+        async def _transaction(transaction):
+            snapshots = {}
+            refs = event_refs + list(order_refs.values()) + list(reservation_refs.values())
+            async for doc in self.db.get_all(refs, transaction=transaction):
+                snapshots[doc.reference.path] = doc
+
+            orders = {}
+            reservations = {}
+            for order_id, ref in order_refs.items():
+                if snapshots[ref.path].exists:
+                    orders[order_id] = snapshots[ref.path].to_dict()
+                reservation = snapshots[reservation_refs[order_id].path]
+                if reservation.exists:
+                    reservations[order_id] = reservation.to_dict()
+
+            now = datetime.now()
+            for ref in event_refs:
+                snapshot = snapshots[ref.path]
+                if not snapshot.exists or snapshot.get("status") != "pending":
+                    continue
+                event = snapshot.to_dict()
+                razorpay_order_id = _entity(event["payload"], "payment").get("order_id")
+                order_id = order_ids.get(razorpay_order_id)
+                updated = None
+                if order_id in orders:
+                    updated = self._stage_event(
+                        transaction, event["event"], event["payload"], order_refs[order_id], orders[order_id]
+                    )
+                if updated is None:
+                    transaction.update(ref, {"status": "ignored", "orderId": order_id, "processedAt": now})
+                    continue
+                orders[order_id] = updated
+
+                reservation_status = (reservations.get(order_id) or {}).get("status")
+                if updated["paymentStatus"] == "completed" and reservation_status == "held":
+                    self.inventory.stage_commit(transaction, reservation_refs[order_id], reservations[order_id])
+                    reservations[order_id] = {**reservations[order_id], "status": "committed"}
+                elif updated["paymentStatus"] == "completed" and reservation_status == "released":
+                    print(f"⚠ Order {order_id} was paid after its stock reservation expired")
+                transaction.update(ref, {"status": "processed", "orderId": order_id, "processedAt": now})
+
+        await _transaction(self.db.transaction(max_attempts=TRANSACTION_ATTEMPTS))
+
+    async def _record_failure(self, event_id: str, error: Exception) -> None:
+        ref = self.db.collection(EVENTS_COLLECTION).document(event_id)
+        snapshot = await ref.get()
+        if not snapshot.exists:
+            return
+        attempts = snapshot.get("attempts") + 1
+        await ref.update({
+            "attempts": attempts,
+            "lastError": str(error),
+            "status": "failed" if attempts >= MAX_ATTEMPTS else "pending"
+        })
+
+    async def process(self, event_ids: List[str]) -> None:
+        """Apply events, falling back to one at a time so a bad event
+        doesn't hold back the rest of its batch"""
+        try:
+            await self._apply(event_ids)
+        except Exception as e:
+            if len(event_ids) > 1:
+                for event_id in event_ids:
+                    await self.process([event_id])
+                return
+            print(f"Error applying Razorpay event {event_ids[0]}: {e}")
+            try:
+                await self._record_failure(event_ids[0], e)
+            except Exception as e2:
+                print(f"Error recording Razorpay event failure: {e2}")
+
+    async def sweep(self) -> int:
+        """Queue events left pending by a restart or a failed batch"""
+        cutoff = datetime.now() - timedelta(seconds=self.sweep_interval)
+        events, _ = await self.service.query_page(
+            EVENTS_COLLECTION,
+            filters=[("status", "==", "pending"), ("receivedAt", "<", cutoff)],
+            order_by=[("receivedAt", "asc")],
+            limit=BATCH_SIZE * 10
+        )
+        for event in events:
+            self._queue.put_nowait(event["id"])
+        return len(events)
+
+    async def run(self) -> None:
+        """Drain the queue in batches until cancelled"""
+        last_sweep = 0.0
+        while True:
+            if time.monotonic() - last_sweep >= self.sweep_interval:
+                try:
+                    await self.sweep()
+                except Exception as e:
+                    print(f"Error sweeping Razorpay events: {e}")
+                last_sweep = time.monotonic()
+            try:
+                event_id = await asyncio.wait_for(self._queue.get(), self.sweep_interval)
+            except asyncio.TimeoutError:
+                continue
+            event_ids = [event_id]
+            while len(event_ids) < BATCH_SIZE and not self._queue.empty():
+                event_ids.append(self._queue.get_nowait())
+            await self.process(event_ids)
+
+
+webhook_service = WebhookService(
+    firebase_service, stats_service, inventory_service, settings.webhook_sweep_interval
+)
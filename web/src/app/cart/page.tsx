@@ -30,11 +30,11 @@ export default function CartPage() {
       setLoading(true)
       const productsMap: Record<string, Product> = {}
       
-      for (const item of items) {
-        if (!productsMap[item.productId]) {
-          const res = await api.get(`/products/${item.productId}`)
-          productsMap[item.productId] = res.data
-        }
+      const res = await api.post('/products/batch', {
+        ids: items.map((item) => item.productId),
+      })
+      for (const product of res.data.items) {
+        productsMap[product.id] = product
       }
       
       setProducts(productsMap)